@@ -1,4 +1,7 @@
 import pywikibot
+import claim_writer
+import claim_matcher
+import write_governor
 import csv
 
 # Property values from live wikidata:
@@ -14,6 +17,7 @@ edition = '2016-12-06'
 
 site = pywikibot.Site('wikidata', 'wikidata')
 repo = site.data_repository()
+writer = claim_writer.ClaimWriter(repo, governor=write_governor.WriteGovernor())
 
 
 def get_item(item_id):
@@ -22,68 +26,15 @@ def get_item(item_id):
     return item
 
 
-def check_claim(item, prop, target):
-    """
-    Requires a property, value, uncertainty and unit and returns boolean.
-    Returns the claim that fits into the defined precision or None.
-    """
-    item_dict = item.get()
-    try:
-        claims = item_dict['claims'][prop]
-    except KeyError:
-        return None
-
-    for claim in claims:
-        if claim.target_equals(target):
-            return claim
-    return None
-
-
-def check_source_set(claim, source_map):
-    source_claims = claim.getSources()
-    if len(source_claims) == 0:
-        return False
-
-    for source in source_claims:
-        all_properties_present = True
-        for src_prop in source_map.keys():
-            target_type, source_value = source_map[src_prop]
-            try:
-                sources_with_property = source[src_prop]
-            except KeyError:
-                continue
-            found = False
-            if target_type == 'item':
-                found = source_value in map(lambda src: src.target.id, sources_with_property)
-            elif target_type == 'string':
-                found = source_value in map(lambda src: src.target, sources_with_property)
-            if not found:
-                all_properties_present = False
-                break
-        if all_properties_present:
-            return True
-    return False
-
-
 def add_string_claim(item, prop, str_value):
     claim = pywikibot.Claim(repo, prop)
     claim.setTarget(str_value)
-    item.addClaim(claim, bot=True, summary="Adding GRID identifier.")
+    writer.add_claim(item, claim, summary="Adding GRID identifier.")
     return claim
 
 
 def create_source_claim(claim, source_map):
-    source_claims = []
-    for src_prop in source_map.keys():
-        target_type, source_value = source_map[src_prop]
-        source_claim = pywikibot.Claim(repo, src_prop, isReference=True)
-        if target_type == 'item':
-            source_page = pywikibot.ItemPage(repo, source_value)
-            source_claim.setTarget(source_page)
-        else:
-            source_claim.setTarget(source_value)
-        source_claims.append(source_claim)
-    claim.addSources(source_claims, bot=True)
+    writer.add_sources(claim, claim_writer.reference_claims(repo, source_map))
     return True
 
 
@@ -97,7 +48,7 @@ def process_grid_data(filename):
             if org_qid is None:
                 continue
             organization = get_item(org_qid)
-            grid_claim = check_claim(organization, p_grid_id, grid_id)
+            grid_claim = claim_matcher.first_or_none(claim_matcher.claim_index(organization).find(p_grid_id, grid_id))
             if grid_claim is None:
                 print('New entry: {0} for {1} ({2})'.
                       format(grid_id, org_qid, org_name))
@@ -111,8 +62,17 @@ def process_grid_data(filename):
                 source_map = {p_doi: ['string', source_doi],
                               p_edition: ['string', edition],
                               p_ref_url: ['string', reference_url]}
-                if not check_source_set(grid_claim, source_map):
+                if not claim_matcher.has_source(grid_claim, source_map):
                     create_source_claim(grid_claim, source_map)
 
 
-process_grid_data('grid_wikidata.csv')
+def main(*args):
+    writer.mode = claim_writer.write_mode_from_args(pywikibot.handle_args(args))
+    process_grid_data('grid_wikidata.csv')
+    writer.flush()
+    print('{0} edits'.format(writer.edits))
+    writer.governor.report()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ import json
 import datetime
 import wdi_extension
 import grid_data
-from time import sleep
+import write_governor
 
 # Property values from live wikidata:
 p_grid_id = 'P2427'
@@ -91,28 +91,31 @@ def create_grid_item(grid_data, grid_id, grid_release_item_id, login_instance):
             wd_item.set_aliases([label_hash['label']], 'en', append=True)
         else:
             wd_item.set_label(label=label_hash['label'], lang=label_hash['language'])
-    new_item_id = wd_item.write(login_instance, edit_summary='Creating item from GRID record via APSbot_grid_create script (APSbot task 3)')
+    # max_retries=1: wikidataintegrator would otherwise resend the create after a connection error or 503
+    new_item_id = wd_item.write(login_instance, edit_summary='Creating item from GRID record via APSbot_grid_create script (APSbot task 3)',
+                                max_retries=1)
     print("created {0}".format(new_item_id))
 
+governor = write_governor.WriteGovernor()
 entered_count = 0
 min_entry = 0
 max_entry = 40000
 for grid_id in grid_data.valid_ids_not_in_wikidata():
-    sleep(2.0) # crude throttle...
     entered_count += 1
     print("{0} - {1}".format(entered_count, grid_id))
     if entered_count < min_entry:
         continue
     try:
-        create_grid_item(grid_data, grid_id, grid_release_item_id, login_instance)
+        governor.edit_once(create_grid_item, grid_data, grid_id, grid_release_item_id, login_instance)
     except wdi_core.WDApiError as wd_error:
         print("Error creating GRID item for {0}: {1} - {2}".format(grid_id, sys.exc_info()[0], wd_error.wd_error_msg))
         traceback.print_exc()
     except KeyError as key_error:
         print("Error creating GRID item for {0}: {1} - {2}".format(grid_id, sys.exc_info()[0], str(key_error)))
         traceback.print_exc()
-    except:
+    except Exception:
         print("Error creating GRID item for {0}: {1}".format(grid_id, sys.exc_info()[0]))
         traceback.print_exc()
     if entered_count >= max_entry:
         break
+governor.report()
@@ -0,0 +1,69 @@
+import os
+import pywikibot
+import item_prefetch
+import claim_writer
+import write_governor
+import edit_pipeline
+import APSbot_nuclides
+import APSbot_nuclide_decays
+import APSbot_nuclide_spin_parity
+import APSbot_nuclide_abundances
+
+# csv file, planner for (claim writer, nuclide item, rows), which rows to use
+bot_inputs = [('half_life_data.csv', APSbot_nuclides.plan_half_lives, None),
+              ('decays_data.csv', APSbot_nuclide_decays.plan_decays,
+               lambda row: row[2] != 'None'),  # unrecognized decay mode
+              ('spin_parity_data.csv', APSbot_nuclide_spin_parity.plan_spin_parity, None),
+              ('abundance_data.csv', APSbot_nuclide_abundances.plan_abundances, None)]
+
+site = pywikibot.Site('wikidata', 'wikidata')
+repo = site.data_repository()
+
+
+def read_joined_units():
+    """(nuclide qid, [(planner, rows), ...]) for every nuclide in any of the csv files."""
+    units = {}
+    order = []
+    for filename, planner, keep_row in bot_inputs:
+        if not os.path.exists(filename):
+            print('No {0} - skipping'.format(filename))
+            continue
+        for nuclide_qid, rows in edit_pipeline.read_units(filename, keep_row):
+            if nuclide_qid not in units:
+                units[nuclide_qid] = []
+                order.append(nuclide_qid)
+            units[nuclide_qid].append((planner, rows))
+    return [(nuclide_qid, units[nuclide_qid]) for nuclide_qid in order]
+
+
+def process_all(writer, item_cache, readers=4, writers=1):
+    """Make the edits for every csv file through writer (one claim_writer.ClaimWriter, so all
+    the changes for a nuclide are collected together), reading each nuclide once with item_cache."""
+    units = read_joined_units()
+    item_cache.expect(nuclide_qid for nuclide_qid, parts in units)
+
+    def plan_nuclide(nuclide_qid, parts):
+        """Fetch the nuclide once and run every property's planner on it."""
+        nuclide = item_cache.get_item(nuclide_qid)
+        edits = []
+        for planner, rows in parts:
+            edits.extend(planner(writer, nuclide, rows))
+        return edits
+
+    pipeline = edit_pipeline.EditPipeline(plan_nuclide, writer, readers,
+                                          writers=writers, forget=item_cache.forget)
+    return pipeline.run(units)
+
+
+def main(*args):
+    local_args = pywikibot.handle_args(args)
+    writer = claim_writer.ClaimWriter(repo, claim_writer.write_mode_from_args(local_args, 'item'),
+                                      governor=write_governor.WriteGovernor())
+    process_all(writer, item_prefetch.ItemCache(repo),
+                edit_pipeline.readers_from_args(local_args), edit_pipeline.writers_from_args(local_args))
+    print('{0} edits'.format(writer.edits))
+    writer.governor.report()
+
+
+if __name__ == '__main__':
+    main()
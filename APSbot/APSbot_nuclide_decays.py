@@ -1,5 +1,9 @@
 import pywikibot
-import csv
+import item_prefetch
+import claim_writer
+import claim_matcher
+import write_governor
+import edit_pipeline
 import warnings
 
 # Property values from live wikidata:
@@ -18,179 +22,155 @@ site = pywikibot.Site('wikidata', 'wikidata')
 repo = site.data_repository()
 
 
-def get_item(item_id):
-    item = pywikibot.ItemPage(repo, item_id)
-    item.get()
-    return item
-
-
-def get_claim_with_qualifiers(item, prop, target, qualifiers):
-    """
-    Requires a property, item, and list of qualifier properties and items.
-    Returns claim that matches or None.
-    """
-    item_dict = item.get()
-    try:
-        claims = item_dict['claims'][prop]
-    except KeyError:
-        return None
-
-    for claim in claims:
-        if target is None:  # find claims with 'unknown' target
-            if not claim.getSnakType() == 'somevalue':
-                continue
-        elif not claim.target_equals(target):
-            continue
-        qual_missing = False
-        for qual in qualifiers:
-            if not claim.has_qualifier(qual[0], qual[1]):
-                qual_missing = True
-                continue
-        if not qual_missing:
-            return claim
-    return None
-
-
-def check_or_fix_proportion(claim, pct):
+def add_proportion(writer, claim, fraction):
+    wb_quant = pywikibot.WbQuantity(fraction, unit='1', error=0.0)
+    prop_qual = pywikibot.Claim(repo, p_proportion)
+    prop_qual.setTarget(wb_quant)
+    writer.add_qualifier(claim, prop_qual, summary="Adding branching fraction qualifier from NNDC.")
+
+
+def plan_proportion(writer, claim, pct):
     fraction = pct * 0.01
     prop_qual = None
     for qualifier in claim.qualifiers.get(p_proportion, []):
         wb_quant = qualifier.getTarget()
         if wb_quant.lowerBound <= fraction <= wb_quant.upperBound:
-            return True
+            return []
         prop_qual = qualifier
 
-    wb_quant = pywikibot.WbQuantity(fraction, unit='1', error=0.0)
     if prop_qual is None:  # Add new qualifier
-        prop_qual = pywikibot.Claim(repo, p_proportion)
-        prop_qual.setTarget(wb_quant)
-        claim.addQualifier(prop_qual, bot=True, summary="Adding branching fraction qualifier from NNDC.")
-    else:  # Modify target value:
-        warnings.warn("proportion may have changed!? old value: {}, new value: {}".
-                      format(prop_qual.getTarget().amount, fraction))
+        return [(add_proportion, [writer, claim, fraction])]
+    # Modify target value:
+    warnings.warn("proportion may have changed!? old value: {}, new value: {}".
+                  format(prop_qual.getTarget().amount, fraction))
 # changeTarget is not implemented for qualifiers - would need to remove & add
 #        prop_qual.changeTarget(wb_quant)
-    
-    return False
-
+    return []
 
-# Find a source that has the same reference URL value (if any)
-def find_matching_source(claim, ref_url_to_match):
-    source_claims = claim.getSources()
 
-    for source in source_claims:
-        if p_ref_url not in source:
-            continue
-        ref_url_sources = source[p_ref_url]
-        if ref_url_to_match in map(lambda src: src.target, ref_url_sources):
-            return source
-    return None
-
-
-def add_decay_claim(item, decay_to_qid, decay_mode_qid, pct):
+def add_decay_claim(writer, item, decay_to_qid, decay_mode_qid, pct):
     claim = pywikibot.Claim(repo, p_decays_to)
     if decay_to_qid is None:  # Handle 'unknown' case
         claim.setSnakType('somevalue')
     else:
         target_page = pywikibot.ItemPage(repo, decay_to_qid)
         claim.setTarget(target_page)
-    item.addClaim(claim, bot=True, summary="Adding decay mode claim from NNDC.")
+    writer.add_claim(item, claim, summary="Adding decay mode claim from NNDC.")
 
     dm_qids = decay_mode_qid.split('|')
     for dm_qid in dm_qids:
         decay_mode_page = pywikibot.ItemPage(repo, dm_qid)
         qual_mode = pywikibot.Claim(repo, p_decay_mode)
         qual_mode.setTarget(decay_mode_page)
-        claim.addQualifier(qual_mode)
+        writer.add_qualifier(claim, qual_mode)
 
     if pct is not None:
         qual_frac = pywikibot.Claim(repo, p_proportion)
         wb_quant = pywikibot.WbQuantity(0.01 * pct, unit='1', error=0.0)
         qual_frac.setTarget(wb_quant)
-        claim.addQualifier(qual_frac)
+        writer.add_qualifier(claim, qual_frac)
 
     return claim
 
 
-def create_source_claim(claim, source_map):
-    source_claims = []
-    for src_prop in source_map.keys():
-        target_type, source_value = source_map[src_prop]
-        source_claim = pywikibot.Claim(repo, src_prop, isReference=True)
-        if target_type == 'item':
-            source_page = pywikibot.ItemPage(repo, source_value)
-            source_claim.setTarget(source_page)
-        else:
-            source_claim.setTarget(source_value)
-        source_claims.append(source_claim)
-    claim.addSources(source_claims, bot=True)
+def create_source_claim(writer, claim, source_map):
+    writer.add_sources(claim, claim_writer.reference_claims(repo, source_map))
     return True
 
 
-def update_source(claim, source, source_map):
-    matches = True
-    for src_prop in source_map.keys():
-        target_type, source_value = source_map[src_prop]
-        if src_prop not in source:
-            matches = False
-            break
-        sources_with_property = source[src_prop]
-        if target_type == 'item':
-            found = source_value in map(lambda src: src.target.id, sources_with_property)
-        elif target_type == 'string':
-            found = source_value in map(lambda src: src.target, sources_with_property)
-        else:
-            found = True  # Don't worry about non-string, non-item matches
-        if not found:
-            matches = False
-            break
-    if not matches:
-        claim.removeSources(sum(source.values(), []))
-        create_source_claim(claim, source_map)
+def update_source(writer, claim, source, source_map):
+    writer.replace_source(claim, source, claim_writer.reference_claims(repo, source_map))
 
 
-def check_or_fix_source(claim, ref_url):
-    old_source = find_matching_source(claim, ref_url)
+def plan_source(writer, claim, ref_url):
+    # a source with the same reference URL (if any)
+    old_source = claim_matcher.find_source(claim, p_ref_url, 'string', ref_url)
     source_map = {p_stated_in: ['item', nudat_qid],
                   p_edition: ['string', '2.6'],
                   p_ref_url: ['string', ref_url],
                   p_retrieved: ['date', retrieval_date]}
 
     if old_source is None:
-        create_source_claim(claim, source_map)
-    else:
-        update_source(claim, old_source, source_map)
-
-
-def process_nndc_data(filename):
-    with open(filename) as csvfile:
-        reader = csv.reader(csvfile)
-        for row in reader:
-            nuclide_qid, decay_mode, decay_mode_qid, pct, decay_to_qid, nuclide_name, nndc_url = row
-            if decay_mode_qid == 'None':  # decay mode unrecognized - skip
-                continue
-            if pct == 'None':
-                pct = None
-            else:
-                pct = float(pct)
-            if decay_to_qid == 'None':
-                decay_to_qid = None
-            print('checking: {0}->{1} via {2} ({3}%) - {4}'.format(
-                    nuclide_qid, decay_to_qid, decay_mode_qid, pct, nuclide_name))
-            nuclide = get_item(nuclide_qid)
-            dm_qids = decay_mode_qid.split('|')
-            decay_claim = get_claim_with_qualifiers(nuclide, p_decays_to, decay_to_qid,
-                                                    map(lambda qid: [p_decay_mode, qid], dm_qids))
-            if decay_claim is None:
-                new_claim = add_decay_claim(nuclide, decay_to_qid, decay_mode_qid, pct)
-                source_map = {p_stated_in: ['item', nudat_qid],
-                              p_edition: ['string', '2.6'],
-                              p_ref_url: ['string', nndc_url],
-                              p_retrieved: ['date', retrieval_date]}
-                create_source_claim(new_claim, source_map)
-            else:
-                if pct is not None:
-                    check_or_fix_proportion(decay_claim, pct)
-                check_or_fix_source(decay_claim, nndc_url)
-
-process_nndc_data('decays_data.csv')
+        return [(create_source_claim, [writer, claim, source_map])]
+    if not claim_matcher.source_has_all(old_source, source_map):
+        return [(update_source, [writer, claim, old_source, source_map])]
+    return []
+
+
+def add_new_decay(writer, nuclide, decay_to_qid, decay_mode_qid, pct, nndc_url):
+    new_claim = add_decay_claim(writer, nuclide, decay_to_qid, decay_mode_qid, pct)
+    source_map = {p_stated_in: ['item', nudat_qid],
+                  p_edition: ['string', '2.6'],
+                  p_ref_url: ['string', nndc_url],
+                  p_retrieved: ['date', retrieval_date]}
+    create_source_claim(writer, new_claim, source_map)
+
+
+def plan_decays(writer, nuclide, rows):
+    """Compare the nuclide's decay rows with it; returns the edits (made through writer, a
+    claim_writer.ClaimWriter) as (function, arguments) pairs."""
+    edits = []
+    planned = set()
+    for row in rows:
+        nuclide_qid, decay_mode, decay_mode_qid, pct, decay_to_qid, nuclide_name, nndc_url = row
+        if pct == 'None':
+            pct = None
+        else:
+            pct = float(pct)
+        if decay_to_qid == 'None':
+            decay_to_qid = None
+        print('checking: {0}->{1} via {2} ({3}%) - {4}'.format(
+                nuclide_qid, decay_to_qid, decay_mode_qid, pct, nuclide_name))
+        dm_qids = decay_mode_qid.split('|')
+        decay_claim = claim_matcher.claim_index(nuclide).find_with_qualifiers(
+            p_decays_to, decay_to_qid, [[p_decay_mode, qid] for qid in dm_qids])
+        key = (p_decays_to, decay_to_qid, tuple(dm_qids))
+        if decay_claim is None:
+            if edit_pipeline.plan_once(planned, key):
+                edits.append((add_new_decay, [writer, nuclide, decay_to_qid, decay_mode_qid, pct, nndc_url]))
+        else:
+            if pct is not None and edit_pipeline.plan_once(planned, key + (p_proportion,)):
+                edits.extend(plan_proportion(writer, decay_claim, pct))
+            if edit_pipeline.plan_once(planned, key + (nndc_url,)):
+                edits.extend(plan_source(writer, decay_claim, nndc_url))
+    return edits
+
+
+def process_nndc_data(filename, writer, item_cache, readers=4, writers=1, journal=None):
+    """Make the edits for the rows of filename through writer, reading nuclides with item_cache
+    (an item_prefetch.ItemCache)."""
+    # rows with an unrecognized decay mode are skipped
+    units = edit_pipeline.read_units(filename, lambda row: row[2] != 'None')
+    if journal is not None:
+        row_count = sum(len(rows) for nuclide_qid, rows in units)
+        units = edit_pipeline.pending_units(units, journal)
+        print('{0} of {1} rows done in an earlier run'.format(
+            row_count - sum(len(rows) for nuclide_qid, rows in units), row_count))
+    item_cache.expect(nuclide_qid for nuclide_qid, rows in units)
+
+    def plan(nuclide_qid, rows):
+        return plan_decays(writer, item_cache.get_item(nuclide_qid), rows)
+
+    def item_revision(nuclide_qid):
+        return item_cache.get_item(nuclide_qid).latest_revision_id
+
+    pipeline = edit_pipeline.EditPipeline(plan, writer, readers,
+                                          writers=writers, forget=item_cache.forget,
+                                          journal=journal, revision=item_revision)
+    return pipeline.run(units)
+
+
+def main(*args):
+    local_args = pywikibot.handle_args(args)
+    writer = claim_writer.ClaimWriter(repo, claim_writer.write_mode_from_args(local_args),
+                                      governor=write_governor.WriteGovernor())
+    process_nndc_data('decays_data.csv', writer, item_prefetch.ItemCache(repo),
+                      edit_pipeline.readers_from_args(local_args),
+                      edit_pipeline.writers_from_args(local_args),
+                      edit_pipeline.journal_from_args(local_args, 'decays_data.journal.sqlite'))
+    print('{0} edits'.format(writer.edits))
+    writer.governor.report()
+
+
+if __name__ == '__main__':
+    main()
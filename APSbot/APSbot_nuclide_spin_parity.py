@@ -1,5 +1,9 @@
 import pywikibot
-import csv
+import item_prefetch
+import claim_writer
+import claim_matcher
+import write_governor
+import edit_pipeline
 
 # Property values from live wikidata:
 p_stated_in = 'P248'
@@ -12,117 +16,91 @@ nudat_qid = 'Q21234191'
 
 retrieval_date = pywikibot.WbTime(year=2016, month=6, day=23)
 
-precision = 10 ** -10
-
 site = pywikibot.Site('wikidata', 'wikidata')
 repo = site.data_repository()
 
 
-def get_item(item_id):
-    item = pywikibot.ItemPage(repo, item_id)
-    item.get()
-    return item
-
-
-def check_claim(item, prop, value):
-    """
-    Requires a property and value and returns boolean.
-    Returns the claim that fits into the defined precision or None.
-    """
-    item_dict = item.get()
-    value = float(value)
-    try:
-        claims = item_dict['claims'][prop]
-    except KeyError:
-        return None
-
-    claim_found = None
-    for claim in claims:
-        wb_quant = claim.getTarget()
-        delta_amount = float(wb_quant.amount) - value
-        if abs(delta_amount) < precision:
-            claim_found = claim
-    return claim_found
-
-
-def check_source_set(claim, source_map):
-    source_claims = claim.getSources()
-    if len(source_claims) == 0:
-        return False
-
-    for source in source_claims:
-        all_properties_present = True
-        for prop in source_map.keys():
-            target_type, source_value = source_map[prop]
-            try:
-                sources_with_property = source[prop]
-            except KeyError:
-                continue
-            found = False
-            if target_type == 'item':
-                found = source_value in map(lambda src: src.target.id, sources_with_property)
-            elif target_type == 'string':
-                found = source_value in map(lambda src: src.target, sources_with_property)
-            if not found:
-                all_properties_present = False
-                break
-        if all_properties_present:
-            return True
-    return False
-
-
-def add_unitless_quantity(item, prop, data):
+def add_unitless_quantity(writer, item, prop, data):
     value, uncert = data
     claim = pywikibot.Claim(repo, prop)
     wb_quant = pywikibot.WbQuantity(value, unit='1', error=uncert)
     claim.setTarget(wb_quant)
-    item.addClaim(claim, bot=True, summary="Adding spin or parity claim from NNDC.")
+    writer.add_claim(item, claim, summary="Adding spin or parity claim from NNDC.")
     return claim
 
 
-def create_source_claim(claim, source_map):
-    source_claims = []
-    for prop in source_map.keys():
-        target_type, source_value = source_map[prop]
-        source_claim = pywikibot.Claim(repo, prop, isReference=True)
-        if target_type == 'item':
-            source_page = pywikibot.ItemPage(repo, source_value)
-            source_claim.setTarget(source_page)
-        else:
-            source_claim.setTarget(source_value)
-        source_claims.append(source_claim)
-    claim.addSources(source_claims, bot=True)
+def create_source_claim(writer, claim, source_map):
+    writer.add_sources(claim, claim_writer.reference_claims(repo, source_map))
     return True
 
 
-def check_and_add_entries(nuclide, name, prop, value, nndc_url):
-    claim_to_update = check_claim(nuclide, prop, value)
+def add_entry(writer, nuclide, name, prop, value, nndc_url):
+    print('New value being added: {0} for {1}'.format(value, name))
+    new_claim = add_unitless_quantity(writer, nuclide, prop, [value, 0.0])
+    source_map = {p_stated_in: ['item', nudat_qid],
+                  p_edition: ['string', '2.6'],
+                  p_ref_url: ['string', nndc_url],
+                  p_retrieved: ['date', retrieval_date]}
+    print('Add source: {0}'.format(nndc_url))
+    create_source_claim(writer, new_claim, source_map)
+
+
+def plan_entries(writer, nuclide, name, prop, value, nndc_url, planned):
+    """planned: see edit_pipeline.plan_once"""
+    claim_to_update = claim_matcher.first_or_none(claim_matcher.claim_index(nuclide).find_quantity(prop, value))
     if claim_to_update is None:
-        print('New value being added: {0} for {1}'.format(value, name))
-        new_claim = add_unitless_quantity(nuclide, prop, [value, 0.0])
-        source_map = {p_stated_in: ['item', nudat_qid],
-                      p_edition: ['string', '2.6'],
-                      p_ref_url: ['string', nndc_url],
-                      p_retrieved: ['date', retrieval_date]}
+        if not edit_pipeline.plan_once(planned, (prop, value)):
+            return []
+        return [(add_entry, [writer, nuclide, name, prop, value, nndc_url])]
+    if not edit_pipeline.plan_once(planned, (prop, value, nndc_url)):
+        return []
+    source_map = {p_stated_in: ['item', nudat_qid],
+                  p_edition: ['string', '2.6'],
+                  p_ref_url: ['string', nndc_url]}
+    if not claim_matcher.has_source(claim_to_update, source_map):
         print('Add source: {0}'.format(nndc_url))
-        create_source_claim(new_claim, source_map)
-    else:
-        source_map = {p_stated_in: ['item', nudat_qid],
-                      p_edition: ['string', '2.6'],
-                      p_ref_url: ['string', nndc_url]}
-        if not check_source_set(claim_to_update, source_map):
-            print('Add source: {0}'.format(nndc_url))
-            source_map[p_retrieved] = ['date', retrieval_date]
-            create_source_claim(claim_to_update, source_map)
-
-
-def process_spin_parity_data(filename):
-    with open(filename) as csvfile:
-        reader = csv.reader(csvfile)
-        for row in reader:
-            nuclide_qid, spin, parity, nuclide_name, nndc_url = row
-            nuclide = get_item(nuclide_qid)
-            check_and_add_entries(nuclide, nuclide_name, p_spin_quantum_number, float(spin), nndc_url)
-            check_and_add_entries(nuclide, nuclide_name, p_parity, int(parity), nndc_url)
-
-process_spin_parity_data('spin_parity_data.csv')
+        source_map[p_retrieved] = ['date', retrieval_date]
+        return [(create_source_claim, [writer, claim_to_update, source_map])]
+    return []
+
+
+def plan_spin_parity(writer, nuclide, rows):
+    """Compare the nuclide's csv rows with it; returns the edits (made through writer, a
+    claim_writer.ClaimWriter) as (function, arguments) pairs."""
+    edits = []
+    planned = set()
+    for row in rows:
+        nuclide_qid, spin, parity, nuclide_name, nndc_url = row
+        edits.extend(plan_entries(writer, nuclide, nuclide_name, p_spin_quantum_number, float(spin), nndc_url,
+                                  planned))
+        edits.extend(plan_entries(writer, nuclide, nuclide_name, p_parity, int(parity), nndc_url, planned))
+    return edits
+
+
+def process_spin_parity_data(filename, writer, item_cache, readers=4, writers=1):
+    """Make the edits for the rows of filename through writer, reading nuclides with item_cache
+    (an item_prefetch.ItemCache)."""
+    units = edit_pipeline.read_units(filename)
+    item_cache.expect(nuclide_qid for nuclide_qid, rows in units)
+
+    def plan(nuclide_qid, rows):
+        return plan_spin_parity(writer, item_cache.get_item(nuclide_qid), rows)
+
+    pipeline = edit_pipeline.EditPipeline(plan, writer, readers,
+                                          writers=writers, forget=item_cache.forget)
+    return pipeline.run(units)
+
+
+def main(*args):
+    local_args = pywikibot.handle_args(args)
+    writer = claim_writer.ClaimWriter(repo, claim_writer.write_mode_from_args(local_args),
+                                      governor=write_governor.WriteGovernor())
+    process_spin_parity_data('spin_parity_data.csv', writer, item_prefetch.ItemCache(repo),
+                             edit_pipeline.readers_from_args(local_args),
+                             edit_pipeline.writers_from_args(local_args))
+    print('{0} edits'.format(writer.edits))
+    writer.governor.report()
+
+
+if __name__ == '__main__':
+    main()
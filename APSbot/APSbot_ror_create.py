@@ -4,7 +4,7 @@ from wikidataintegrator import wdi_core, wdi_login
 import json
 import datetime
 import ror_data
-from time import sleep
+import write_governor
 
 # Property values from live wikidata:
 p_ror_id = 'P6782'
@@ -47,7 +47,9 @@ def create_ror_item(ror_data, ror_id, ror_release_qid, login_instance):
             wd_item.set_aliases([label_hash['label']], 'en', append=True)
         else:
             wd_item.set_label(label=label_hash['label'], lang=label_hash['language'])
-    new_item_id = wd_item.write(login_instance, edit_summary='Creating item from ROR record via APSbot_ror_create script')
+    # max_retries=1: wikidataintegrator would otherwise resend the create after a connection error or 503
+    new_item_id = wd_item.write(login_instance, edit_summary='Creating item from ROR record via APSbot_ror_create script',
+                                max_retries=1)
     print("created {0}".format(new_item_id))
 
 #####
@@ -67,25 +69,26 @@ with open('apsbot.pwd') as passwdfile:
 
 login_instance = wdi_login.WDLogin(user='APSbot@APSbot', pwd=passwd)
 
+governor = write_governor.WriteGovernor()
 entered_count = 0
 min_entry = 0
 max_entry = 2000
 for ror_id in ror_data.valid_ids_not_in_wikidata():
-    sleep(1.0) # crude throttle...
     entered_count += 1
     print("{0} - {1}".format(entered_count, ror_id))
     if entered_count < min_entry:
         continue
     try:
-        create_ror_item(ror_data, ror_id, ror_release_qid, login_instance)
+        governor.edit_once(create_ror_item, ror_data, ror_id, ror_release_qid, login_instance)
     except wdi_core.WDApiError as wd_error:
         print("Error creating ROR item for {0}: {1} - {2}".format(ror_id, sys.exc_info()[0], wd_error.wd_error_msg))
         traceback.print_exc()
     except KeyError as key_error:
         print("Error creating ROR item for {0}: {1} - {2}".format(ror_id, sys.exc_info()[0], str(key_error)))
         traceback.print_exc()
-    except:
+    except Exception:
         print("Error creating ROR item for {0}: {1}".format(ror_id, sys.exc_info()[0]))
         traceback.print_exc()
     if entered_count >= max_entry:
         break
+governor.report()
@@ -1,10 +1,14 @@
+import os
 import sys
 import traceback
 from wikidataintegrator import wdi_core, wdi_login
 import json
 import datetime
 import ror_data_v2
-from time import sleep
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))  # write_governor, edit_journal
+import write_governor
+import edit_journal
 
 # Property values from live wikidata:
 p_ror_id = 'P6782'
@@ -50,8 +54,11 @@ def create_ror_item(ror_data, ror_id, ror_release_qid, login_instance):
             wd_item.set_aliases([label_hash['label']], 'en', append=True)
         else:
             wd_item.set_label(label=label_hash['label'], lang=lang_code)
-    new_item_id = wd_item.write(login_instance, edit_summary='Creating item from ROR record via APSbot_ror_create script')
+    # max_retries=1: wikidataintegrator would otherwise resend the create after a connection error or 503
+    new_item_id = wd_item.write(login_instance, edit_summary='Creating item from ROR record via APSbot_ror_create script',
+                                max_retries=1)
     print("created {0}".format(new_item_id))
+    return new_item_id
 
 #####
 ror_release_qid = None
@@ -70,25 +77,50 @@ with open('apsbot.pwd') as passwdfile:
 
 login_instance = wdi_login.WDLogin(user='APSbot@APSbot', pwd=passwd)
 
+# Each ROR id is journaled as planned before its item is created and done
+# (with the new item id) after; a restart skips done ids without any query.
+# Creates are never retried. An id left planned or failed may still have been
+# created, so it is looked up with the live API's search first - and left
+# alone while the search index may still be catching up on it.
+journal = edit_journal.EditJournal('ror_create_v2.journal.sqlite')
+doubt_window = 30 * 60  # seconds
+done_ids = journal.done_keys()
+
+governor = write_governor.WriteGovernor()
 entered_count = 0
-min_entry = 0
 max_entry = 2000
 for ror_id in ror_data.valid_ids_not_in_wikidata():
-    sleep(1.0) # crude throttle...
+    if ror_id in done_ids:
+        continue
+    entry = journal.lookup(ror_id)
+    if entry is not None:
+        existing_items = ror_data.live_items_for(ror_id)
+        if len(existing_items) > 0:
+            print("{0} was created as {1} - not creating it again".format(ror_id, existing_items[0]))
+            journal.done([ror_id], existing_items[0])
+            continue
+        if time.time() - entry[2] < doubt_window:
+            print("{0} may have been created in the last {1} minutes - leaving it for a later run".format(
+                ror_id, doubt_window // 60))
+            continue
     entered_count += 1
     print("{0} - {1}".format(entered_count, ror_id))
-    if entered_count < min_entry:
-        continue
+    journal.planned([ror_id])
     try:
-        create_ror_item(ror_data, ror_id, ror_release_qid, login_instance)
+        new_item_id = governor.edit_once(create_ror_item, ror_data, ror_id, ror_release_qid, login_instance)
+        journal.done([ror_id], new_item_id)
     except wdi_core.WDApiError as wd_error:
         print("Error creating ROR item for {0}: {1} - {2}".format(ror_id, sys.exc_info()[0], wd_error.wd_error_msg))
         traceback.print_exc()
+        journal.failed([ror_id])
     except KeyError as key_error:
         print("Error creating ROR item for {0}: {1} - {2}".format(ror_id, sys.exc_info()[0], str(key_error)))
         traceback.print_exc()
-    except:
+        journal.failed([ror_id])
+    except Exception:
         print("Error creating ROR item for {0}: {1}".format(ror_id, sys.exc_info()[0]))
         traceback.print_exc()
+        journal.failed([ror_id])
     if entered_count >= max_entry:
         break
+governor.report()
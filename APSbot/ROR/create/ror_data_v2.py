@@ -1,6 +1,9 @@
 import json
 import csv
-from wikidataintegrator import wdi_core
+import requests
+
+api_url = 'https://www.wikidata.org/w/api.php'
+user_agent = 'APSbot_ror_create_v2.py (https://github.com/arthurpsmith/wikidata-tools/tree/master/APSbot/ROR; arthurpsmith@gmail.com)'
 
 class RorData:
     def __init__(self, ror_data_filename, wikidata_ror_filename):
@@ -21,10 +24,15 @@ class RorData:
                 ror_id = row[1]
                 self.ror_wikidata_links[ror_id] = wikidata_id
 
-    def verify_not_in_wikidata(self, ror_id):
-        results = wdi_core.WDItemEngine.execute_sparql_query(
-                query="SELECT ?item ?ror WHERE {{ ?item wdt:P6782 '{0}' . }}".format(ror_id))
-        return len(results['results']['bindings']) == 0
+    def live_items_for(self, ror_id):
+        """Items with ROR id ror_id found by the Wikidata API's search (haswbstatement) - which
+        picks up new items within minutes, where the query service can lag by hours."""
+        response = requests.get(api_url, params={'action': 'query', 'list': 'search', 'srnamespace': 0,
+                                                 'srsearch': 'haswbstatement:P6782={0}'.format(ror_id),
+                                                 'format': 'json'},
+                                headers={'User-Agent': user_agent}, timeout=60)
+        response.raise_for_status()
+        return [result['title'] for result in response.json()['query']['search']]
 
     def load_country_map(self, country_map_file):
         self.country_map = {}
@@ -1,7 +1,13 @@
+import argparse
 import csv
 import json
+import os
+import sys
 from urllib.parse import urlencode
 from urllib.request import Request,urlopen
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # sparql_cache, sparql_stream
+import sparql_cache
+import sparql_stream
 
 sparql_api_url = 'https://query.wikidata.org/sparql'
 user_agent = 'fetch_wikidata_ror_entries.py (https://github.com/arthurpsmith/wikidata-tools/tree/master/APSbot/ROR; arthurpsmith@gmail.com)'
@@ -17,10 +23,19 @@ def get_sparql(query):
     return response_data['results']['bindings']
 
 
+parser = argparse.ArgumentParser(description='Write the Wikidata items with ROR IDs to wikidata_ror.csv.')
+parser.add_argument('--sparql-cache', metavar='FILE',
+                    help='cache the query result in FILE (reused for 6 hours)')
+args = parser.parse_args()
+
 with open('wikidata_ror.csv', 'w') as csvfile:
     writer = csv.writer(csvfile)
     writer.writerow(['Wikidata ID', 'ROR ID', 'Deprecated'])
-    ror_items = get_sparql("SELECT ?item ?ror ?deprecated WHERE { ?item p:P6782 ?stmt . ?stmt ps:P6782 ?ror; wikibase:rank ?rank . BIND(?rank = wikibase:DeprecatedRank AS ?deprecated) }")
+    query = "SELECT ?item ?ror ?deprecated WHERE { ?item p:P6782 ?stmt . ?stmt ps:P6782 ?ror; wikibase:rank ?rank . BIND(?rank = wikibase:DeprecatedRank AS ?deprecated) }"
+    if args.sparql_cache:
+        ror_items = sparql_cache.SparqlCache(args.sparql_cache).fetch(query, get_sparql)
+    else:
+        ror_items = sparql_stream.iter_sparql_csv(sparql_api_url, query, user_agent)  # rows are written as they arrive
     for ror_item in ror_items:
         qid = ror_item['item']['value'].split('/')[-1]
         ror_id = ror_item['ror']['value']
@@ -0,0 +1,180 @@
+#
+# Indexed lookups of claims, qualifiers and references for the pywikibot bots
+#
+from collections import defaultdict
+import math
+
+precision = 10 ** -10
+
+
+def value_key(value, precision=precision):
+    """Hashable key for a claim or reference value, None if the value can't be indexed.
+
+    Items key by id and strings by themselves; quantities key by their
+    amount in buckets of width precision, so amounts that agree within
+    precision are in the same or a neighbouring bucket.
+    """
+    if isinstance(value, str):
+        return ('string', value)
+    if hasattr(value, 'amount'):
+        return ('quantity', math.floor(float(value.amount) / precision))
+    if hasattr(value, 'getID'):
+        return ('item', value.getID())
+    return None
+
+
+def claim_key(claim, precision=precision):
+    snak_type = claim.getSnakType()
+    if snak_type != 'value':
+        return (snak_type,)  # somevalue (unknown) or novalue
+    return value_key(claim.getTarget(), precision)
+
+
+class ClaimIndex(object):
+    """The claims of one item by (property, value key), built in one pass.
+
+    A target of None finds 'unknown value' claims. Quantities are looked up
+    in their bucket and the two either side, then compared exactly.
+    """
+
+    def __init__(self, claims, precision=precision):
+        self.precision = precision
+        self.source = claims
+        self.size = 0
+        self.claims = defaultdict(list)
+        for prop, prop_claims in claims.items():
+            for claim in prop_claims:
+                self.claims[(prop, claim_key(claim, precision))].append(claim)
+                self.size += 1
+
+    def find(self, prop, target):
+        """Claims for prop whose value is target (an item, string or quantity)."""
+        if target is None:
+            return list(self.claims.get((prop, ('somevalue',)), []))
+        if hasattr(target, 'amount'):
+            return self.find_quantity(prop, float(target.amount))
+        return list(self.claims.get((prop, value_key(target)), []))
+
+    def find_item(self, prop, item_id):
+        """Claims for prop with the item item_id as value (None: unknown value)."""
+        if item_id is None:
+            return list(self.claims.get((prop, ('somevalue',)), []))
+        return list(self.claims.get((prop, ('item', item_id)), []))
+
+    def find_quantity(self, prop, value, uncertainty=None):
+        """Quantity claims for prop with amount within precision of value and,
+        if uncertainty is given, both bounds that far from the amount."""
+        value = float(value)
+        bucket = math.floor(value / self.precision)
+        found = []
+        for key in (bucket - 1, bucket, bucket + 1):
+            for claim in self.claims.get((prop, ('quantity', key)), []):
+                wb_quant = claim.getTarget()
+                if abs(float(wb_quant.amount) - value) >= self.precision:
+                    continue
+                if uncertainty is not None:
+                    if wb_quant.lowerBound is None or wb_quant.upperBound is None:
+                        continue
+                    delta_lower = float(wb_quant.amount) - float(wb_quant.lowerBound)
+                    delta_upper = float(wb_quant.upperBound) - float(wb_quant.amount)
+                    if abs(delta_lower - uncertainty) >= self.precision or \
+                            abs(delta_upper - uncertainty) >= self.precision:
+                        continue
+                found.append(claim)
+        return found
+
+    def find_with_qualifiers(self, prop, item_id, qualifiers):
+        """First claim for prop with item item_id as value having every (qualifier property,
+        item id) pair, or None."""
+        qualifiers = list(qualifiers)
+        for claim in self.find_item(prop, item_id):
+            if all(claim.has_qualifier(qualifier_prop, qualifier_value)
+                   for qualifier_prop, qualifier_value in qualifiers):
+                return claim
+        return None
+
+
+def claim_index(item, precision=precision):
+    """The ClaimIndex of item, rebuilt only when its claims have changed."""
+    claims = item.get()['claims']
+    index = getattr(item, 'claim_index', None)
+    if index is None or index.source is not claims or index.precision != precision or \
+            index.size != sum(len(prop_claims) for prop_claims in claims.values()):
+        index = ClaimIndex(claims, precision)
+        item.claim_index = index
+    return index
+
+
+def first_or_none(claims):
+    if len(claims) == 0:
+        return None
+    return claims[0]
+
+
+def source_map_key(target_type, source_value):
+    """Key of a source_map entry ({property: [type, value]}); None for types not compared (dates)."""
+    if target_type in ('item', 'string'):
+        return (target_type, source_value)
+    return None
+
+
+class SourceIndex(object):
+    """The reference blocks of one claim by property and by (property, value key)."""
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.size = len(sources)
+        self.with_property = defaultdict(set)
+        self.with_value = defaultdict(set)
+        for number, source in enumerate(sources):
+            for prop, source_claims in source.items():
+                self.with_property[prop].add(number)
+                for source_claim in source_claims:
+                    self.with_value[(prop, value_key(source_claim.getTarget()))].add(number)
+
+    def matching(self, source_map):
+        """Blocks agreeing with source_map on each item or string property they have
+        (a property missing from a block doesn't count against it)."""
+        numbers = set(range(len(self.sources)))
+        for prop, (target_type, source_value) in source_map.items():
+            key = source_map_key(target_type, source_value)
+            if key is not None:
+                numbers -= self.with_property.get(prop, set()) - self.with_value.get((prop, key), set())
+        return [self.sources[number] for number in sorted(numbers)]
+
+    def having(self, prop, target_type, source_value):
+        """Blocks with source_value for prop."""
+        numbers = self.with_value.get((prop, source_map_key(target_type, source_value)), set())
+        return [self.sources[number] for number in sorted(numbers)]
+
+
+def source_index(claim):
+    index = getattr(claim, 'source_index', None)
+    if index is None or index.sources is not claim.sources or index.size != len(claim.sources):
+        index = SourceIndex(claim.sources)
+        claim.source_index = index
+    return index
+
+
+def has_source(claim, source_map):
+    """True if a reference block of claim matches source_map (see SourceIndex.matching)."""
+    return len(source_index(claim).matching(source_map)) > 0
+
+
+def find_source(claim, prop, target_type, source_value):
+    """First reference block of claim with source_value for prop, or None."""
+    return first_or_none(source_index(claim).having(prop, target_type, source_value))
+
+
+def source_has_all(source, source_map):
+    """True if the reference block source has every property of source_map, with the same
+    value for the item and string ones."""
+    for prop, (target_type, source_value) in source_map.items():
+        if prop not in source:
+            return False
+        key = source_map_key(target_type, source_value)
+        if key is None:
+            continue  # Don't worry about non-string, non-item matches
+        if key not in [value_key(source_claim.getTarget()) for source_claim in source.get(prop, [])]:
+            return False
+    return True
@@ -0,0 +1,156 @@
+#
+# Claim edits for the pywikibot bots, sent as one edit per claim or per item
+#
+from collections import OrderedDict
+import threading
+import uuid
+import pywikibot
+
+write_modes = ('separate', 'claim', 'item')
+
+
+def write_mode_from_args(args, default='claim'):
+    """The -write:MODE option from pywikibot.handle_args() leftovers (separate, claim or item)."""
+    write_mode = default
+    for arg in args:
+        if arg.startswith('-write:'):
+            write_mode = arg[len('-write:'):]
+    if write_mode not in write_modes:
+        raise ValueError('Unknown write mode {0} (expected one of {1})'.format(write_mode, ', '.join(write_modes)))
+    return write_mode
+
+
+def reference_claims(repo, source_map):
+    """Reference claims for source_map ({property: [type, value]}; type 'item' takes an item id)."""
+    source_claims = []
+    for src_prop in source_map.keys():
+        target_type, source_value = source_map[src_prop]
+        source_claim = pywikibot.Claim(repo, src_prop, isReference=True)
+        if target_type == 'item':
+            source_page = pywikibot.ItemPage(repo, source_value)
+            source_claim.setTarget(source_page)
+        else:
+            source_claim.setTarget(source_value)
+        source_claims.append(source_claim)
+    return source_claims
+
+
+class ClaimWriter(object):
+    """Adds claims, qualifiers and sources in one of three write modes:
+
+    separate - addClaim, addQualifier and addSources each make their own edit
+               (what the bots always did)
+    claim    - changes to a claim are collected and the complete claim (value,
+               qualifiers and references) is sent in one wbsetclaim
+    item     - every claim changed on an item goes in a single wbeditentity
+
+    Collected changes are sent when a change to another claim (or item)
+    comes in, and on flush() - call that once the input is done. Every edit
+    is paced by governor (a write_governor.WriteGovernor) if one is given,
+    in place of pywikibot's put throttle.
+    Collected changes are kept per thread, so several writer threads can
+    share one ClaimWriter as long as each works on its own items.
+    """
+
+    def __init__(self, repo, mode='claim', governor=None):
+        if mode not in write_modes:
+            raise ValueError('Unknown write mode {0}'.format(mode))
+        self.repo = repo
+        self.mode = mode
+        self.governor = governor
+        if governor is not None:
+            governor.replace_throttle(pywikibot.config, getattr(repo, 'throttle', None))
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.edits = 0
+
+    def collected(self):
+        """This thread's changes not sent yet (item, claims and summaries)."""
+        if not hasattr(self.local, 'claims'):
+            self.discard()
+        return self.local
+
+    def add_claim(self, item, claim, summary=None):
+        if self.mode == 'separate':
+            self.send(item.addClaim, claim, bot=True, summary=summary)
+            return claim
+        claim.on_item = item
+        item.claims.setdefault(claim.getID(), []).append(claim)  # visible to later checks before it is sent
+        self.stage(claim, summary)
+        return claim
+
+    def add_qualifier(self, claim, qualifier, summary=None):
+        if self.mode == 'separate':
+            self.send(claim.addQualifier, qualifier, bot=True, summary=summary)
+            return
+        qualifier.isQualifier = True
+        claim.qualifiers.setdefault(qualifier.getID(), []).append(qualifier)
+        self.stage(claim, summary)
+
+    def add_sources(self, claim, source_claims, summary=None):
+        if self.mode == 'separate':
+            self.send(claim.addSources, source_claims, bot=True, summary=summary)
+            return
+        source = OrderedDict()
+        for source_claim in source_claims:
+            source_claim.isReference = True
+            source.setdefault(source_claim.getID(), []).append(source_claim)
+        claim.sources.append(source)
+        self.stage(claim, summary)
+
+    def replace_source(self, claim, old_source, source_claims, summary=None):
+        """Swap the reference block old_source (a dict from claim.getSources()) for source_claims."""
+        if self.mode == 'separate':
+            self.send(claim.removeSources, sum(old_source.values(), []))
+        else:
+            claim.sources = [source for source in claim.sources if source is not old_source]
+        self.add_sources(claim, source_claims, summary)
+
+    def stage(self, claim, summary):
+        pending = self.collected()
+        if len(pending.claims) > 0:
+            if self.mode == 'claim' and claim is not pending.claims[0]:
+                self.flush()
+            elif self.mode == 'item' and claim.on_item is not pending.item:
+                self.flush()
+        pending.item = claim.on_item
+        if not any(staged is claim for staged in pending.claims):
+            pending.claims.append(claim)
+        if summary is not None and summary not in pending.summaries:
+            pending.summaries.append(summary)
+
+    def flush(self):
+        pending = self.collected()
+        if len(pending.claims) == 0:
+            return
+        summary = '; '.join(pending.summaries) if len(pending.summaries) > 0 else None
+        try:
+            # pywikibot sends the item's revision id (from when it was read) as
+            # baserevid, so changes made since then give an editconflict error
+            if self.mode == 'claim':
+                claim = pending.claims[0]
+                if not claim.snak:
+                    # save_claim only takes claims with a GUID; wbsetclaim creates
+                    # the claim when the GUID is new to the item
+                    claim.snak = '{0}${1}'.format(claim.on_item.getID(), uuid.uuid4())
+                self.send(self.repo.save_claim, claim, summary=summary, bot=True)
+            else:
+                # pywikibot drops the item content after editEntity, so its next
+                # get() reloads the claims with their new ids
+                self.send(pending.item.editEntity, {'claims': [claim.toJSON() for claim in pending.claims]},
+                          summary=summary, bot=True)
+        finally:
+            self.discard()
+
+    def discard(self):
+        """Drop collected changes that were not sent (after an error part way through an item)."""
+        self.local.item = None
+        self.local.claims = []
+        self.local.summaries = []
+
+    def send(self, function, *args, **kwargs):
+        with self.lock:
+            self.edits += 1
+        if self.governor is None:
+            return function(*args, **kwargs)
+        return self.governor.edit(function, *args, **kwargs)
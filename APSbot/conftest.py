@@ -0,0 +1,180 @@
+#
+# A stand-in for pywikibot, so the bots can be tested without it (or a
+# network connection). It keeps claims the way pywikibot does, builds the
+# same Wikibase JSON, and records every edit on repo.sent instead of making it.
+#
+from collections import OrderedDict
+import itertools
+import sys
+import types
+
+guids = itertools.count(1)
+
+
+class Repo(object):
+    def __init__(self):
+        self.sent = []
+        self.throttle = None
+
+    def save_claim(self, claim, summary=None, bot=True):
+        self.sent.append(('wbsetclaim', claim.toJSON()))
+
+
+class Site(object):
+    def __init__(self, code=None, fam=None):
+        self.repo = Repo()
+
+    def data_repository(self):
+        return self.repo
+
+
+class ItemPage(object):
+    def __init__(self, repo, title):
+        self.repo = repo
+        self.id = title
+        self.claims = OrderedDict()
+        self.latest_revision_id = 1
+
+    def getID(self):
+        return self.id
+
+    def get(self):
+        return {'claims': self.claims}
+
+    def __eq__(self, other):
+        return isinstance(other, ItemPage) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def addClaim(self, claim, bot=True, summary=None):
+        claim.snak = '{0}$guid-{1}'.format(self.id, next(guids))
+        claim.on_item = self
+        self.claims.setdefault(claim.getID(), []).append(claim)
+        self.repo.sent.append(('wbcreateclaim', claim.toJSON()))
+
+    def editEntity(self, data, summary=None, bot=True):
+        self.repo.sent.append(('wbeditentity', data))
+
+
+class WbQuantity(object):
+    def __init__(self, amount, unit=None, error=None, site=None):
+        self.amount = amount
+        self.unit = unit or '1'
+        self.upperBound = amount + (error or 0)
+        self.lowerBound = amount - (error or 0)
+
+    def toWikibase(self):
+        return {'amount': '{0:+}'.format(self.amount), 'unit': self.unit,
+                'upperBound': '{0:+}'.format(self.upperBound), 'lowerBound': '{0:+}'.format(self.lowerBound)}
+
+
+class WbTime(object):
+    def __init__(self, year, month=1, day=1):
+        self.year, self.month, self.day = year, month, day
+
+    def toWikibase(self):
+        return {'time': '+{0:04d}-{1:02d}-{2:02d}T00:00:00Z'.format(self.year, self.month, self.day),
+                'precision': 11, 'calendarmodel': 'http://www.wikidata.org/entity/Q1985727'}
+
+
+class Claim(object):
+    def __init__(self, repo, pid, isReference=False, isQualifier=False):
+        self.repo = repo
+        self.id = pid
+        self.isReference = isReference
+        self.isQualifier = isQualifier
+        self.target = None
+        self.snaktype = 'value'
+        self.snak = None
+        self.on_item = None
+        self.qualifiers = OrderedDict()
+        self.sources = []
+
+    def getID(self):
+        return self.id
+
+    def setTarget(self, value):
+        self.target = value
+
+    def getTarget(self):
+        return self.target
+
+    def setSnakType(self, value):
+        self.snaktype = value
+
+    def getSnakType(self):
+        return self.snaktype
+
+    def getSources(self):
+        return self.sources
+
+    def has_qualifier(self, qualifier_id, target):
+        return any(qualifier.target_equals(target) for qualifier in self.qualifiers.get(qualifier_id, []))
+
+    def target_equals(self, value):
+        if isinstance(self.target, ItemPage) and isinstance(value, str):
+            return self.target.getID() == value
+        return self.target == value
+
+    def addQualifier(self, qualifier, bot=True, summary=None):
+        qualifier.isQualifier = True
+        self.qualifiers.setdefault(qualifier.getID(), []).append(qualifier)
+        self.repo.sent.append(('wbsetqualifier', self.snak, qualifier.snak_json()))
+
+    def addSources(self, claims, bot=True, summary=None):
+        source = OrderedDict()
+        for claim in claims:
+            source.setdefault(claim.getID(), []).append(claim)
+        self.sources.append(source)
+        self.repo.sent.append(('wbsetreference', self.snak, snaks_json(source)))
+
+    def removeSources(self, sources, bot=True, summary=None):
+        self.repo.sent.append(('wbremovereferences', self.snak, [claim.getID() for claim in sources]))
+
+    def snak_json(self):
+        snak = {'snaktype': self.snaktype, 'property': self.id}
+        if self.snaktype != 'value':
+            return snak
+        if isinstance(self.target, ItemPage):
+            snak['datavalue'] = {'type': 'wikibase-entityid',
+                                 'value': {'entity-type': 'item', 'numeric-id': int(self.target.getID()[1:])}}
+        elif isinstance(self.target, str):
+            snak['datavalue'] = {'type': 'string', 'value': self.target}
+        elif isinstance(self.target, WbQuantity):
+            snak['datavalue'] = {'type': 'quantity', 'value': self.target.toWikibase()}
+        else:
+            snak['datavalue'] = {'type': 'time', 'value': self.target.toWikibase()}
+        return snak
+
+    def toJSON(self):
+        data = {'mainsnak': self.snak_json(), 'type': 'statement', 'rank': 'normal'}
+        if self.snak:
+            data['id'] = self.snak
+        if self.qualifiers:
+            data.update(snaks_json(self.qualifiers, 'qualifiers'))
+        if self.sources:
+            data['references'] = [snaks_json(source) for source in self.sources]
+        return data
+
+
+def snaks_json(claims_by_property, name='snaks'):
+    return {name: OrderedDict((prop, [claim.snak_json() for claim in claims])
+                              for prop, claims in claims_by_property.items()),
+            name + '-order': list(claims_by_property)}
+
+
+def PreloadingEntityGenerator(generator, groupsize=50):
+    for page in generator:
+        yield page
+
+
+pywikibot = types.ModuleType('pywikibot')
+pywikibot.config = types.SimpleNamespace(put_throttle=1)
+for name in ('Site', 'ItemPage', 'Claim', 'WbQuantity', 'WbTime'):
+    setattr(pywikibot, name, globals()[name])
+pywikibot.handle_args = lambda args: list(args)
+pywikibot.pagegenerators = types.ModuleType('pywikibot.pagegenerators')
+pywikibot.pagegenerators.PreloadingEntityGenerator = PreloadingEntityGenerator
+sys.modules['pywikibot'] = pywikibot
+sys.modules['pywikibot.pagegenerators'] = pywikibot.pagegenerators
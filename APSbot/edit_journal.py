@@ -0,0 +1,90 @@
+#
+# Write-ahead journal of bot edits, so an interrupted run can resume
+#
+import sqlite3
+import threading
+import time
+
+schema = """
+CREATE TABLE IF NOT EXISTS edits (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    result TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS edits_state ON edits (state);
+"""
+
+
+class EditJournal(object):
+    """Each unit of work (a csv row, a ROR id) in an SQLite file, as 'planned'
+    before its edit is sent and 'done' - with the revision id or created item
+    id - once it has gone through.
+
+    A restart skips done keys without reading anything from Wikidata. Keys
+    left planned are in doubt: the edit may or may not have been made, so
+    they have to be checked before being tried again.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        with self.lock:
+            connection = self.connect()
+            connection.executescript(schema)
+            connection.close()
+
+    def connect(self):
+        connection = sqlite3.connect(self.filename)
+        connection.execute('PRAGMA synchronous = FULL')
+        return connection
+
+    @staticmethod
+    def row_key(row):
+        return ','.join(row)
+
+    def set_state(self, keys, state, result=None):
+        now = time.time()
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO edits (key, state, result, updated) VALUES (?, ?, ?, ?)',
+                                       [(key, state, result, now) for key in keys])
+            connection.close()
+
+    def planned(self, keys):
+        self.set_state(keys, 'planned')
+
+    def done(self, keys, result=None):
+        self.set_state(keys, 'done', None if result is None else str(result))
+
+    def failed(self, keys):
+        """The edit raised an error; the keys are tried again next run. An error does not
+        prove nothing was changed, so, like planned keys, they are checked first."""
+        self.set_state(keys, 'failed')
+
+    def lookup(self, key):
+        """(state, result, updated) for key, or None if it was never planned."""
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute('SELECT state, result, updated FROM edits WHERE key = ?', (key,)).fetchone()
+            connection.close()
+        return row
+
+    def is_done(self, key):
+        entry = self.lookup(key)
+        return entry is not None and entry[0] == 'done'
+
+    def done_keys(self):
+        with self.lock:
+            connection = self.connect()
+            keys = set(key for (key,) in connection.execute("SELECT key FROM edits WHERE state = 'done'"))
+            connection.close()
+        return keys
+
+    def clear(self):
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute('DELETE FROM edits')
+            connection.close()
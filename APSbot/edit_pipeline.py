@@ -0,0 +1,201 @@
+#
+# Read/diff/write pipeline for the pywikibot bots: reader threads fetch and
+# diff items while writer threads make the (paced) edits
+#
+from collections import OrderedDict
+import csv
+import queue
+import sys
+import threading
+import traceback
+import edit_journal
+
+
+def readers_from_args(args, default=4):
+    """The -readers:N option from pywikibot.handle_args() leftovers."""
+    return int_option(args, '-readers:', default)
+
+
+def writers_from_args(args, default=1):
+    """The -writers:N option (items edited at the same time) from pywikibot.handle_args() leftovers."""
+    return int_option(args, '-writers:', default)
+
+
+def journal_from_args(args, default_filename):
+    """An edit_journal.EditJournal from -journal:FILE (default_filename if not given), or None
+    with -nojournal; -fresh forgets what an earlier run recorded."""
+    filename = default_filename
+    fresh = False
+    for arg in args:
+        if arg.startswith('-journal:'):
+            filename = arg[len('-journal:'):]
+        elif arg == '-nojournal':
+            filename = None
+        elif arg == '-fresh':
+            fresh = True
+    if filename is None:
+        return None
+    journal = edit_journal.EditJournal(filename)
+    if fresh:
+        journal.clear()
+    return journal
+
+
+def int_option(args, prefix, default):
+    value = default
+    for arg in args:
+        if arg.startswith(prefix):
+            value = int(arg[len(prefix):])
+    return value
+
+
+def is_edit_conflict(error):
+    """True for an API editconflict error (pywikibot's APIError or wikidataintegrator's WDApiError)."""
+    api_error = getattr(error, 'wd_error_msg', None)
+    if isinstance(api_error, dict):
+        return api_error.get('error', {}).get('code') == 'editconflict'
+    return getattr(error, 'code', None) == 'editconflict'
+
+
+def read_units(filename, keep_row=None):
+    """Rows of a bot csv file grouped by item id (first column), in first-seen order."""
+    units = OrderedDict()
+    with open(filename) as csvfile:
+        for row in csv.reader(csvfile):
+            if keep_row is None or keep_row(row):
+                units.setdefault(row[0], []).append(row)
+    return list(units.items())
+
+
+def plan_once(planned, key):
+    """True the first time key is looked up in planned, a set kept while one item is planned.
+
+    A plan's edits are only made once every row of the item has been
+    compared, so a row can't see the claim or reference an earlier row will
+    add; keying each planned addition stops two such rows making it twice.
+    """
+    if key in planned:
+        return False
+    planned.add(key)
+    return True
+
+
+def pending_units(units, journal):
+    """units without the rows an edit_journal.EditJournal has as done (and without units left empty)."""
+    done = journal.done_keys()
+    pending = []
+    for item_id, rows in units:
+        rows = [row for row in rows if journal.row_key(row) not in done]
+        if len(rows) > 0:
+            pending.append((item_id, rows))
+    return pending
+
+
+class EditPipeline(object):
+    """Runs plan(item_id, rows) on a pool of reader threads and makes the edits on writer threads.
+
+    plan returns a list of (function, arguments) pairs - the edits for that
+    item - which a writer thread calls in order, then flushes the claim
+    writer so each item's changes go out together. Reads for the next items
+    overlap the edits for the current ones; the queues are bounded, so
+    readers stop when queue_size plans are waiting.
+
+    Each item goes to one writer, and its edits carry the revision id read
+    with it (pywikibot's baserevid). If someone else changed the item in
+    between, the edit fails with editconflict: the item is dropped from the
+    cache (forget(item_id)), planned again from a fresh read and retried,
+    up to conflict_retries times. Other items carry on meanwhile.
+
+    With a journal (an edit_journal.EditJournal) an item's rows are recorded
+    as planned before its edits go out and as done, with revision(item_id),
+    once they have; filter the work through pending_units() to skip rows
+    finished by an earlier run. Rows still planned after a crash are simply
+    read and diffed again, which finds any edit that did get through.
+    """
+
+    def __init__(self, plan, claim_writer, readers=4, queue_size=20, writers=1, forget=None, conflict_retries=3,
+                 journal=None, revision=None):
+        self.plan = plan
+        self.claim_writer = claim_writer
+        self.readers = max(1, readers)
+        self.queue_size = queue_size
+        self.writers = max(1, writers)
+        self.forget = forget
+        self.conflict_retries = conflict_retries
+        self.journal = journal
+        self.revision = revision
+        self.failed = []
+
+    def feed(self, work, units):
+        for unit in work:
+            units.put(unit)
+        for reader in range(self.readers):
+            units.put(None)
+
+    def read(self, units, plans):
+        while True:
+            unit = units.get()
+            if unit is None:
+                return
+            item_id, rows = unit
+            try:
+                plans.put((item_id, rows, self.plan(item_id, rows), None))
+            except Exception:
+                plans.put((item_id, rows, None, traceback.format_exc()))
+
+    def write(self, plans):
+        while True:
+            planned = plans.get()
+            if planned is None:
+                return
+            item_id, rows, edits, error = planned
+            if error is None:
+                try:
+                    self.apply(item_id, rows, edits)
+                    continue
+                except Exception:
+                    error = traceback.format_exc()
+            print('Failed on {0}:\n{1}'.format(item_id, error), file=sys.stderr)
+            self.failed.append(item_id)
+
+    def apply(self, item_id, rows, edits):
+        keys = []
+        if self.journal is not None:
+            keys = [self.journal.row_key(row) for row in rows]
+            if len(edits) > 0:
+                self.journal.planned(keys)
+        for attempt in range(self.conflict_retries + 1):
+            try:
+                for function, arguments in edits:
+                    function(*arguments)
+                self.claim_writer.flush()
+                if self.journal is not None:
+                    self.journal.done(keys, None if self.revision is None else self.revision(item_id))
+                return
+            except Exception as error:
+                self.claim_writer.discard()
+                if not is_edit_conflict(error) or attempt == self.conflict_retries:
+                    raise
+            print('Edit conflict on {0}; reading it again'.format(item_id), file=sys.stderr)
+            if self.forget is not None:
+                self.forget(item_id)
+            edits = self.plan(item_id, rows)
+
+    def run(self, work):
+        """Plan and apply every (item_id, rows) unit of work; returns the item ids that failed."""
+        units = queue.Queue(maxsize=self.queue_size)
+        plans = queue.Queue(maxsize=self.queue_size)
+        feeder = threading.Thread(target=self.feed, args=(work, units), daemon=True)
+        readers = [threading.Thread(target=self.read, args=(units, plans), daemon=True)
+                   for reader in range(self.readers)]
+        writers = [threading.Thread(target=self.write, args=(plans,), daemon=True)
+                   for writer in range(self.writers)]
+        for thread in [feeder] + readers + writers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        for writer in writers:
+            plans.put(None)
+        for thread in writers:
+            thread.join()
+        return self.failed
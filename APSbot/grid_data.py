@@ -3,7 +3,9 @@ import csv
 from wikidataintegrator import wdi_core
 
 class GridData:
-    def __init__(self, filename):
+    def __init__(self, filename, sparql_cache=None):
+        # sparql_cache: optional sparql_cache.SparqlCache for the bulk relations query
+        self.sparql_cache = sparql_cache
         self.grid_lookup_hash = {}
         with open(filename) as grid_file:
             self.grid_full_data = json.load(grid_file)
@@ -12,13 +14,21 @@ class GridData:
         self.fetch_wikidata_relations()
 
     def fetch_wikidata_relations(self):
-        results = wdi_core.WDItemEngine.execute_sparql_query(query="SELECT ?item ?grid WHERE { ?item p:P2427/ps:P2427 ?grid . }")
+        query = "SELECT ?item ?grid WHERE { ?item p:P2427/ps:P2427 ?grid . }"
+        if self.sparql_cache is not None:
+            results = self.sparql_cache.fetch(query, self.execute_sparql_query)
+        else:
+            results = self.execute_sparql_query(query)
         self.grid_wikidata_links = {}
         for i in results['results']['bindings']:
             qid = i['item']['value'].split('/')[-1]
             grid_id = i['grid']['value']
             self.grid_wikidata_links[grid_id] = qid
 
+    @staticmethod
+    def execute_sparql_query(query):
+        return wdi_core.WDItemEngine.execute_sparql_query(query=query)
+
     def verify_not_in_wikidata(self, grid_id):
         results = wdi_core.WDItemEngine.execute_sparql_query(
                 query="SELECT ?item ?grid WHERE {{ ?item wdt:P2427 '{0}' . }}".format(grid_id))
@@ -0,0 +1,113 @@
+#
+# Batched, cached loading of Wikidata items for the pywikibot nuclide bots
+#
+from collections import OrderedDict
+import threading
+import pywikibot
+from pywikibot import pagegenerators
+
+
+class ItemCache(object):
+    """Items loaded batch_size at a time (one wbgetentities call per batch).
+
+    Give expect() the item ids in the order the bot will ask for them (the
+    first column of its csv file); a get_item() miss then loads the next
+    window of distinct ids, batch by batch. At most max_items are kept,
+    least recently used dropped first. Edits made through a cached item
+    update it in place, so a nuclide with several csv rows is only fetched
+    once.
+
+    get_item() may be called from several threads. Loading happens outside
+    the lock: the thread that misses claims the window's ids, with one Event
+    per batch, loads the first batch itself and leaves the rest to a
+    background thread. Other threads wanting one of those ids wait only for
+    its batch; anything else is looked up or loaded meanwhile.
+    """
+
+    def __init__(self, repo, max_items=2000, batch_size=50, window=500):
+        self.repo = repo
+        self.max_items = max_items
+        self.batch_size = batch_size
+        self.window = window
+        self.items = OrderedDict()
+        self.loading = {}  # item id -> Event set once its batch is stored
+        self.upcoming = []
+        self.position = {}
+        self.lock = threading.Lock()
+
+    def expect(self, item_ids):
+        self.upcoming = list(OrderedDict.fromkeys(item_ids))
+        self.position = dict((item_id, index) for index, item_id in enumerate(self.upcoming))
+
+    def get_item(self, item_id):
+        while True:
+            with self.lock:
+                if item_id in self.items:
+                    self.items.move_to_end(item_id)
+                    return self.items[item_id]
+                loaded = self.loading.get(item_id)
+                if loaded is None:
+                    batches = self.claim_window(item_id)
+                    break
+            loaded.wait()  # then look again: it may not have been returned, or been dropped
+        return self.load(item_id, batches)
+
+    def claim_window(self, item_id):
+        """Mark the window of ids from item_id on (those neither cached nor loading) as
+        loading by this thread; returns its (item ids, Event) batches. Call with the lock held."""
+        item_ids = [item_id]
+        if item_id in self.position:
+            start = self.position[item_id]
+            item_ids = [upcoming_id for upcoming_id in self.upcoming[start:start + self.window]
+                        if upcoming_id not in self.items and upcoming_id not in self.loading]
+        batches = []
+        for start in range(0, len(item_ids), self.batch_size):
+            batch = (item_ids[start:start + self.batch_size], threading.Event())
+            for batch_id in batch[0]:
+                self.loading[batch_id] = batch[1]
+            batches.append(batch)
+        return batches
+
+    def load(self, item_id, batches):
+        """Load the first claimed batch (holding item_id) and return its item; the rest of
+        the window loads on a background thread."""
+        self.load_batches(batches[:1])
+        if len(batches) > 1:
+            threading.Thread(target=self.load_batches, args=(batches[1:],), daemon=True).start()
+        with self.lock:
+            found = self.items.get(item_id)
+        if found is None:  # not returned by the batch request
+            found = pywikibot.ItemPage(self.repo, item_id)
+            found.get()
+            with self.lock:
+                self.store(item_id, found)
+        return found
+
+    def load_batches(self, batches):
+        try:
+            for batch_ids, loaded in batches:
+                pages = [pywikibot.ItemPage(self.repo, batch_id) for batch_id in batch_ids]
+                items = list(pagegenerators.PreloadingEntityGenerator(iter(pages), groupsize=self.batch_size))
+                with self.lock:
+                    for item in items:
+                        self.store(item.getID(), item)
+                    for batch_id in batch_ids:
+                        self.loading.pop(batch_id, None)
+                loaded.set()
+        finally:
+            with self.lock:  # after an error, let waiting threads load for themselves
+                for batch_ids, loaded in batches:
+                    for batch_id in batch_ids:
+                        if self.loading.get(batch_id) is loaded:
+                            del self.loading[batch_id]
+                    loaded.set()
+
+    def store(self, item_id, item):
+        self.items[item_id] = item
+        self.items.move_to_end(item_id)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+
+    def forget(self, item_id):
+        with self.lock:
+            self.items.pop(item_id, None)
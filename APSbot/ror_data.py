@@ -3,7 +3,9 @@ import csv
 from wikidataintegrator import wdi_core
 
 class RorData:
-    def __init__(self, filename):
+    def __init__(self, filename, sparql_cache=None):
+        # sparql_cache: optional sparql_cache.SparqlCache for the bulk relations query
+        self.sparql_cache = sparql_cache
         self.ror_lookup_hash = {}
         with open(filename) as ror_file:
             self.ror_full_data = json.load(ror_file)
@@ -13,13 +15,21 @@ class RorData:
         self.fetch_wikidata_relations()
 
     def fetch_wikidata_relations(self):
-        results = wdi_core.WDItemEngine.execute_sparql_query(query="SELECT ?item ?ror WHERE { ?item p:P6782/ps:P6782 ?ror . }")
+        query = "SELECT ?item ?ror WHERE { ?item p:P6782/ps:P6782 ?ror . }"
+        if self.sparql_cache is not None:
+            results = self.sparql_cache.fetch(query, self.execute_sparql_query)
+        else:
+            results = self.execute_sparql_query(query)
         self.ror_wikidata_links = {}
         for i in results['results']['bindings']:
             qid = i['item']['value'].split('/')[-1]
             ror_id = i['ror']['value']
             self.ror_wikidata_links[ror_id] = qid
 
+    @staticmethod
+    def execute_sparql_query(query):
+        return wdi_core.WDItemEngine.execute_sparql_query(query=query)
+
     def verify_not_in_wikidata(self, ror_id):
         results = wdi_core.WDItemEngine.execute_sparql_query(
                 query="SELECT ?item ?ror WHERE {{ ?item wdt:P6782 '{0}' . }}".format(ror_id))
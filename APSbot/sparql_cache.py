@@ -0,0 +1,112 @@
+#
+# Persistent cache of SPARQL query results
+#
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+schema = """
+CREATE TABLE IF NOT EXISTS results (
+    query_hash TEXT PRIMARY KEY,
+    query TEXT,
+    fetched REAL,
+    accessed REAL,
+    size INTEGER,
+    body BLOB
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+
+class SparqlCache(object):
+    """SPARQL results stored zlib-compressed in an SQLite file, keyed by a hash of the query.
+
+    Results older than ttl seconds are fetched again (WDQS itself only
+    caches for 6 hours); invalidate() drops one query or everything, and
+    when the stored results exceed max_bytes the least recently used are
+    removed.
+    """
+
+    def __init__(self, filename='sparql_cache.sqlite', ttl=6 * 3600, max_bytes=256 * 1024 * 1024):
+        self.filename = filename
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        with self.lock:
+            connection = self.connect()
+            connection.executescript(schema)
+            connection.close()
+
+    def connect(self):
+        return sqlite3.connect(self.filename)
+
+    @staticmethod
+    def query_hash(query):
+        return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+    def get(self, query):
+        key = self.query_hash(query)
+        with self.lock:
+            connection = self.connect()
+            try:
+                row = connection.execute('SELECT fetched, body FROM results WHERE query_hash = ?',
+                                         (key,)).fetchone()
+                if row is None:
+                    return None
+                fetched, body = row
+                if self.ttl is not None and time.time() - fetched > self.ttl:
+                    return None
+                connection.execute('UPDATE results SET accessed = ? WHERE query_hash = ?', (time.time(), key))
+                connection.commit()
+            finally:
+                connection.close()
+        return json.loads(zlib.decompress(body).decode('utf-8'))
+
+    def put(self, query, result):
+        body = zlib.compress(json.dumps(result).encode('utf-8'))
+        now = time.time()
+        with self.lock:
+            connection = self.connect()
+            try:
+                connection.execute('INSERT OR REPLACE INTO results (query_hash, query, fetched, accessed, size, body) '
+                                   'VALUES (?, ?, ?, ?, ?, ?)',
+                                   (self.query_hash(query), query, now, now, len(body), sqlite3.Binary(body)))
+                self.evict(connection)
+                connection.commit()
+            finally:
+                connection.close()
+
+    def fetch(self, query, fetch_function):
+        """Cached result for query, or fetch_function(query) (which is then cached)."""
+        result = self.get(query)
+        if result is None:
+            result = fetch_function(query)
+            self.put(query, result)
+        return result
+
+    def invalidate(self, query=None):
+        with self.lock:
+            connection = self.connect()
+            try:
+                if query is None:
+                    connection.execute('DELETE FROM results')
+                else:
+                    connection.execute('DELETE FROM results WHERE query_hash = ?', (self.query_hash(query),))
+                connection.commit()
+            finally:
+                connection.close()
+
+    def evict(self, connection):
+        if self.max_bytes is None:
+            return
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in connection.execute('SELECT query_hash, size FROM results ORDER BY accessed').fetchall():
+            if total <= self.max_bytes:
+                break
+            connection.execute('DELETE FROM results WHERE query_hash = ?', (key,))
+            total -= size
@@ -0,0 +1,28 @@
+#
+# Streaming SPARQL results as CSV, shared by the ROR scripts and ../nndc_data
+#
+import csv
+import gzip
+import io
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+
+def iter_sparql_csv(endpoint, query, user_agent=None):
+    """Bindings for query, in the json results' form ({name: {'value': ...}}), read from a
+    CSV response as rows arrive (gzip-compressed if the server agrees).
+
+    Unbound variables are left out of the binding.
+    """
+    headers = {'Accept': 'text/csv', 'Accept-Encoding': 'gzip'}
+    if user_agent is not None:
+        headers['User-Agent'] = user_agent
+    request = Request('{0}?{1}'.format(endpoint, urlencode({'query': query})), headers=headers)
+    with urlopen(request) as response:
+        stream = response
+        if response.headers.get('Content-Encoding') == 'gzip':
+            stream = gzip.GzipFile(fileobj=response)
+        reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+        names = next(reader, [])
+        for values in reader:
+            yield dict((name, {'value': value}) for name, value in zip(names, values) if value != '')
@@ -0,0 +1,123 @@
+import re
+import pywikibot  # the stand-in from conftest.py
+import claim_writer
+
+guid = re.compile(r'^Q1234\$[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+half_life_json = {'snaktype': 'value', 'property': 'P2114',
+                  'datavalue': {'type': 'quantity',
+                                'value': {'amount': '+1.5', 'unit': 'http://www.wikidata.org/entity/Q11574',
+                                          'upperBound': '+1.75', 'lowerBound': '+1.25'}}}
+qualifier_json = {'snaktype': 'value', 'property': 'P2571',
+                  'datavalue': {'type': 'wikibase-entityid',
+                                'value': {'entity-type': 'item', 'numeric-id': 159375}}}
+reference_json = {'snaks': {'P248': [{'snaktype': 'value', 'property': 'P248',
+                                      'datavalue': {'type': 'wikibase-entityid',
+                                                    'value': {'entity-type': 'item', 'numeric-id': 21234191}}}],
+                            'P854': [{'snaktype': 'value', 'property': 'P854',
+                                      'datavalue': {'type': 'string', 'value': 'https://example.org/nudat'}}]},
+                  'snaks-order': ['P248', 'P854']}
+
+
+def add_half_life(writer, repo, item, amount=1.5):
+    """A half-life claim with a qualifier and a reference, as APSbot_nuclides.add_half_life makes it."""
+    claim = pywikibot.Claim(repo, 'P2114')
+    claim.setTarget(pywikibot.WbQuantity(amount, unit='http://www.wikidata.org/entity/Q11574', error=0.25))
+    writer.add_claim(item, claim, summary='Adding half-life claim from NNDC.')
+    qualifier = pywikibot.Claim(repo, 'P2571')
+    qualifier.setTarget(pywikibot.ItemPage(repo, 'Q159375'))
+    writer.add_qualifier(claim, qualifier)
+    writer.add_sources(claim, claim_writer.reference_claims(
+        repo, {'P248': ['item', 'Q21234191'], 'P854': ['string', 'https://example.org/nudat']}))
+    return claim
+
+
+def new_item():
+    repo = pywikibot.Site('wikidata', 'wikidata').data_repository()
+    return repo, pywikibot.ItemPage(repo, 'Q1234')
+
+
+def test_separate_mode_makes_an_edit_per_change():
+    repo, item = new_item()
+    writer = claim_writer.ClaimWriter(repo, 'separate')
+    claim = add_half_life(writer, repo, item)
+    writer.flush()
+
+    assert [edit[0] for edit in repo.sent] == ['wbcreateclaim', 'wbsetqualifier', 'wbsetreference']
+    assert repo.sent[0][1]['mainsnak'] == half_life_json
+    assert repo.sent[1] == ('wbsetqualifier', claim.snak, qualifier_json)
+    assert repo.sent[2] == ('wbsetreference', claim.snak, reference_json)
+    assert writer.edits == 3
+
+
+def test_claim_mode_sends_the_whole_claim_with_a_new_guid():
+    repo, item = new_item()
+    writer = claim_writer.ClaimWriter(repo, 'claim')
+    add_half_life(writer, repo, item)
+    assert repo.sent == []  # nothing goes out before flush()
+    writer.flush()
+
+    assert len(repo.sent) == 1
+    action, sent = repo.sent[0]
+    assert action == 'wbsetclaim'
+    assert guid.match(sent['id'])
+    assert sent['mainsnak'] == half_life_json
+    assert sent['qualifiers'] == {'P2571': [qualifier_json]}
+    assert sent['qualifiers-order'] == ['P2571']
+    assert sent['references'] == [reference_json]
+    assert writer.edits == 1
+
+
+def test_claim_mode_keeps_an_existing_guid():
+    repo, item = new_item()
+    claim = pywikibot.Claim(repo, 'P2114')
+    claim.setTarget(pywikibot.WbQuantity(1.5, error=0.25))
+    claim.snak = 'Q1234$0A2B1C3D-0000-0000-0000-000000000000'
+    writer = claim_writer.ClaimWriter(repo, 'claim')
+    writer.add_claim(item, claim)
+    writer.flush()
+
+    assert [sent['id'] for action, sent in repo.sent] == ['Q1234$0A2B1C3D-0000-0000-0000-000000000000']
+
+
+def test_claim_mode_sends_each_claim_separately():
+    repo, item = new_item()
+    writer = claim_writer.ClaimWriter(repo, 'claim')
+    add_half_life(writer, repo, item, 1.5)
+    add_half_life(writer, repo, item, 2.5)
+    writer.flush()
+
+    assert [action for action, sent in repo.sent] == ['wbsetclaim', 'wbsetclaim']
+    assert [sent['mainsnak']['datavalue']['value']['amount'] for action, sent in repo.sent] == ['+1.5', '+2.5']
+
+
+def test_item_mode_sends_every_claim_in_one_edit():
+    repo, item = new_item()
+    writer = claim_writer.ClaimWriter(repo, 'item')
+    add_half_life(writer, repo, item, 1.5)
+    add_half_life(writer, repo, item, 2.5)
+    writer.flush()
+
+    assert len(repo.sent) == 1
+    action, data = repo.sent[0]
+    assert action == 'wbeditentity'
+    assert [claim['mainsnak'] for claim in data['claims']] == [
+        half_life_json, dict(half_life_json, datavalue={'type': 'quantity', 'value': {
+            'amount': '+2.5', 'unit': 'http://www.wikidata.org/entity/Q11574',
+            'upperBound': '+2.75', 'lowerBound': '+2.25'}})]
+    for claim in data['claims']:
+        assert 'id' not in claim  # wbeditentity makes the new statements' GUIDs
+        assert claim['qualifiers'] == {'P2571': [qualifier_json]}
+        assert claim['references'] == [reference_json]
+    assert len(item.claims['P2114']) == 2  # visible to later checks before it was sent
+    assert writer.edits == 1
+
+
+def test_discard_drops_unsent_changes():
+    repo, item = new_item()
+    writer = claim_writer.ClaimWriter(repo, 'item')
+    add_half_life(writer, repo, item)
+    writer.discard()
+    writer.flush()
+
+    assert repo.sent == []
@@ -0,0 +1,78 @@
+import pywikibot  # the stand-in from conftest.py
+import claim_writer
+import APSbot_nuclides
+import APSbot_nuclide_decays
+import APSbot_nuclide_spin_parity
+import APSbot_nuclide_abundances
+
+url = 'https://www.nndc.bnl.gov/nudat2/getdataset.jsp?nucleus=3H&unc=nds'
+
+
+def plan_and_write(planner, item, rows, mode='item'):
+    """The edits planner makes for rows, all of them planned before any is made (as the edit
+    pipeline does), and then sent through a claim writer; returns the API calls made."""
+    repo = item.repo
+    writer = claim_writer.ClaimWriter(repo, mode)
+    for function, arguments in planner(writer, item, rows):
+        function(*arguments)
+    writer.flush()
+    return repo.sent
+
+
+def new_item():
+    repo = pywikibot.Site('wikidata', 'wikidata').data_repository()
+    return pywikibot.ItemPage(repo, 'Q1234')
+
+
+def sent_properties(sent):
+    assert [action for action, data in sent] == ['wbeditentity']
+    return [claim['mainsnak']['property'] for claim in sent[0][1]['claims']]
+
+
+def test_repeated_half_life_row_adds_one_claim():
+    row = ['Q1234', '12.32', '0.02', 'Q1092296', 'y', 'hydrogen-3', url]
+    sent = plan_and_write(APSbot_nuclides.plan_half_lives, new_item(), [row, list(row)])
+    assert sent_properties(sent) == ['P2114']
+
+
+def test_different_half_lives_add_a_claim_each():
+    rows = [['Q1234', '12.32', '0.02', 'Q1092296', 'y', 'hydrogen-3', url],
+            ['Q1234', '4500', '8', 'Q573', 'd', 'hydrogen-3', url]]
+    sent = plan_and_write(APSbot_nuclides.plan_half_lives, new_item(), rows)
+    assert sent_properties(sent) == ['P2114', 'P2114']
+
+
+def test_repeated_decay_row_adds_one_claim():
+    row = ['Q1234', 'β-', 'Q14643', '100.0', 'Q2', 'hydrogen-3', url]
+    sent = plan_and_write(APSbot_nuclide_decays.plan_decays, new_item(), [row, list(row)])
+    assert sent_properties(sent) == ['P816']
+    claim = sent[0][1]['claims'][0]
+    assert [len(claim['qualifiers'][prop]) for prop in claim['qualifiers-order']] == [1, 1]
+    assert len(claim['references']) == 1
+
+
+def test_repeated_decay_row_sources_an_existing_claim_once():
+    item = new_item()
+    claim = pywikibot.Claim(item.repo, 'P816')
+    claim.setTarget(pywikibot.ItemPage(item.repo, 'Q2'))
+    mode = pywikibot.Claim(item.repo, 'P817')
+    mode.setTarget(pywikibot.ItemPage(item.repo, 'Q14643'))
+    claim.qualifiers['P817'] = [mode]
+    claim.snak = 'Q1234$0A2B1C3D-0000-0000-0000-000000000000'
+    item.claims['P816'] = [claim]
+    row = ['Q1234', 'β-', 'Q14643', 'None', 'Q2', 'hydrogen-3', url]
+
+    sent = plan_and_write(APSbot_nuclide_decays.plan_decays, item, [row, list(row)], mode='separate')
+    assert [action for action, guid, data in sent] == ['wbsetreference']
+
+
+def test_repeated_spin_parity_row_adds_one_claim_each():
+    row = ['Q1234', '0.5', '1', 'hydrogen-3', url]
+    sent = plan_and_write(APSbot_nuclide_spin_parity.plan_spin_parity, new_item(), [row, list(row)])
+    assert sent_properties(sent) == ['P1122', 'P1123']
+
+
+def test_repeated_abundance_row_adds_one_claim():
+    row = ['Q1234', '0.0001', 'None', 'hydrogen-3', url]
+    sent = plan_and_write(APSbot_nuclide_abundances.plan_abundances, new_item(), [row, list(row)])
+    assert sent_properties(sent) == ['P2374']
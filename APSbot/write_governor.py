@@ -0,0 +1,164 @@
+#
+# Adaptive pacing of Wikidata edits shared by the bot scripts
+#
+import sys
+import threading
+import time
+
+
+def throttle_delay(error, default=60.0):
+    """Seconds to wait if error says the servers are lagged or throttling us, else None.
+
+    Understands wikidataintegrator's WDApiError (the API error json in
+    wd_error_msg), pywikibot's APIError (code/other) and requests'
+    HTTPError (429/503 with a Retry-After header).
+    """
+    response = getattr(error, 'response', None)
+    if response is not None and getattr(response, 'status_code', None) in (429, 503):
+        try:
+            return float(response.headers.get('Retry-After', default))
+        except ValueError:
+            return default
+    api_error = getattr(error, 'wd_error_msg', None)
+    if isinstance(api_error, dict):
+        api_error = api_error.get('error', {})
+        messages = set(message.get('name') for message in api_error.get('messages', []))
+        if api_error.get('code') == 'maxlag':
+            return float(api_error.get('lag', default))
+        if api_error.get('code') == 'ratelimited' or 'actionthrottledtext' in messages:
+            return default
+        return None
+    code = getattr(error, 'code', None)
+    if code == 'maxlag':
+        return float(getattr(error, 'other', {}).get('lag', default))
+    if code in ('ratelimited', 'actionthrottled'):
+        return default
+    return None
+
+
+class WriteGovernor(object):
+    """Token bucket for edits whose rate (edits per minute) follows the servers.
+
+    Every edit that goes through cleanly adds `increase` edits/min to the
+    rate, up to max_rate; maxlag, rate limit and Retry-After answers halve
+    it (down to min_rate) and hold all edits for the delay the server asked
+    for, less any time the failed call already spent waiting. An edit
+    taking longer than slow_seconds counts as lag too - the client
+    libraries sit out maxlag themselves before returning - but is not held
+    again. Achieved edits per minute go to stderr every report_interval
+    seconds. One governor can pace edits from several threads.
+
+    pywikibot adds its own fixed put throttle on top; call
+    replace_throttle() so the bucket alone sets the pace.
+    """
+
+    def __init__(self, rate=30.0, min_rate=4.0, max_rate=120.0, burst=3, increase=0.5, decrease=0.5,
+                 slow_seconds=20.0, max_retries=5, report_interval=300.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_seconds = slow_seconds
+        self.max_retries = max_retries
+        self.report_interval = report_interval
+        self.tokens = 1.0
+        self.refilled = time.monotonic()
+        self.hold_until = 0.0
+        self.started = None
+        self.edits = 0
+        self.backoffs = 0
+        self.reported = time.monotonic()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def replace_throttle(config, throttle=None):
+        """Switch off pywikibot's put throttle - config (pywikibot.config) and throttle, a
+        site's Throttle created before this call - leaving write pacing to the governor."""
+        config.put_throttle = 0
+        if throttle is not None:
+            throttle.writedelay = 0
+
+    def wait(self):
+        """Sleep until the next edit may go out."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.hold_until:
+                    delay = self.hold_until - now
+                else:
+                    self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate / 60.0)
+                    self.refilled = now
+                    if self.tokens >= 1.0:
+                        self.tokens -= 1.0
+                        return
+                    delay = (1.0 - self.tokens) * 60.0 / self.rate
+            time.sleep(delay)
+
+    def success(self):
+        with self.lock:
+            self.edits += 1
+            self.rate = min(self.max_rate, self.rate + self.increase)
+        if time.monotonic() - self.reported > self.report_interval:
+            self.report()
+
+    def backoff(self, delay=None):
+        with self.lock:
+            self.backoffs += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = 0.0
+            self.refilled = time.monotonic()
+            if delay is not None:
+                self.hold_until = max(self.hold_until, time.monotonic() + delay)
+
+    def edit(self, function, *args, **kwargs):
+        """Call function(*args, **kwargs) - one edit - when the bucket allows, retrying it after lag errors.
+
+        Only for edits that can safely be sent twice; use edit_once() for item creation.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.attempt(function, args, kwargs)
+            except Exception as error:
+                if throttle_delay(error) is None or attempt == self.max_retries:
+                    raise
+
+    def edit_once(self, function, *args, **kwargs):
+        """Like edit(), but never calls function again: a create that timed out or was
+        answered with an error may still have gone through, and repeating it would make a
+        duplicate item. Lag errors slow the governor down as usual, then are raised."""
+        return self.attempt(function, args, kwargs)
+
+    def attempt(self, function, args, kwargs):
+        if self.started is None:
+            self.started = time.monotonic()
+        self.wait()
+        start = time.monotonic()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as error:
+            delay = throttle_delay(error)
+            if delay is not None:
+                # The client library may already have sat out part of the lag
+                delay = max(0.0, delay - (time.monotonic() - start))
+                print('Server lagged or throttling ({0}); waiting {1:.0f}s'.format(error, delay), file=sys.stderr)
+                self.backoff(delay)
+            raise
+        if time.monotonic() - start > self.slow_seconds:
+            self.backoff()
+            with self.lock:
+                self.edits += 1
+        else:
+            self.success()
+        return result
+
+    def edits_per_minute(self):
+        if self.started is None or self.edits == 0:
+            return 0.0
+        return 60.0 * self.edits / max(time.monotonic() - self.started, 1.0)
+
+    def report(self):
+        self.reported = time.monotonic()
+        print('{0} edits, {1:.1f} edits/min achieved, pacing at {2:.1f}/min, {3} backoffs'.format(
+            self.edits, self.edits_per_minute(), self.rate, self.backoffs), file=sys.stderr)
@@ -0,0 +1,93 @@
+#
+# Time transforms.chart_changes against the per-nuclide comparison it
+# replaced (half_life_values, timespans_differ, decay_mode_values, ...) on a
+# synthetic chart, and check that the two find the same changes.
+#
+import random
+import sys
+import timeit
+import nndc_data
+import nuclides
+import transforms
+import units
+
+nuclide_count = int(sys.argv[1]) if len(sys.argv) > 1 else 3400
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+half_life_units = ['s', 's', 'ms', 'm', 'h', 'd', 'y', 'ns', 'ps', 'keV', 'eV', 'MeV', None]
+decay_mode_strings = list(nndc_data.decay_modes_to_qids.keys()) + ['SF', '2β+']
+spin_strings = [None, '0', '1/2', '3/2', '5/2', '2', '7/2']
+
+
+def synthetic_chart(count, seed=1):
+    """count (Wikidata nuclide, nndc nuclide dict) pairs, about half of them differing somewhere."""
+    rng = random.Random(seed)
+    chart = []
+    for k in range(count):
+        z, n = 1 + k // 30, k % 30 + k // 30
+        unit = rng.choice(half_life_units)
+        value = None if unit is None else rng.uniform(1.0e-3, 1.0e3) * (1.0e-16 if rng.random() < 0.02 else 1.0)
+        modes = [{'mode': rng.choice(decay_mode_strings), 'pct': rng.uniform(0, 100)}
+                 for branch in range(rng.randint(0, 3))]
+        spin = rng.choice(spin_strings)
+        parity = rng.choice([None, '+1', '-1'])
+        abundance = rng.uniform(0, 1) if rng.random() < 0.1 else None
+        nndc_nuclide = {'source_url': nndc_data.nndc_page_url(z, n), 'level': '0.0',
+                        'half_life': {'value': value, 'unit': unit,
+                                      'uncertainty': None if value is None else value * 0.01},
+                        'abundance': {'value': abundance, 'uncertainty': None},
+                        'spin': spin, 'parity': parity, 'decay_modes': modes}
+        seconds = None
+        half_life, uncertainty, time_unit_qid, label = transforms.half_life_values(nndc_nuclide['half_life'])
+        if time_unit_qid is not None and rng.random() < 0.5:
+            seconds = units.time_in_seconds(half_life, time_unit_qid)
+        mode_qids = [int(qid.replace('Q', '')) for qid in
+                     (nndc_data.nndc_decay_id(mode['mode']) for mode in modes if rng.random() < 0.5)
+                     if qid is not None and '|' not in qid]
+        wikidata_spin, wikidata_parity = transforms.spin_parity_values(spin, parity)
+        if rng.random() < 0.3:
+            wikidata_spin = None
+        chart.append((nuclides.NuclideRow(z, n, 0, 'Q{0}'.format(k + 1), 'nuclide {0}'.format(k), seconds,
+                                          mode_qids, wikidata_spin, wikidata_parity,
+                                          abundance if rng.random() < 0.5 else None, []),
+                      nndc_nuclide))
+    return chart
+
+
+def per_nuclide_changes(chart, nuclide_index):
+    """The comparison get_nndc_all.py used to make one nuclide at a time, as a ChangeSet."""
+    changes = transforms.ChangeSet([], [], [], [])
+    for k, (nuclide, nndc_nuclide) in enumerate(chart):
+        half_life, hl_unc, time_unit_qid, time_unit_label = transforms.half_life_values(nndc_nuclide['half_life'])
+        if (time_unit_qid is not None) and transforms.timespans_differ(half_life, time_unit_qid, nuclide.half_life):
+            changes.half_life.append(transforms.HalfLifeChange(k, half_life, hl_unc, time_unit_qid, time_unit_label))
+        for decay_mode in nndc_nuclide['decay_modes']:
+            mode, mode_qid, mode_qid_num, pct, decays_to = transforms.decay_mode_values(
+                decay_mode, nuclide.atomic_number, nuclide.neutron_number, nuclide_index)
+            if mode_qid_num not in nuclide.decay_modes:
+                changes.decays.append(transforms.DecayChange(k, mode, mode_qid, pct, decays_to))
+        spin, parity = transforms.spin_parity_values(nndc_nuclide['spin'], nndc_nuclide['parity'])
+        if (spin != nuclide.spin) or (parity != nuclide.parity):
+            changes.spin_parity.append(transforms.SpinParityChange(k, spin, parity))
+        abundance, ab_unc = transforms.abundance_values(nndc_nuclide['abundance'])
+        if transforms.float_values_differ(abundance, nuclide.abundance):
+            changes.abundance.append(transforms.AbundanceChange(k, abundance, ab_unc))
+    return changes
+
+
+chart = synthetic_chart(nuclide_count)
+wikidata_nuclides = [nuclide for nuclide, nndc_nuclide in chart]
+nndc_nuclides = [nndc_nuclide for nuclide, nndc_nuclide in chart]
+nuclide_index = nuclides.NuclideIndex(wikidata_nuclides, nndc_data.decay_mode_net_changes)
+
+expected = per_nuclide_changes(chart, nuclide_index)
+found = transforms.chart_changes(wikidata_nuclides, nndc_nuclides, nuclide_index)
+for name, expected_changes, found_changes in zip(transforms.ChangeSet._fields, expected, found):
+    print('{0:>12}: {1} changes{2}'.format(name, len(found_changes),
+                                            '' if found_changes == expected_changes else ' - DIFFERS'))
+
+for name, compare in (('per nuclide', lambda: per_nuclide_changes(chart, nuclide_index)),
+                      ('chart', lambda: transforms.chart_changes(wikidata_nuclides, nndc_nuclides,
+                                                                 nuclide_index))):
+    best = min(timeit.repeat(compare, number=1, repeat=repeat))
+    print('{0:>12}: {1:.4f} s total, {2:.2f} us/nuclide'.format(name, best, 1.0e6 * best / nuclide_count))
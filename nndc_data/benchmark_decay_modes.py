@@ -0,0 +1,81 @@
+#
+# Time decay mode string parsing over every decay mode string in a captured
+# chart - saved NuDat pages, either .html files or the json entries of a page
+# cache directory (default ./nudat_cache) - against the old split-on-spaces
+# parser, and list the strings where the two disagree.
+#
+import re
+import sys
+import timeit
+import nndc_data
+from benchmark_parse import load_pages
+
+
+def split_decay_modes_from_text(decay_modes_string):
+    """The previous parser, for comparison: splits on spaces and drops qualifiers."""
+    if decay_modes_string is None:
+        return []
+    decay_modes = []
+    current_mode = None
+    for part in decay_modes_string.split(' '):
+        if part in ('', '%', ':', '<', '>', u'≤', u'≥', u'≈'):
+            continue
+        if re.match(r'\d+\.?\d*[-E\d]*$', part) is None:
+            if current_mode is not None:
+                decay_modes.append({'mode': current_mode})
+            current_mode = part
+        else:
+            decay_modes.append({'mode': current_mode, 'pct': float(part)})
+            current_mode = None
+    if current_mode is not None:
+        decay_modes.append({'mode': current_mode})
+    return decay_modes
+
+
+def without_qualifiers(decay_modes):
+    return [dict((key, value) for key, value in decay_mode.items() if key != 'qualifier')
+            for decay_mode in decay_modes]
+
+
+page_dir = sys.argv[1] if len(sys.argv) > 1 else 'nudat_cache'
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+strings = [entries[-1].text_content()
+           for page_text in load_pages(page_dir)
+           for entries in nndc_data.cp_rows_from_html(page_text)]
+if len(strings) == 0:
+    sys.exit('No decay mode strings found in {0}'.format(page_dir))
+
+qualified = 0
+differing = []
+for decay_modes_string in set(strings):
+    decay_modes = nndc_data.decay_modes_from_text(decay_modes_string)
+    if any('qualifier' in decay_mode for decay_mode in decay_modes):
+        qualified += 1
+    if without_qualifiers(decay_modes) != split_decay_modes_from_text(decay_modes_string):
+        differing.append(decay_modes_string)
+
+print('{0} decay mode strings, {1} distinct, {2} with qualifiers kept'.format(
+    len(strings), len(set(strings)), qualified))
+for decay_modes_string in sorted(differing):
+    print('  differs: {0!r}: {1} (was {2})'.format(decay_modes_string,
+                                                   nndc_data.decay_modes_from_text(decay_modes_string),
+                                                   split_decay_modes_from_text(decay_modes_string)))
+
+
+def parse_uncached():
+    parse = nndc_data.parse_decay_modes.__wrapped__  # bypassing the memo
+    return [[dict(branch) for branch in parse(decay_modes_string)] for decay_modes_string in strings]
+
+
+def parse_cached():
+    return [nndc_data.decay_modes_from_text(decay_modes_string) for decay_modes_string in strings]
+
+
+def parse_split():
+    return [split_decay_modes_from_text(decay_modes_string) for decay_modes_string in strings]
+
+
+parse_cached()
+for name, parse in (('split', parse_split), ('grammar', parse_uncached), ('cached', parse_cached)):
+    best = min(timeit.repeat(parse, number=1, repeat=repeat))
+    print('{0:>8}: {1:.4f} s total, {2:.2f} us/string'.format(name, best, 1.0e6 * best / len(strings)))
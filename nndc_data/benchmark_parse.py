@@ -0,0 +1,46 @@
+#
+# Time the streaming cp-row extraction against the full DOM path on saved
+# NuDat pages: either .html files or the json entries of a page cache
+# directory (default ./nudat_cache).
+#
+import json
+import os
+import sys
+import timeit
+import nndc_data
+
+
+def load_pages(directory):
+    pages = []
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if filename.endswith('.json'):
+            with open(path, encoding='utf-8') as page_file:
+                pages.append(json.load(page_file)['text'])
+        elif filename.endswith('.html') or filename.endswith('.htm'):
+            with open(path, encoding='utf-8') as page_file:
+                pages.append(page_file.read())
+    return pages
+
+
+def parse_all(pages, rows_from):
+    return [nndc_data.NuclidePage(page_text, None, rows_from=rows_from).levels for page_text in pages]
+
+
+if __name__ == '__main__':
+    page_dir = sys.argv[1] if len(sys.argv) > 1 else 'nudat_cache'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    pages = load_pages(page_dir)
+    if len(pages) == 0:
+        sys.exit('No saved pages found in {0}'.format(page_dir))
+
+    mismatches = 0
+    for dom_levels, stream_levels in zip(parse_all(pages, nndc_data.cp_rows_from_tree),
+                                         parse_all(pages, nndc_data.cp_rows_from_html)):
+        if dom_levels != stream_levels:
+            mismatches += 1
+
+    print('{0} pages, {1} with differing levels'.format(len(pages), mismatches))
+    for name, rows_from in (('dom', nndc_data.cp_rows_from_tree), ('stream', nndc_data.cp_rows_from_html)):
+        best = min(timeit.repeat(lambda: parse_all(pages, rows_from), number=1, repeat=repeat))
+        print('{0:>6}: {1:.3f} s total, {2:.3f} ms/page'.format(name, best, 1000.0 * best / len(pages)))
@@ -0,0 +1,48 @@
+#
+# Build an SQLite snapshot of NNDC level data for every nuclide, from NuDat
+# (for the Z/N pairs of the Wikidata nuclides) or from local ENSDF files.
+#
+import argparse
+import itertools
+import nuclides
+import nndc_data
+import nndc_crawler
+import nndc_snapshot
+import ensdf_data
+
+parser = argparse.ArgumentParser(description='Build an SQLite snapshot of NNDC nuclide level data.')
+parser.add_argument('snapshot', help='snapshot database file to write')
+parser.add_argument('--ensdf', nargs='+', metavar='FILE',
+                    help='read levels from local ENSDF files instead of NuDat')
+parser.add_argument('--workers', type=int, default=1,
+                    help='number of NuDat pages to fetch concurrently')
+parser.add_argument('--rate', type=float, default=4.0,
+                    help='maximum NuDat requests per second')
+nuclides.add_sparql_cache_argument(parser)
+args = parser.parse_args()
+nuclides.sparql_cache_from_args(args)
+
+
+def nudat_pages():
+    nuclide_list = nuclides.SparqlNuclideProvider().get_nuclides()
+    keys = [key for key, group in
+            itertools.groupby(nuclide_list, key=lambda nuclide: (nuclide.atomic_number, nuclide.neutron_number))]
+    crawler = nndc_crawler.NudatCrawler(workers=args.workers, requests_per_second=args.rate)
+    for key, page in crawler.pages(keys):
+        if isinstance(page, Exception):
+            yield key, page
+        else:
+            yield key, nndc_data.NuclidePage(page.text, page.url)
+
+
+def ensdf_pages():
+    ensdf = ensdf_data.EnsdfData(args.ensdf)
+    for key in sorted(ensdf.levels.keys()):
+        yield key, ensdf.levels_for(*key)
+
+
+if args.ensdf:
+    stored = nndc_snapshot.build_snapshot(args.snapshot, ensdf_pages(), 'ensdf')
+else:
+    stored = nndc_snapshot.build_snapshot(args.snapshot, nudat_pages(), 'nudat')
+print('Stored {0} nuclides in {1}'.format(stored, args.snapshot))
@@ -0,0 +1,56 @@
+#
+# Audit the decay graph of the Wikidata nuclides (optionally with NNDC branches
+# from a snapshot or local ENSDF files): branching sums, dangling daughters, cycles
+#
+import argparse
+import csv
+import sys
+import time
+import nuclides
+import nndc_data
+import nndc_snapshot
+import ensdf_data
+import decay_graph
+
+parser = argparse.ArgumentParser(description='Check the nuclide decay graph for consistency.')
+parser.add_argument('--snapshot', metavar='FILE',
+                    help='add NNDC decay branches from a snapshot built by build_nndc_snapshot.py')
+parser.add_argument('--ensdf', nargs='+', metavar='FILE',
+                    help='add NNDC decay branches from local ENSDF files')
+parser.add_argument('--tolerance', type=float, default=0.01,
+                    help='allowed difference of branch fraction sums from 1')
+parser.add_argument('--wikidata-dump', metavar='FILE',
+                    help='read the Wikidata nuclides from a local json dump (.gz or .bz2) instead of the query service')
+nuclides.add_sparql_cache_argument(parser)
+args = parser.parse_args()
+nuclides.sparql_cache_from_args(args)
+
+if args.wikidata_dump:
+    table = nuclides.DumpNuclideProvider(args.wikidata_dump).get_table()
+else:
+    table = nuclides.SparqlNuclideProvider().get_table()
+graph = decay_graph.DecayGraph.from_table(table)
+
+level_store = None
+if args.snapshot:
+    level_store = nndc_snapshot.NndcSnapshot(args.snapshot)
+elif args.ensdf:
+    level_store = ensdf_data.EnsdfData(args.ensdf)
+if level_store is not None:
+    nuclide_index = nuclides.NuclideIndex(table.rows(), nndc_data.decay_mode_net_changes)
+    for row in table.sorted_order():
+        z = table.atomic_number[row]
+        n = table.neutron_number[row]
+        nndc_nuclide = level_store.levels_for(z, n).nuclide_data(table.isomer_index[row])
+        if len(nndc_nuclide) > 0:
+            graph.add_nndc_branches(table.item_id[row], z, n, nndc_nuclide['decay_modes'], nuclide_index)
+
+start = time.time()
+issues = graph.audit(args.tolerance)
+elapsed = time.time() - start
+
+writer = csv.writer(sys.stdout)
+for issue in sorted(issues):
+    writer.writerow([issue.check, issue.item_id, graph.nodes.get(issue.item_id), issue.message])
+print('{0} issues in {1} nuclides; audit took {2:.3f}s'.format(len(issues), len(graph.nodes), elapsed),
+      file=sys.stderr)
@@ -0,0 +1,239 @@
+#
+# Decay graph of the chart of nuclides - decays-to (P816) links from Wikidata plus NNDC branches
+#
+from collections import defaultdict, namedtuple
+import nndc_data
+
+# mode_qid is '|'-joined for multi-step decays; fraction is 0-1, None if not given;
+# source is 'wikidata' or 'nndc'
+DecayBranch = namedtuple('DecayBranch', ['parent', 'daughter', 'mode_qid', 'fraction', 'source'])
+
+DecayIssue = namedtuple('DecayIssue', ['check', 'item_id', 'message'])
+
+
+class DecayGraph(object):
+    """Nuclides (by item id) linked to their daughters by decay branches.
+
+    Strongly connected components are found once (Tarjan), which gives the
+    topological order, the cycles and the per-node closures; all of them
+    are worked out on first use and kept until a branch is added.
+    """
+
+    def __init__(self):
+        self.nodes = {}  # item id -> label
+        self.stable = set()
+        self.branches = defaultdict(list)
+        self.components = None
+        self.closures = None
+
+    def add_nuclide(self, item_id, label=None, stable=False):
+        self.nodes[item_id] = label
+        if stable:
+            self.stable.add(item_id)
+
+    def add_branch(self, branch):
+        self.branches[branch.parent].append(branch)
+        self.components = None
+        self.closures = None
+
+    @classmethod
+    def from_table(cls, table):
+        """Graph of a nuclides.NuclideTable, one branch per Wikidata decay statement."""
+        graph = cls()
+        for row in range(len(table)):
+            graph.add_nuclide(table.item_id[row], table.label[row], table.stable[row] == 1)
+        for row in range(len(table)):
+            statements = []
+            statement_modes = {}
+            statement_values = {}
+            for k in range(table.decay_mode_offsets[row], table.decay_mode_offsets[row + 1]):
+                statement = table.decay_statements[k]
+                if statement not in statement_modes:
+                    statements.append(statement)
+                    statement_modes[statement] = []
+                    statement_values[statement] = (table.decay_to[k], table.decay_fractions[k])
+                statement_modes[statement].append('Q{0}'.format(table.decay_modes[k]))
+            for statement in statements:
+                daughter, fraction = statement_values[statement]
+                graph.add_branch(DecayBranch(table.item_id[row], daughter, '|'.join(statement_modes[statement]),
+                                             fraction, 'wikidata'))
+        return graph
+
+    def add_nndc_branches(self, item_id, z, n, decay_modes, nuclide_index):
+        """Add NNDC decay modes (the nndc_data 'decay_modes' list) for nuclide item_id (Z, N).
+
+        Daughters come from nuclide_index (a nuclides.NuclideIndex built with
+        nndc_data.decay_mode_net_changes); they are None where Wikidata has
+        no item for the daughter.
+        """
+        for decay_mode in decay_modes:
+            mode_qid = nndc_data.nndc_decay_id(decay_mode['mode'])
+            if mode_qid is None:
+                continue
+            fraction = None
+            if decay_mode.get('pct') is not None:
+                fraction = 0.01 * decay_mode['pct']
+            self.add_branch(DecayBranch(item_id, nuclide_index.daughter(z, n, mode_qid), mode_qid,
+                                        fraction, 'nndc'))
+
+    def daughters(self, item_id):
+        """Known daughter item ids of item_id, each once, in branch order."""
+        daughters = []
+        for branch in self.branches.get(item_id, []):
+            if branch.daughter is not None and branch.daughter not in daughters:
+                daughters.append(branch.daughter)
+        return daughters
+
+    def strongly_connected_components(self):
+        """Components in reverse topological order (daughters before parents)."""
+        if self.components is not None:
+            return self.components
+        nodes = set(self.nodes)
+        for parent in list(self.branches):
+            nodes.add(parent)
+            nodes.update(self.daughters(parent))
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        components = []
+        for root in sorted(nodes):
+            if root in index:
+                continue
+            # Iterative Tarjan: work holds (node, iterator over its daughters)
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.daughters(root)))]
+            while work:
+                node, daughters = work[-1]
+                advanced = False
+                for daughter in daughters:
+                    if daughter not in index:
+                        index[daughter] = lowlink[daughter] = len(index)
+                        stack.append(daughter)
+                        on_stack.add(daughter)
+                        work.append((daughter, iter(self.daughters(daughter))))
+                        advanced = True
+                        break
+                    if daughter in on_stack:
+                        lowlink[node] = min(lowlink[node], index[daughter])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        self.components = components
+        return components
+
+    def topological_order(self):
+        """Item ids with every parent before its daughters (members of a cycle are adjacent)."""
+        order = []
+        for component in reversed(self.strongly_connected_components()):
+            order.extend(component)
+        return order
+
+    def closure(self, item_id):
+        """Every nuclide reachable from item_id by decay (not including item_id unless in a cycle)."""
+        if self.closures is None:
+            self.closures = {}
+            for component in self.strongly_connected_components():
+                members = set(component)
+                reachable = set()
+                for member in component:
+                    for daughter in self.daughters(member):
+                        reachable.add(daughter)
+                        if daughter not in members:
+                            reachable.update(self.closures[daughter])
+                for member in component:
+                    self.closures[member] = reachable
+        return self.closures.get(item_id, frozenset())
+
+    def chains(self, item_id):
+        """Every decay chain from item_id as a list of item ids, ending where nothing
+        more is known (normally a stable nuclide). Edges back into a cycle are not followed."""
+        memo = {}
+        cyclic = self.cyclic_nodes()
+
+        def chains_from(node, seen):
+            if node in memo:
+                return memo[node]
+            seen = seen | {node}
+            daughters = [daughter for daughter in self.daughters(node) if daughter not in seen]
+            if len(daughters) == 0:
+                result = [[node]]
+            else:
+                result = [[node] + chain for daughter in daughters
+                          for chain in chains_from(daughter, seen)]
+            if node not in cyclic:
+                memo[node] = result
+            return result
+
+        return chains_from(item_id, frozenset())
+
+    def cyclic_nodes(self):
+        cyclic = set()
+        for component in self.strongly_connected_components():
+            if len(component) > 1 or component[0] in self.daughters(component[0]):
+                cyclic.update(component)
+        return cyclic
+
+    def check_branching(self, tolerance=0.01, source='wikidata'):
+        """Nuclides whose single-step branch fractions (from source) don't add up to 1.
+
+        Multi-step modes such as β-n are a share of their first step, so they
+        are left out of the sum; nuclides with a branch of unknown fraction
+        are skipped.
+        """
+        issues = []
+        for parent, branches in self.branches.items():
+            if parent in self.stable:
+                continue
+            fractions = [branch.fraction for branch in branches
+                         if branch.source == source and '|' not in branch.mode_qid]
+            if len(fractions) == 0 or None in fractions:
+                continue
+            total = sum(fractions)
+            if abs(total - 1.0) > tolerance:
+                issues.append(DecayIssue('branching', parent,
+                                         '{0} branch fractions sum to {1:.4g}'.format(source, total)))
+        return issues
+
+    def check_dangling(self):
+        """Branches whose daughter is not a nuclide in the chart, or has no item at all."""
+        issues = []
+        for parent, branches in self.branches.items():
+            for branch in branches:
+                if branch.daughter is None:
+                    if branch.source == 'nndc' and branch.mode_qid in nndc_data.decay_mode_net_changes:
+                        issues.append(DecayIssue('dangling', parent,
+                                                 'no item for {0} daughter via {1}'.format(branch.source,
+                                                                                           branch.mode_qid)))
+                elif branch.daughter not in self.nodes:
+                    issues.append(DecayIssue('dangling', parent,
+                                             '{0} daughter {1} via {2} is not a nuclide'.format(
+                                                 branch.source, branch.daughter, branch.mode_qid)))
+        return issues
+
+    def check_cycles(self):
+        issues = []
+        for component in self.strongly_connected_components():
+            if len(component) > 1 or component[0] in self.daughters(component[0]):
+                issues.append(DecayIssue('cycle', min(component),
+                                         'decay cycle through {0}'.format(' '.join(sorted(component)))))
+        return issues
+
+    def audit(self, tolerance=0.01):
+        """All checks across the whole chart."""
+        return (self.check_branching(tolerance, 'wikidata') + self.check_branching(tolerance, 'nndc') +
+                self.check_dangling() + self.check_cycles())
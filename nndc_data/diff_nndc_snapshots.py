@@ -0,0 +1,22 @@
+#
+# List the (Z, N, isomer index) levels that differ between two snapshots
+#
+import argparse
+import csv
+import os
+import sys
+import nndc_snapshot
+
+parser = argparse.ArgumentParser(description='Compare two NNDC snapshots.')
+parser.add_argument('old_snapshot')
+parser.add_argument('new_snapshot')
+args = parser.parse_args()
+for filename in (args.old_snapshot, args.new_snapshot):
+    if not os.path.exists(filename):
+        parser.error('no snapshot {0}'.format(filename))
+
+snapshot = nndc_snapshot.NndcSnapshot(args.new_snapshot)
+writer = csv.writer(sys.stdout)
+for z, n, isomer_index in snapshot.changed_levels(args.old_snapshot):
+    writer.writerow([z, n, isomer_index])
+snapshot.close()
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+#
+# Read nuclide level data from local ENSDF files (the 80-column card format
+# NuDat is built from) instead of scraping one NuDat page per nuclide.
+#
+# Only ADOPTED LEVELS datasets are used: the first level record is the
+# ground state, and levels flagged metastable (M, M1, M2...) in columns
+# 78-79 are the isomers. Decay branches and isotopic abundance come from
+# the %xx= continuation records of each level.
+#
+import bz2
+import gzip
+import re
+import nndc_data
+
+element_symbols = [
+    'NN', 'H', 'HE', 'LI', 'BE', 'B', 'C', 'N', 'O', 'F', 'NE',
+    'NA', 'MG', 'AL', 'SI', 'P', 'S', 'CL', 'AR', 'K', 'CA',
+    'SC', 'TI', 'V', 'CR', 'MN', 'FE', 'CO', 'NI', 'CU', 'ZN',
+    'GA', 'GE', 'AS', 'SE', 'BR', 'KR', 'RB', 'SR', 'Y', 'ZR',
+    'NB', 'MO', 'TC', 'RU', 'RH', 'PD', 'AG', 'CD', 'IN', 'SN',
+    'SB', 'TE', 'I', 'XE', 'CS', 'BA', 'LA', 'CE', 'PR', 'ND',
+    'PM', 'SM', 'EU', 'GD', 'TB', 'DY', 'HO', 'ER', 'TM', 'YB',
+    'LU', 'HF', 'TA', 'W', 'RE', 'OS', 'IR', 'PT', 'AU', 'HG',
+    'TL', 'PB', 'BI', 'PO', 'AT', 'RN', 'FR', 'RA', 'AC', 'TH',
+    'PA', 'U', 'NP', 'PU', 'AM', 'CM', 'BK', 'CF', 'ES', 'FM',
+    'MD', 'NO', 'LR', 'RF', 'DB', 'SG', 'BH', 'HS', 'MT', 'DS',
+    'RG', 'CN', 'NH', 'FL', 'MC', 'LV', 'TS', 'OG'
+]
+atomic_numbers = dict((symbol, z) for z, symbol in enumerate(element_symbols))
+
+# ENSDF half-life units to the unit strings used on NuDat pages
+time_units = {
+    'Y': 'y', 'D': 'd', 'H': 'h', 'M': 'm', 'S': 's',
+    'MS': 'ms', 'US': u'\xb5S', 'NS': 'ns', 'PS': 'ps', 'FS': 'fs', 'AS': 'as',
+    'EV': 'eV', 'KEV': 'keV', 'MEV': 'MeV'
+}
+
+# ENSDF decay branch codes to the decay mode symbols used on NuDat pages
+decay_modes = {
+    'B-': u'β-',
+    '2B-': u'2β-',
+    'B+': u'β+',
+    'EC': u'ε',
+    'EC+%B+': u'ε',
+    '2EC': u'2ε',
+    'A': u'α',
+    'N': 'n',
+    'P': 'p',
+    '2N': '2n',
+    '2P': '2p',
+    'SF': 'SF',
+    'IT': 'IT',
+    'B-N': u'β-n',
+    'B-2N': u'β-2n',
+    'B-3N': u'β-3n',
+    'B-4N': u'β-4n',
+    'B-A': u'β-α',
+    'B-NA': u'β-nα',
+    'ECA': u'εα',
+    'ECP': u'εp',
+    'EC2P': u'ε2p',
+    'EC3P': u'ε3p',
+    '2A': u'2α'
+}
+
+# ENSDF branch operators as the qualifiers nndc_data.decay_modes_from_text gives
+branch_qualifiers = {
+    '<': '<', 'LT': '<',
+    '>': '>', 'GT': '>',
+    '<=': u'\u2264', 'LE': u'\u2264',
+    '>=': u'\u2265', 'GE': u'\u2265',
+    'AP': u'\u2248',
+    '?': '?'
+}
+
+branch_pattern = re.compile(r'^%([A-Z0-9+%\-]+?)\s*(<=|>=|=|<|>|\bAP\b|\bLT\b|\bGT\b|\bLE\b|\bGE\b|\?)\s*'
+                            r'([\d\.E\+\-]*)\s*(\S*)\s*$')
+
+
+def open_ensdf(filename):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rt', encoding='latin-1')
+    if filename.endswith('.bz2'):
+        return bz2.open(filename, 'rt', encoding='latin-1')
+    return open(filename, encoding='latin-1')
+
+
+def protons_neutrons_from_nucid(nucid):
+    mass_number = nucid[0:3].strip()
+    symbol = nucid[3:5].strip().upper()
+    if not mass_number.isdigit() or symbol not in atomic_numbers:
+        return None
+    protons = atomic_numbers[symbol]
+    return protons, int(mass_number) - protons
+
+
+def isomer_index_from_flag(flag):
+    flag = flag.strip()
+    if not flag.startswith('M'):
+        return None
+    if flag[1:].isdigit():
+        return int(flag[1:])
+    return 1
+
+
+def half_life_from_fields(t_field, dt_field):
+    half_life = t_field.strip()
+    if half_life == '':
+        return None, None, None
+    half_life_unit = None
+    unc = None
+    m = re.search(r'([-\d\.E\+]+)\s+(\S+)\s*$', half_life)
+    if m is not None:
+        hl_string = m.group(1)
+        half_life_unit = time_units.get(m.group(2), m.group(2))
+        half_life = float(hl_string)
+        dt = dt_field.strip()
+        if re.match(r'^[-+]?[\d\.]+([-+][\d\.]+)?$', dt):
+            unc = nndc_data.nds_uncertainty(dt, nndc_data.lowest_increment_of_float_string(hl_string))
+    return half_life, half_life_unit, unc
+
+
+class EnsdfLevel(object):
+    """Fields of one adopted level, filled in from its level and continuation records."""
+
+    def __init__(self, record):
+        record = record.ljust(80)
+        self.energy = record[9:19].strip()
+        self.half_life, self.half_life_unit, self.half_life_unc = half_life_from_fields(record[39:49],
+                                                                                        record[49:55])
+        self.spin, self.parity = nndc_data.spin_parity_from_text(record[21:39])
+        self.isomer_index = isomer_index_from_flag(record[77:79])
+        self.abundance = None
+        self.abundance_unc = None
+        self.decay_modes = []
+
+    def add_continuation(self, record):
+        for field in record[9:80].split('$'):
+            m = branch_pattern.match(field.strip())
+            if m is None:
+                continue
+            code, operator, value, unc = m.group(1), m.group(2), m.group(3), m.group(4)
+            if code == 'IS':
+                if value != '':
+                    self.abundance = float(value) * 0.01  # expressed as %
+                    if unc.isdigit():
+                        self.abundance_unc = 0.01 * float(unc) * nndc_data.lowest_increment_of_float_string(value)
+                continue
+            decay_mode = {'mode': decay_modes.get(code, code)}
+            if value != '':
+                decay_mode['pct'] = float(value)
+            if operator in branch_qualifiers:
+                decay_mode['qualifier'] = branch_qualifiers[operator]
+            self.decay_modes.append(decay_mode)
+
+    def nuclide_level(self):
+        return nndc_data.NuclideLevel(self.energy, self.half_life, self.half_life_unit, self.half_life_unc,
+                                      self.spin, self.parity, self.abundance, self.abundance_unc,
+                                      self.decay_modes)
+
+
+def iter_adopted_levels(lines):
+    """Yield (Z, N, levels) for each ADOPTED LEVELS dataset, levels ground state first.
+
+    Reads lines strictly in order, holding only the current dataset.
+    """
+    nuclide = None
+    levels = []
+    current_level = None
+    expect_identification = True
+    for line in lines:
+        record = line.rstrip('\r\n')
+        if record.strip() == '':  # end record
+            if nuclide is not None and len(levels) > 0:
+                yield nuclide[0], nuclide[1], levels
+            nuclide = None
+            levels = []
+            current_level = None
+            expect_identification = True
+            continue
+        if expect_identification:
+            expect_identification = False
+            if record[9:39].startswith('ADOPTED LEVELS'):
+                nuclide = protons_neutrons_from_nucid(record[0:5])
+            continue
+        if nuclide is None or len(record) < 8 or record[7] != 'L' or record[6] != ' ':
+            continue
+        if record[5] in ' 1':
+            level = EnsdfLevel(record)
+            if len(levels) == 0 or level.isomer_index is not None:
+                levels.append(level)
+            else:
+                level = None
+            current_level = level
+        elif current_level is not None:
+            current_level.add_continuation(record.ljust(80))
+    if nuclide is not None and len(levels) > 0:
+        yield nuclide[0], nuclide[1], levels
+
+
+class EnsdfData(object):
+    """Adopted ground state and isomer levels for every nuclide in a set of ENSDF files.
+
+    Files (plain, .gz or .bz2) are read once, sequentially; levels_for
+    then serves the same NuclideLevels interface as a parsed NuDat page.
+    """
+
+    def __init__(self, filenames):
+        self.levels = {}
+        for filename in filenames:
+            with open_ensdf(filename) as ensdf_file:
+                for protons, neutrons, levels in iter_adopted_levels(ensdf_file):
+                    self.levels[(protons, neutrons)] = self.ordered_levels(levels)
+
+    @staticmethod
+    def ordered_levels(levels):
+        ground = levels[0]
+        isomers = sorted(levels[1:], key=lambda level: level.isomer_index)
+        return [level.nuclide_level() for level in [ground] + isomers]
+
+    def levels_for(self, protons, neutrons):
+        return nndc_data.NuclideLevels(self.levels.get((protons, neutrons), []),
+                                       nndc_data.nndc_page_url(protons, neutrons))
+
+    def all_levels(self, protons, neutrons):
+        return self.levels_for(protons, neutrons).levels
+
+    def all_nuclide_data(self, protons, neutrons, isomer_index):
+        return self.levels_for(protons, neutrons).nuclide_data(isomer_index)
@@ -1,8 +1,19 @@
 #
+import argparse
+import sys
 import nuclides
 import nndc_data
+import nndc_snapshot
 import math
-import sys
+
+parser = argparse.ArgumentParser(description='Write NNDC abundance data for Wikidata nuclides as csv.')
+parser.add_argument('--snapshot', metavar='FILE',
+                    help='read NNDC data from a snapshot built by build_nndc_snapshot.py instead of NuDat')
+nuclides.add_sparql_cache_argument(parser)
+args = parser.parse_args()
+nuclides.sparql_cache_from_args(args)
+if args.snapshot:
+    nndc_data.level_store = nndc_snapshot.NndcSnapshot(args.snapshot)
 
 #
 
@@ -12,10 +23,6 @@ nuclide_provider = nuclide_provider_class()
 
 nuclides = nuclide_provider.get_nuclides()
 
-nuclides_by_protons_neutrons = {}
-for nuclide in nuclides:
-    nuclides_by_protons_neutrons['{}_{}'.format(nuclide.atomic_number, nuclide.neutron_number)] = nuclide.item_id
-
 # Should filter out where nuclides data already includes this value...
 
 for nuclide in nuclides:
@@ -1,60 +1,246 @@
 #
+import argparse
+import itertools
+import traceback
+from collections import OrderedDict
 import nuclides
 import nndc_data
+import nndc_crawler
+import ensdf_data
+import nndc_snapshot
+import sweep_journal
 import transforms
 
 #
 
+parser = argparse.ArgumentParser(description='Compare NNDC nuclide data with Wikidata and write csv files of differences.')
+parser.add_argument('--workers', type=int, default=1,
+                    help='number of NuDat pages to fetch concurrently')
+parser.add_argument('--rate', type=float, default=4.0,
+                    help='maximum NuDat requests per second')
+parser.add_argument('--retries', type=int, default=5,
+                    help='retries (with backoff) for a failed NuDat request')
+parser.add_argument('--changed-only', action='store_true',
+                    help='revalidate every NuDat page and only write rows for pages that changed since last fetched')
+parser.add_argument('--ensdf', nargs='+', metavar='FILE',
+                    help='read levels from local ENSDF files (plain, .gz or .bz2) instead of NuDat')
+parser.add_argument('--snapshot', metavar='FILE',
+                    help='read levels from a snapshot built by build_nndc_snapshot.py instead of NuDat')
+parser.add_argument('--journal', default='get_nndc_all.journal',
+                    help='checkpoint journal; an interrupted run resumes from it (removed once a run completes)')
+parser.add_argument('--restart', action='store_true',
+                    help='ignore any existing journal and start the sweep from scratch')
+parser.add_argument('--error-log', default='get_nndc_all_errors.log',
+                    help='file to record per-nuclide failures in')
+parser.add_argument('--batch-size', type=int, default=200,
+                    help='number of nuclides compared (and journaled) together')
+parser.add_argument('--wikidata-dump', metavar='FILE',
+                    help='read the Wikidata nuclides from a local json dump (.gz or .bz2) instead of the query service')
+nuclides.add_sparql_cache_argument(parser)
+args = parser.parse_args()
+nuclides.sparql_cache_from_args(args)
+
 nuclide_provider_class = nuclides.SparqlNuclideProvider
+nuclide_index_class = nuclides.NuclideIndex
 
-nuclide_provider = nuclide_provider_class()
+if args.wikidata_dump:
+    nuclide_provider = nuclides.DumpNuclideProvider(args.wikidata_dump)
+else:
+    nuclide_provider = nuclide_provider_class()
 
 nuclides = nuclide_provider.get_nuclides()
 
-nuclides_by_protons_neutrons = {}
-for nuclide in nuclides:
-    if nuclide.isomer_index == 0:
-        nuclides_by_protons_neutrons['{}_{}'.format(nuclide.atomic_number, nuclide.neutron_number)] = nuclide.item_id
-
-# Only write out entries where the data is missing on the wikidata side - or otherwise different...
-half_life_file = open('half_life_data.csv', 'w')
-decays_file = open('decays_data.csv', 'w')
-spin_parity_file = open('spin_parity_data.csv', 'w')
-abundance_file = open('abundance_data.csv', 'w')
-
-for nuclide in nuclides:
-    z = nuclide.atomic_number
-    n = nuclide.neutron_number
-    ii = nuclide.isomer_index
-    nndc_nuclide = nndc_data.all_nuclide_data(z, n, ii)
-    if len(nndc_nuclide) == 0:
-        print("Warning: No data found from NNDC for Z={0} N={1} II={2}".format(z, n, ii))
+nuclide_index = nuclide_index_class(nuclides, nndc_data.decay_mode_net_changes)
+
+output_filenames = OrderedDict([('half_life', 'half_life_data.csv'),
+                                ('decays', 'decays_data.csv'),
+                                ('spin_parity', 'spin_parity_data.csv'),
+                                ('abundance', 'abundance_data.csv')])
+
+
+def batch_rows(batch):
+    """csv lines for each output file, for each (nuclide, nndc_nuclide) in batch;
+    only where wikidata is missing data - or otherwise different..."""
+    compared = [k for k, (nuclide, nndc_nuclide) in enumerate(batch) if nndc_nuclide is not None]
+    changes = transforms.chart_changes([batch[k][0] for k in compared], [batch[k][1] for k in compared],
+                                       nuclide_index)
+    rows = [{} for pair in batch]
+    for k in compared:
+        rows[k] = dict((output, []) for output in output_filenames)
+
+    for change in changes.half_life:
+        nuclide, nndc_nuclide = batch[compared[change.index]]
+        rows[compared[change.index]]['half_life'].append("{0},{1},{2},{3},{4},{5},{6}\n".format(
+            nuclide.item_id, change.half_life, change.uncertainty, change.time_unit_qid, change.time_unit_label,
+            nuclide.label, nndc_nuclide['source_url']))
+    for change in changes.decays:
+        nuclide, nndc_nuclide = batch[compared[change.index]]
+        rows[compared[change.index]]['decays'].append("{0},{1},{2},{3},{4},{5},{6}\n".format(
+            nuclide.item_id, change.mode, change.mode_qid, change.pct, change.decays_to,
+            nuclide.label, nndc_nuclide['source_url']))
+    for change in changes.spin_parity:
+        nuclide, nndc_nuclide = batch[compared[change.index]]
+        rows[compared[change.index]]['spin_parity'].append("{0},{1},{2},{3},{4}\n".format(
+            nuclide.item_id, change.spin, change.parity, nuclide.label, nndc_nuclide['source_url']))
+    for change in changes.abundance:
+        nuclide, nndc_nuclide = batch[compared[change.index]]
+        rows[compared[change.index]]['abundance'].append("{0},{1},{2},{3},{4}\n".format(
+            nuclide.item_id, change.abundance, change.uncertainty, nuclide.label, nndc_nuclide['source_url']))
+    return rows
+
+
+def write_rows(rows):
+    for output, lines in rows.items():
+        for line in lines:
+            output_files[output].write(line)
+    for output_file in output_files.values():
+        output_file.flush()
+
+
+def log_error(message, error):
+    print("Warning: {0}".format(message))
+    with open(args.error_log, 'a') as error_file:
+        error_file.write(message + '\n')
+        error_file.write(''.join(traceback.format_exception(type(error), error, error.__traceback__)) + '\n')
+
+
+# Downloaded NuDat pages not yet in the page cache, by (Z, N); each is cached
+# only once every nuclide on it is journaled, so a page that failed part way
+# still counts as changed for --changed-only
+unsaved_pages = {}
+
+
+def nudat_pages(keys):
+    crawler = nndc_crawler.NudatCrawler(workers=args.workers, requests_per_second=args.rate,
+                                        retries=args.retries, revalidate=args.changed_only, store=False)
+    for key, page in crawler.pages(keys):
+        if isinstance(page, Exception):
+            yield key, page
+            continue
+        if page.unsaved is not None:
+            unsaved_pages[key] = page
+        if args.changed_only and not page.changed:
+            yield key, None  # unchanged - no need to parse
+        else:
+            try:
+                yield key, nndc_data.NuclidePage(page.text, page.url)
+            except Exception as e:
+                yield key, e
+
+
+def commit_pages(groups):
+    """Cache the pages of the (key, group)s whose nuclides have all been journaled."""
+    for key, group in groups:
+        if key in unsaved_pages and all(journal.is_done(nuclide_key(nuclide)) for nuclide in group):
+            nndc_data.commit_nndc_page(key[0], key[1], unsaved_pages.pop(key))
+
+
+def ensdf_pages(keys):
+    ensdf = ensdf_data.EnsdfData(args.ensdf)
+    for key in keys:
+        yield key, ensdf.levels_for(*key)
+
+
+def snapshot_pages(keys):
+    snapshot = nndc_snapshot.NndcSnapshot(args.snapshot)
+    for key in keys:
+        yield key, snapshot.levels_for(*key)
+
+
+journal = sweep_journal.SweepJournal(args.journal)
+if args.restart:
+    journal.remove()
+    journal = sweep_journal.SweepJournal(args.journal)
+if len(journal) > 0:
+    print("Resuming from {0}: {1} nuclides already done".format(args.journal, len(journal)))
+
+# Rewrite output from the journal, so rows from a partly finished nuclide are dropped
+output_files = OrderedDict((output, open(filename, 'w')) for output, filename in output_filenames.items())
+for key, rows in journal.all_rows():
+    write_rows(rows)
+
+
+def nuclide_key(nuclide):
+    return nuclide.atomic_number, nuclide.neutron_number, nuclide.isomer_index
+
+
+# nuclides is sorted by (Z, N, isomer index): fetch and parse each NuDat page once per group
+nuclide_groups = []
+for key, group in itertools.groupby(nuclides, key=lambda nuclide: (nuclide.atomic_number, nuclide.neutron_number)):
+    pending = [nuclide for nuclide in group if not journal.is_done(nuclide_key(nuclide))]
+    if len(pending) > 0:
+        nuclide_groups.append((key, pending))
+if args.ensdf:
+    pages = ensdf_pages(key for key, group in nuclide_groups)
+elif args.snapshot:
+    pages = snapshot_pages(key for key, group in nuclide_groups)
+else:
+    pages = nudat_pages(key for key, group in nuclide_groups)
+
+
+def finish_batch(batch):
+    """Compare, write and journal a batch of (nuclide, nndc_nuclide); returns the number that failed."""
+    try:
+        batch_row_list = batch_rows(batch)
+    except Exception:
+        # Compare one at a time to find the nuclide(s) at fault
+        failed = 0
+        for nuclide, nndc_nuclide in batch:
+            try:
+                rows = batch_rows([(nuclide, nndc_nuclide)])[0]
+            except Exception as e:
+                log_error("Failed to process Z={0} N={1} II={2}: {3}".format(
+                    nuclide.atomic_number, nuclide.neutron_number, nuclide.isomer_index, e), e)
+                failed += 1
+                continue
+            write_rows(rows)
+            journal.record(nuclide_key(nuclide), rows)
+        return failed
+    for (nuclide, nndc_nuclide), rows in zip(batch, batch_row_list):
+        write_rows(rows)
+        journal.record(nuclide_key(nuclide), rows)
+    return 0
+
+
+# Pages are fetched one by one; the comparison runs a batch at a time, and
+# each nuclide is journaled once its batch is written
+error_count = 0
+batch = []
+batch_groups = []
+for (key, group), (page_key, nndc_page) in zip(nuclide_groups, pages):
+    z, n = key
+    if isinstance(nndc_page, Exception):
+        log_error("Failed to fetch NNDC page for Z={0} N={1}: {2}".format(z, n, nndc_page), nndc_page)
+        error_count += len(group)
         continue
-    half_life, hl_unc, time_unit_qid, time_unit_label = transforms.half_life_values(nndc_nuclide['half_life'])
-    if (time_unit_qid is not None) and (transforms.timespans_differ(half_life, time_unit_qid, nuclide.half_life)):
-        half_life_file.write("{0},{1},{2},{3},{4},{5},{6}\n".
-                             format(nuclide.item_id, half_life, hl_unc, time_unit_qid, time_unit_label,
-                                    nuclide.label, nndc_nuclide['source_url']))
-
-    for decay_mode in nndc_nuclide['decay_modes']:
-        mode, mode_qid, mode_qid_num, pct, decays_to = transforms.decay_mode_values(decay_mode, z, n,
-                                                                                    nuclides_by_protons_neutrons)
-        if mode_qid_num not in nuclide.decay_modes:
-            decays_file.write("{0},{1},{2},{3},{4},{5},{6}\n".
-                              format(nuclide.item_id, mode, mode_qid, pct, decays_to,
-                                     nuclide.label, nndc_nuclide['source_url']))
-
-    spin, parity = transforms.spin_parity_values(nndc_nuclide['spin'], nndc_nuclide['parity'])
-    if (spin != nuclide.spin) or (parity != nuclide.parity):
-        spin_parity_file.write("{0},{1},{2},{3},{4}\n".
-                               format(nuclide.item_id, spin, parity, nuclide.label, nndc_nuclide['source_url']))
-
-    abundance, ab_unc = transforms.abundance_values(nndc_nuclide['abundance'])
-    if transforms.float_values_differ(abundance, nuclide.abundance):
-        abundance_file.write("{0},{1},{2},{3},{4}\n".
-                             format(nuclide.item_id, abundance, ab_unc, nuclide.label, nndc_nuclide['source_url']))
-
-half_life_file.close()
-decays_file.close()
-spin_parity_file.close()
-abundance_file.close()
+    batch_groups.append((key, group))
+    for nuclide in group:
+        ii = nuclide.isomer_index
+        nndc_nuclide = None
+        if nndc_page is not None:
+            try:
+                nndc_nuclide = nndc_page.nuclide_data(ii)
+            except Exception as e:
+                log_error("Failed to process Z={0} N={1} II={2}: {3}".format(z, n, ii, e), e)
+                error_count += 1
+                continue
+            if len(nndc_nuclide) == 0:
+                print("Warning: No data found from NNDC for Z={0} N={1} II={2}".format(z, n, ii))
+                nndc_nuclide = None
+        batch.append((nuclide, nndc_nuclide))
+    if len(batch) >= args.batch_size:
+        error_count += finish_batch(batch)
+        commit_pages(batch_groups)
+        batch = []
+        batch_groups = []
+error_count += finish_batch(batch)
+commit_pages(batch_groups)
+
+for output_file in output_files.values():
+    output_file.close()
+
+if error_count == 0:
+    journal.remove()
+else:
+    journal.close()
+    print("{0} nuclides failed (see {1}); re-run to retry them".format(error_count, args.error_log))
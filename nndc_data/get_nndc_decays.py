@@ -1,21 +1,31 @@
 # -*- coding: utf-8 -*-
 #
+import argparse
+import sys
 import nuclides
 import nndc_data
+import nndc_snapshot
 import math
-import sys
+
+parser = argparse.ArgumentParser(description='Write NNDC decay mode data for Wikidata nuclides as csv.')
+parser.add_argument('--snapshot', metavar='FILE',
+                    help='read NNDC data from a snapshot built by build_nndc_snapshot.py instead of NuDat')
+nuclides.add_sparql_cache_argument(parser)
+args = parser.parse_args()
+nuclides.sparql_cache_from_args(args)
+if args.snapshot:
+    nndc_data.level_store = nndc_snapshot.NndcSnapshot(args.snapshot)
 
 #
 
 nuclide_provider_class = nuclides.SparqlNuclideProvider
+nuclide_index_class = nuclides.NuclideIndex
 
 nuclide_provider = nuclide_provider_class()
 
 nuclides = nuclide_provider.get_nuclides()
 
-nuclides_by_protons_neutrons = {}
-for nuclide in nuclides:
-    nuclides_by_protons_neutrons['{}_{}'.format(nuclide.atomic_number, nuclide.neutron_number)] = nuclide.item_id
+nuclide_index = nuclide_index_class(nuclides, nndc_data.decay_mode_net_changes)
 
 # Should filter out where nuclides data already includes this value...
 
@@ -29,14 +39,6 @@ for nuclide in nuclides:
         pct = None
         if 'pct' in decay_mode:
             pct = decay_mode['pct']
-        pn = nndc_data.protons_neutrons_after_decay(z, n, mode_qid)
-        if pn is not None:
-            key = '{}_{}'.format(pn[0], pn[1])
-            if key in nuclides_by_protons_neutrons:
-                decays_to = nuclides_by_protons_neutrons[key]
-            else:
-                decays_to = None
-        else:
-            decays_to = None
+        decays_to = nuclide_index.daughter(z, n, mode_qid)
         print(u"{0},{1},{2},{3},{4},{5},{6}".format(nuclide.item_id,
             mode, mode_qid, pct, decays_to, nuclide.label, source_url))
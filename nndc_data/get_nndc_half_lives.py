@@ -1,9 +1,20 @@
 # -*- coding: utf-8 -*-
 #
+import argparse
 import nuclides
 import nndc_data
+import nndc_snapshot
 import math
 
+parser = argparse.ArgumentParser(description='Write NNDC half-life data for Wikidata nuclides as csv.')
+parser.add_argument('--snapshot', metavar='FILE',
+                    help='read NNDC data from a snapshot built by build_nndc_snapshot.py instead of NuDat')
+nuclides.add_sparql_cache_argument(parser)
+args = parser.parse_args()
+nuclides.sparql_cache_from_args(args)
+if args.snapshot:
+    nndc_data.level_store = nndc_snapshot.NndcSnapshot(args.snapshot)
+
 # See http://www.nndc.bnl.gov/chart/help/glossary.jsp#halflife
 # Using formula half-life = ln(2) x h/2pi / Gamma (for line-width Gamma)
 # Then for the following definitions, 
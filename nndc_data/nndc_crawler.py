@@ -0,0 +1,101 @@
+#
+# Concurrent, rate-limited fetching of NuDat pages
+#
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+import nndc_data
+
+
+class HostBudget(object):
+    """Spaces requests to one host at most 1/requests_per_second apart."""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class NudatCrawler(object):
+    """Fetch NuDat pages from a thread pool, politely.
+
+    Network requests (cache hits are free) share a per-host request budget,
+    and failed requests are retried with jittered exponential backoff;
+    4xx responses other than 429 are not retried.
+    """
+
+    def __init__(self, workers=4, requests_per_second=4.0, retries=5,
+                 backoff=1.0, max_backoff=60.0, revalidate=False, store=True):
+        self.workers = workers
+        self.revalidate = revalidate
+        self.store = store
+        self.requests_per_second = requests_per_second
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budgets = {}
+        self.lock = threading.Lock()
+
+    def budget_for(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.budgets:
+                self.budgets[host] = HostBudget(self.requests_per_second)
+            return self.budgets[host]
+
+    def backoff_delay(self, attempt, response=None):
+        if response is not None and 'Retry-After' in response.headers:
+            try:
+                return float(response.headers['Retry-After'])
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def fetch(self, protons, neutrons, cached=None):
+        budget = self.budget_for(nndc_data.nndc_url)
+        attempt = 0
+        while True:
+            budget.wait()
+            try:
+                return nndc_data.download_nndc_page(protons, neutrons, cached)
+            except requests.RequestException as e:
+                response = e.response
+                if response is not None and response.status_code < 500 and response.status_code != 429:
+                    raise
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff_delay(attempt, response))
+                attempt += 1
+
+    def get_page(self, protons, neutrons):
+        return nndc_data.fetch_nndc_page(protons, neutrons, fetch=self.fetch, revalidate=self.revalidate,
+                                         store=self.store)
+
+    def get_page_or_error(self, key):
+        try:
+            return self.get_page(*key)
+        except Exception as e:
+            return e
+
+    def pages(self, keys):
+        """Yield (key, page) for each (Z, N) key, in the order given.
+
+        page is the nndc_data.NudatPage (text, url, changed, unsaved), or
+        the exception raised once retries ran out. With store=False pages
+        are only cached once passed to nndc_data.commit_nndc_page.
+        """
+        keys = list(keys)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for key, page in zip(keys, executor.map(self.get_page_or_error, keys)):
+                yield key, page
@@ -1,12 +1,22 @@
 #
 # -*- coding: utf-8 -*-
 
-from lxml import html
+from lxml import etree, html
 import requests
 import re
+from collections import namedtuple
+from functools import lru_cache
+from page_cache import NudatPageCache, content_hash
 
 nndc_url = 'http://www.nndc.bnl.gov/nudat2/reCenter.jsp'
 
+# Shared by every extractor below; set to None to always go to the network
+page_cache = NudatPageCache('nudat_cache')
+
+# Set to an object with levels_for(z, n), such as nndc_snapshot.NndcSnapshot,
+# to answer every extractor from it instead of from NuDat pages
+level_store = None
+
 time_units_to_qids = {
     's': 'Q11574',        # second
     'm': 'Q7727',         # minute
@@ -101,6 +111,21 @@ def protons_neutrons_after_decay(protons, neutrons, decay_mode_qid):
     return [protons, neutrons]
 
 
+def net_nucleon_changes(decay_mode_qid):
+    """(proton change, neutron change) for a decay mode qid - '|'-joined steps summed - or None if unknown."""
+    pn = protons_neutrons_after_decay(0, 0, decay_mode_qid)
+    if pn is None:
+        return None
+    return pn[0], pn[1]
+
+
+# Net nucleon change for every decay mode qid (single or multi-step) that has one
+decay_mode_net_changes = {}
+for mode_qid in list(decay_modes_to_qids.values()) + list(decay_mode_nucleon_changes.keys()):
+    if net_nucleon_changes(mode_qid) is not None:
+        decay_mode_net_changes[mode_qid] = net_nucleon_changes(mode_qid)
+
+
 def lowest_increment_of_float_string(fl_string):
     unc_factor = 1.0
     if '.' in fl_string:
@@ -116,27 +141,81 @@ def lowest_increment_of_float_string(fl_string):
     return unc_factor
 
 
-# Note uncertainty in NDS style means in last significant digit
-# eg. 4.623 3 => uncertainty is 0.003 (1-sigma)
+def nndc_page_url(protons, neutrons):
+    return '{0}?z={1}&n={2}'.format(nndc_url, protons, neutrons)
 
-def nndc_half_life(protons, neutrons):
+
+DownloadedPage = namedtuple('DownloadedPage', ['text', 'url', 'etag', 'last_modified'])
+NudatPage = namedtuple('NudatPage', ['text', 'url', 'changed', 'unsaved'])
+
+
+def download_nndc_page(protons, neutrons, cached=None):
+    """Fetch the NuDat page for (Z, N); None if it is unchanged from the cached copy."""
     query = {'z': protons, 'n': neutrons}
-    page = requests.get(nndc_url, params=query)
-    query_url = page.url
-    tree = html.fromstring(page.text)
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+    page = requests.get(nndc_url, params=query, headers=headers)
+    if page.status_code == 304:
+        return None
+    page.raise_for_status()
+    return DownloadedPage(page.text, page.url, page.headers.get('ETag'), page.headers.get('Last-Modified'))
+
+
+def fetch_nndc_page(protons, neutrons, fetch=download_nndc_page, revalidate=False, store=True):
+    """NudatPage for (Z, N), going to the network only when the cached copy is stale.
+
+    With revalidate, every cached page is checked with a conditional GET.
+    changed is True only when the page was downloaded and its content differs
+    from the cached copy (or there was none).
+
+    With store=False a downloaded page is not put in page_cache but left in
+    unsaved; call commit_nndc_page once its data has been used, so a page
+    that failed part way is still seen as changed next time.
+    """
+    cached = None
+    if page_cache is not None:
+        cached = page_cache.get_entry(protons, neutrons)
+        if cached is not None and not revalidate and page_cache.is_fresh(cached):
+            return NudatPage(cached.text, cached.url, False, None)
+    downloaded = fetch(protons, neutrons, cached)
+    if downloaded is None:  # 304 Not Modified
+        page_cache.put(protons, neutrons, cached.text, cached.url, cached.etag, cached.last_modified)
+        return NudatPage(cached.text, cached.url, False, None)
+    changed = cached is None or cached.content_hash != content_hash(downloaded.text)
+    page = NudatPage(downloaded.text, downloaded.url, changed, downloaded)
+    if store:
+        page = commit_nndc_page(protons, neutrons, page)
+    return page
+
+
+def commit_nndc_page(protons, neutrons, page):
+    """Put the unsaved download of a NudatPage from fetch_nndc_page(store=False) in page_cache."""
+    if page_cache is not None and page.unsaved is not None:
+        downloaded = page.unsaved
+        page_cache.put(protons, neutrons, downloaded.text, downloaded.url,
+                       downloaded.etag, downloaded.last_modified)
+    return page._replace(unsaved=None)
+
+
+def get_nndc_page(protons, neutrons, fetch=download_nndc_page):
+    """Page text and url for (Z, N), from page_cache if fresh, else via fetch."""
+    page = fetch_nndc_page(protons, neutrons, fetch)
+    return page.text, page.url
 
-    half_life = None
-    half_life_unit = None
-    unc = None
 
-    nuclide_data_rows = tree.xpath('//tr[@class="cp"]')
-    for row in nuclide_data_rows:
-        entries = row.getchildren()
-        level = entries[0].text_content()
-        if level == '0.0':
-            half_life, half_life_unit, unc = extract_half_life_from_entries(entries)
+# Note uncertainty in NDS style means in last significant digit
+# eg. 4.623 3 => uncertainty is 0.003 (1-sigma)
 
-    return half_life, half_life_unit, unc, query_url
+def nndc_half_life(protons, neutrons):
+    page = nndc_page(protons, neutrons)
+    ground = page.ground_level()
+    if ground is None:
+        return None, None, None, page.source_url
+    return ground.half_life, ground.half_life_unit, ground.half_life_uncertainty, page.source_url
 
 
 def extract_half_life_from_entries(entries):
@@ -155,81 +234,88 @@ def extract_half_life_from_entries(entries):
             unc_factor = lowest_increment_of_float_string(hl_string)
 
     if unc is not None:
-        m = re.match(r'^\+([\d\.]+)\-([\d\.]+)$', unc)
-        if m is None:
-            m2 = re.match(r'^\-([\d\.]+)\+([\d\.]+)$', unc)
-            if m2 is None:
-                unc = float(unc) * unc_factor
-            else:
-                lower_unc = float(m2.group(1))
-                upper_unc = float(m2.group(2))
-                unc = max(upper_unc, lower_unc) * unc_factor
-        else:
-            upper_unc = float(m.group(1))
-            lower_unc = float(m.group(2))
-            unc = max(upper_unc, lower_unc) * unc_factor  # would be better to show true bounds
+        unc = nds_uncertainty(unc, unc_factor)
     return half_life, half_life_unit, unc
 
 
+def nds_uncertainty(unc, unc_factor):
+    """Uncertainty from NDS-style digits ('3', '+3-2' or '-2+3') times unc_factor."""
+    m = re.match(r'^\+([\d\.]+)\-([\d\.]+)$', unc)
+    if m is None:
+        m2 = re.match(r'^\-([\d\.]+)\+([\d\.]+)$', unc)
+        if m2 is None:
+            return float(unc) * unc_factor
+        lower_unc = float(m2.group(1))
+        upper_unc = float(m2.group(2))
+        return max(upper_unc, lower_unc) * unc_factor
+    upper_unc = float(m.group(1))
+    lower_unc = float(m.group(2))
+    return max(upper_unc, lower_unc) * unc_factor  # would be better to show true bounds
+
+
 def nndc_decay_modes(protons, neutrons):
-    query = {'z': protons, 'n': neutrons}
-    page = requests.get(nndc_url, params=query)
-    query_url = page.url
-    tree = html.fromstring(page.text)
+    page = nndc_page(protons, neutrons)
+    ground = page.ground_level()
+    if ground is None:
+        return [], page.source_url
+    return ground.decay_modes, page.source_url
 
+
+# One token per match: a qualifier (<, >, \u2264, \u2265, \u2248, or ? for an unknown
+# branching), a percentage, a separator (':', '=', '%') or a decay mode symbol
+decay_mode_token = re.compile(u'\\s*(?:(?P<qualifier>[<>?\u2264\u2265\u2248])'
+                              u'|(?P<pct>\\d+\\.?\\d*(?:E[-+]?\\d+)?)(?=[\\s%]|$)'
+                              u'|[:=%]'
+                              u'|(?P<mode>[^\\s:=%<>?\u2264\u2265\u2248]+))')
+
+
+@lru_cache(maxsize=4096)
+def parse_decay_modes(decay_modes_string):
+    """Decay branches in a NuDat decay mode string ('\u03b2- : 100 %', '\u03b5 \u2264 0.1 %')
+    as a tuple of tuples of (key, value) pairs; the result is cached per distinct string."""
     decay_modes = []
+    current_mode = None
+    qualifier = None
+    # findall gives (qualifier, pct, mode) per token, all '' for a separator
+    for token_qualifier, pct, mode in decay_mode_token.findall(decay_modes_string):
+        if pct:
+            branch = (('mode', current_mode), ('pct', float(pct)))
+            if qualifier is not None:
+                branch += (('qualifier', qualifier),)
+            decay_modes.append(branch)
+            current_mode = None
+            qualifier = None
+        elif mode:
+            if current_mode is not None:
+                decay_modes.append(mode_branch(current_mode, qualifier))
+            current_mode = mode
+            qualifier = None
+        elif token_qualifier:
+            qualifier = token_qualifier
+    if current_mode is not None:
+        decay_modes.append(mode_branch(current_mode, qualifier))
+    return tuple(decay_modes)
 
-    nuclide_data_rows = tree.xpath('//tr[@class="cp"]')
-    for row in nuclide_data_rows:
-        entries = row.getchildren()
-        level = entries[0].text_content()
-        # Note: decay modes is last column; may be 5th or 6th (if abundance listed)
-        if level == '0.0':
-            decay_modes = decay_modes_from_text(entries[-1].text_content())
 
-    return decay_modes, query_url
+def mode_branch(mode, qualifier):
+    if qualifier is None:
+        return (('mode', mode),)
+    return (('mode', mode), ('qualifier', qualifier))
 
 
 def decay_modes_from_text(decay_modes_string):
+    """List of {'mode', 'pct', 'qualifier'} dicts ('pct' and 'qualifier' only where given)."""
     if decay_modes_string is None:
         return []
-    decay_modes = []
-    decay_modes_parts = decay_modes_string.split(' ')
-    current_mode = None
-    for part in decay_modes_parts:
-        if part == '' or part == '%' or part == ':' or part == '<' or part == '>':
-            continue
-        if part == u'\u2264' or part == u'\u2265' or part == u'\u2248':  # >= or <= or approx
-            continue
-        m = re.match(r'\d+\.?\d*[-E\d]*$', part)
-        if m is None:
-            if current_mode is not None:
-                decay_modes.append({'mode': current_mode})
-            current_mode = part
-        else:
-            pct = float(part)
-            decay_modes.append({'mode': current_mode, 'pct': pct})
-            current_mode = None
-    if current_mode is not None:
-        decay_modes.append({'mode': current_mode})
-    return decay_modes
+    return [dict(branch) for branch in parse_decay_modes(decay_modes_string)]
 
 
 def nndc_abundance(protons, neutrons):
-    query = {'z': protons, 'n': neutrons}
-    page = requests.get(nndc_url, params=query)
-    query_url = page.url
-    tree = html.fromstring(page.text)
-    abundance = None
-    uncertainty = None
-
-    nuclide_data_rows = tree.xpath('//tr[@class="cp"]')
-    for row in nuclide_data_rows:
-        entries = row.getchildren()
-        level = entries[0].text_content()
-        if level == '0.0':
-            abundance, uncertainty = extract_abundance_from_entries(entries)
-    return abundance, uncertainty, query_url
+    page = nndc_page(protons, neutrons)
+    ground = page.ground_level()
+    if ground is None:
+        return None, None, page.source_url
+    return ground.abundance, ground.abundance_uncertainty, page.source_url
 
 
 def extract_abundance_from_entries(entries):
@@ -250,9 +336,12 @@ def extract_abundance_from_entries(entries):
 
 
 def extract_spin_parity_from_entries(entries):
+    return spin_parity_from_text(entries[1].text)
+
+
+def spin_parity_from_text(spin_party_string):
     spin = None
     parity = None
-    spin_party_string = entries[1].text
     sp_match = re.search(r'([\d/]+)([-+])', spin_party_string)
     if sp_match is not None:
         spin = sp_match.group(1)
@@ -260,33 +349,182 @@ def extract_spin_parity_from_entries(entries):
     return spin, parity
 
 
-def all_nuclide_data(protons, neutrons, isomer_index):
-    query = {'z': protons, 'n': neutrons}
-    page = requests.get(nndc_url, params=query)
-    tree = html.fromstring(page.text)
-    nuclide_data_rows = tree.xpath('//tr[@class="cp"]')
-
-    nuclide_data = {}
-    if len(nuclide_data_rows) <= isomer_index:
-        return nuclide_data
+NuclideLevel = namedtuple('NuclideLevel', ['level', 'half_life', 'half_life_unit', 'half_life_uncertainty',
+                                           'spin', 'parity', 'abundance', 'abundance_uncertainty',
+                                           'decay_modes'])
 
-    nuclide_data['source_url'] = page.url
-    row = nuclide_data_rows[isomer_index]
-    entries = row.getchildren()
-    level = entries[0].text_content()
-    nuclide_data['level'] = level
 
+def level_from_entries(entries):
     half_life, half_life_unit, half_life_unc = extract_half_life_from_entries(entries)
-    nuclide_data['half_life'] = {'value': half_life, 'unit': half_life_unit, 'uncertainty': half_life_unc}
-
     abundance, abundance_unc = extract_abundance_from_entries(entries)
-    nuclide_data['abundance'] = {'value': abundance, 'uncertainty': abundance_unc}
-
     spin, parity = extract_spin_parity_from_entries(entries)
-    nuclide_data['spin'] = spin
-    nuclide_data['parity'] = parity
-
     # Note: decay modes is last column; may be 5th or 6th (if abundance listed)
-    nuclide_data['decay_modes'] = decay_modes_from_text(entries[-1].text_content())
+    decay_modes = decay_modes_from_text(entries[-1].text_content())
+    return NuclideLevel(entries[0].text_content(), half_life, half_life_unit, half_life_unc,
+                        spin, parity, abundance, abundance_unc, decay_modes)
+
+
+class RowCell(object):
+    """Stand-in for an lxml element inside a cp row.
+
+    Provides just what the extract_*_from_entries functions use: text,
+    getchildren() and text_content().
+    """
+    __slots__ = ('tag', 'text', 'tail', 'children')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.text = None
+        self.tail = None
+        self.children = []
+
+    def getchildren(self):
+        return self.children
+
+    def text_content(self):
+        parts = [self.text or '']
+        for child in self.children:
+            parts.append(child.text_content())
+            parts.append(child.tail or '')
+        return ''.join(parts)
+
+
+class CpRowTarget(object):
+    """lxml parser target that keeps only the cells of tr class="cp" rows.
+
+    Everything outside those rows is dropped as it streams past, and done
+    is set once the table holding the rows closes.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.row = None
+        self.open_elements = []
+        self.table_depth = 0
+        self.rows_table_depth = None
+        self.done = False
+
+    def start(self, tag, attrib):
+        if self.done:
+            return
+        if tag == 'table':
+            self.table_depth += 1
+        if self.row is None:
+            if tag == 'tr' and attrib.get('class') == 'cp':
+                self.row = []
+                if self.rows_table_depth is None:
+                    self.rows_table_depth = self.table_depth
+            return
+        element = RowCell(tag)
+        if self.open_elements:
+            self.open_elements[-1].children.append(element)
+        elif tag in ('td', 'th'):
+            self.row.append(element)
+        else:
+            return
+        self.open_elements.append(element)
+
+    def end(self, tag):
+        if self.done:
+            return
+        if self.open_elements:
+            self.open_elements.pop()
+        elif self.row is not None and tag == 'tr':
+            self.rows.append(self.row)
+            self.row = None
+        if tag == 'table':
+            if self.table_depth == self.rows_table_depth:
+                self.done = True
+            self.table_depth -= 1
+
+    def data(self, data):
+        if not self.open_elements:
+            return
+        element = self.open_elements[-1]
+        if element.children:
+            last_child = element.children[-1]
+            last_child.tail = (last_child.tail or '') + data
+        else:
+            element.text = (element.text or '') + data
+
+    def close(self):
+        return self.rows
+
+
+def cp_rows_from_html(page_text, chunk_size=16384):
+    """Cells of each cp row, streamed from the page without building a DOM."""
+    target = CpRowTarget()
+    parser = etree.HTMLParser(target=target)
+    for start in range(0, len(page_text), chunk_size):
+        parser.feed(page_text[start:start + chunk_size])
+        if target.done:
+            break
+    return parser.close()
+
 
-    return nuclide_data
+def cp_rows_from_tree(page_text):
+    """Cells of each cp row, via a full lxml DOM."""
+    tree = html.fromstring(page_text)
+    return [row.getchildren() for row in tree.xpath('//tr[@class="cp"]')]
+
+
+class NuclideLevels(object):
+    """Ground state and isomer levels for one (Z, N).
+
+    levels[isomer_index] matches Wikidata's isomer numbering; source_url is
+    the NuDat page the data is cited to.
+    """
+
+    def __init__(self, levels, source_url):
+        self.levels = levels
+        self.source_url = source_url
+
+    def ground_level(self):
+        ground = None
+        for level in self.levels:
+            if level.level == '0.0':
+                ground = level
+        return ground
+
+    def nuclide_data(self, isomer_index):
+        """Level data in the dict form returned by all_nuclide_data."""
+        if len(self.levels) <= isomer_index:
+            return {}
+        return nuclide_data_from_level(self.levels[isomer_index], self.source_url)
+
+
+class NuclidePage(NuclideLevels):
+    """A NuDat page for one (Z, N), parsed once: one NuclideLevel per "cp" row."""
+
+    def __init__(self, page_text, source_url, rows_from=cp_rows_from_html):
+        levels = [level_from_entries(entries) for entries in rows_from(page_text)]
+        super(NuclidePage, self).__init__(levels, source_url)
+
+
+def nuclide_data_from_level(level, source_url):
+    return {
+        'source_url': source_url,
+        'level': level.level,
+        'half_life': {'value': level.half_life, 'unit': level.half_life_unit,
+                      'uncertainty': level.half_life_uncertainty},
+        'abundance': {'value': level.abundance, 'uncertainty': level.abundance_uncertainty},
+        'spin': level.spin,
+        'parity': level.parity,
+        'decay_modes': level.decay_modes
+    }
+
+
+def nndc_page(protons, neutrons):
+    if level_store is not None:
+        return level_store.levels_for(protons, neutrons)
+    page_text, query_url = get_nndc_page(protons, neutrons)
+    return NuclidePage(page_text, query_url)
+
+
+def all_levels(protons, neutrons):
+    """Every NuclideLevel (ground state first) listed by NuDat for (Z, N)."""
+    return nndc_page(protons, neutrons).levels
+
+
+def all_nuclide_data(protons, neutrons, isomer_index):
+    return nndc_page(protons, neutrons).nuclide_data(isomer_index)
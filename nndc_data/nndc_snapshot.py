@@ -0,0 +1,172 @@
+#
+# Local SQLite snapshot of parsed NNDC level data
+#
+import os
+import sqlite3
+import time
+import nndc_data
+
+schema = """
+CREATE TABLE IF NOT EXISTS snapshot_info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS nuclides (
+    z INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    source_url TEXT,
+    PRIMARY KEY (z, n)
+);
+CREATE TABLE IF NOT EXISTS levels (
+    z INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    isomer_index INTEGER NOT NULL,
+    level TEXT,
+    half_life REAL,
+    half_life_unit TEXT,
+    half_life_uncertainty REAL,
+    spin TEXT,
+    parity TEXT,
+    abundance REAL,
+    abundance_uncertainty REAL,
+    PRIMARY KEY (z, n, isomer_index)
+);
+CREATE TABLE IF NOT EXISTS decay_branches (
+    z INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    isomer_index INTEGER NOT NULL,
+    branch_index INTEGER NOT NULL,
+    mode TEXT,
+    pct REAL,
+    qualifier TEXT,
+    PRIMARY KEY (z, n, isomer_index, branch_index)
+);
+CREATE INDEX IF NOT EXISTS decay_branches_mode ON decay_branches (mode);
+CREATE INDEX IF NOT EXISTS levels_half_life_unit ON levels (half_life_unit);
+"""
+
+level_columns = ('level', 'half_life', 'half_life_unit', 'half_life_uncertainty',
+                 'spin', 'parity', 'abundance', 'abundance_uncertainty')
+
+
+class NndcSnapshot(object):
+    """Every parsed level of every nuclide, keyed by (Z, N, isomer_index).
+
+    levels_for serves the same NuclideLevels interface as a NuDat page, so
+    setting nndc_data.level_store to a snapshot makes the get_nndc_* scripts
+    run as queries against it.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(schema)
+
+    def set_info(self, key, value):
+        self.connection.execute('INSERT OR REPLACE INTO snapshot_info (key, value) VALUES (?, ?)',
+                                (key, str(value)))
+
+    def info(self):
+        return dict(self.connection.execute('SELECT key, value FROM snapshot_info'))
+
+    def store(self, protons, neutrons, nuclide_levels):
+        key = (protons, neutrons)
+        for table in ('nuclides', 'levels', 'decay_branches'):
+            self.connection.execute('DELETE FROM {0} WHERE z = ? AND n = ?'.format(table), key)
+        self.connection.execute('INSERT INTO nuclides (z, n, source_url) VALUES (?, ?, ?)',
+                                key + (nuclide_levels.source_url,))
+        for isomer_index, level in enumerate(nuclide_levels.levels):
+            self.connection.execute(
+                'INSERT INTO levels (z, n, isomer_index, {0}) VALUES (?, ?, ?, {1})'.format(
+                    ', '.join(level_columns), ', '.join('?' for column in level_columns)),
+                key + (isomer_index,) + tuple(getattr(level, column) for column in level_columns))
+            for branch_index, decay_mode in enumerate(level.decay_modes):
+                self.connection.execute(
+                    'INSERT INTO decay_branches (z, n, isomer_index, branch_index, mode, pct, qualifier) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    key + (isomer_index, branch_index, decay_mode['mode'], decay_mode.get('pct'),
+                           decay_mode.get('qualifier')))
+
+    def clear(self):
+        for table in ('snapshot_info', 'nuclides', 'levels', 'decay_branches'):
+            self.connection.execute('DELETE FROM {0}'.format(table))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def nuclide_keys(self):
+        return list(self.connection.execute('SELECT z, n FROM nuclides ORDER BY z, n'))
+
+    def levels_for(self, protons, neutrons):
+        key = (protons, neutrons)
+        row = self.connection.execute('SELECT source_url FROM nuclides WHERE z = ? AND n = ?', key).fetchone()
+        if row is None:
+            return nndc_data.NuclideLevels([], nndc_data.nndc_page_url(protons, neutrons))
+        branches = {}
+        for isomer_index, mode, pct, qualifier in self.connection.execute(
+                'SELECT isomer_index, mode, pct, qualifier FROM decay_branches WHERE z = ? AND n = ? '
+                'ORDER BY isomer_index, branch_index', key):
+            decay_mode = {'mode': mode}
+            if pct is not None:
+                decay_mode['pct'] = pct
+            if qualifier is not None:
+                decay_mode['qualifier'] = qualifier
+            branches.setdefault(isomer_index, []).append(decay_mode)
+        levels = []
+        for level_row in self.connection.execute(
+                'SELECT isomer_index, {0} FROM levels WHERE z = ? AND n = ? ORDER BY isomer_index'.format(
+                    ', '.join(level_columns)), key):
+            isomer_index = level_row[0]
+            levels.append(nndc_data.NuclideLevel(*(level_row[1:] + (branches.get(isomer_index, []),))))
+        return nndc_data.NuclideLevels(levels, row[0])
+
+    def all_levels(self, protons, neutrons):
+        return self.levels_for(protons, neutrons).levels
+
+    def all_nuclide_data(self, protons, neutrons, isomer_index):
+        return self.levels_for(protons, neutrons).nuclide_data(isomer_index)
+
+    def changed_levels(self, other_filename):
+        """(z, n, isomer_index) of levels that differ from (or are missing in) another snapshot."""
+        if not os.path.exists(other_filename):  # sqlite would create an empty one
+            raise IOError('No snapshot {0}'.format(other_filename))
+        NndcSnapshot(other_filename).close()  # brings an older snapshot's schema up to date
+        self.connection.execute('ATTACH DATABASE ? AS other', (other_filename,))
+        try:
+            level_select = 'SELECT z, n, isomer_index, {0} FROM {{0}}levels'.format(', '.join(level_columns))
+            branch_select = 'SELECT z, n, isomer_index, branch_index, mode, pct, qualifier FROM {0}decay_branches'
+            query = """
+SELECT z, n, isomer_index FROM ({0} EXCEPT {1})
+UNION SELECT z, n, isomer_index FROM ({1} EXCEPT {0})
+UNION SELECT z, n, isomer_index FROM ({2} EXCEPT {3})
+UNION SELECT z, n, isomer_index FROM ({3} EXCEPT {2})
+ORDER BY z, n, isomer_index""".format(level_select.format('main.'), level_select.format('other.'),
+                                      branch_select.format('main.'), branch_select.format('other.'))
+            return list(self.connection.execute(query))
+        finally:
+            self.connection.execute('DETACH DATABASE other')
+
+
+def build_snapshot(filename, nuclide_pages, source):
+    """Write (key, NuclideLevels) pairs from nuclide_pages into a fresh snapshot,
+    replacing anything already in filename."""
+    snapshot = NndcSnapshot(filename)
+    snapshot.clear()
+    stored = 0
+    for (protons, neutrons), nuclide_levels in nuclide_pages:
+        if isinstance(nuclide_levels, Exception):
+            print("Warning: Failed to fetch NNDC page for Z={0} N={1}: {2}".format(protons, neutrons,
+                                                                                    nuclide_levels))
+            continue
+        snapshot.store(protons, neutrons, nuclide_levels)
+        stored += 1
+        if stored % 500 == 0:
+            snapshot.commit()
+    snapshot.set_info('source', source)
+    snapshot.set_info('created', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+    snapshot.close()
+    return stored
@@ -1,13 +1,27 @@
 #
 # Stripped down from wikidata periodic table (chemistry.py originally)
 #
+import bz2
+import gzip
 import json
+import math
+import multiprocessing
 import operator
+import os
 import re
-from units import time_in_seconds
+import shutil
+import subprocess
+import sys
+from array import array
+from units import time_in_seconds, time_in_seconds_from_claim
 from urllib.parse import urlencode
 from urllib.request import urlopen
-from collections import defaultdict
+from collections import namedtuple
+from itertools import compress
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'APSbot'))  # sparql_cache, sparql_stream
+import sparql_cache
+import sparql_stream
 
 
 def get_json_with_get(url, url_encoded_params):
@@ -22,13 +36,46 @@ class SparqlBase:
 
     SPARQL_API = 'https://query.wikidata.org/sparql'
 
+    # Set to a sparql_cache.SparqlCache to reuse results between runs
+    sparql_cache = None
+
     @classmethod
     def get_sparql(cls, query):
+        if cls.sparql_cache is not None:
+            return cls.sparql_cache.fetch(query, cls.fetch_sparql)
+        return cls.fetch_sparql(query)
+
+    @classmethod
+    def fetch_sparql(cls, query):
         response = get_json_with_get(cls.SPARQL_API,
                                      urlencode({'query': query,
                                                 'format': 'json'}))
         return response['results']['bindings']
 
+    @classmethod
+    def iter_sparql(cls, query):
+        """Bindings for query as they are read from a CSV response, in get_sparql's form.
+
+        With a sparql_cache set the (cached) json result is used instead.
+        """
+        if cls.sparql_cache is not None:
+            for binding in cls.get_sparql(query):
+                yield binding
+            return
+        for binding in sparql_stream.iter_sparql_csv(cls.SPARQL_API, query):
+            yield binding
+
+
+def add_sparql_cache_argument(parser):
+    parser.add_argument('--sparql-cache', metavar='FILE',
+                        help='cache Wikidata query results in FILE (reused for 6 hours)')
+
+
+def sparql_cache_from_args(args):
+    """Cache SparqlBase queries in the file given with --sparql-cache, if any."""
+    if args.sparql_cache:
+        SparqlBase.sparql_cache = sparql_cache.SparqlCache(args.sparql_cache)
+
 
 class NuclideProvider(object):
     """Base class for nuclide providers."""
@@ -39,7 +86,7 @@ class NuclideProvider(object):
             try:
                 yield next(iterator)
             except StopIteration:
-                raise
+                return
 
     def get_nuclides(self):
         nuclides = []
@@ -58,12 +105,53 @@ class NuclideProvider(object):
         return nuclides
 
 
-# No longer filtering out isomers...
-class SparqlNuclideProvider(SparqlBase, NuclideProvider):
-    """Load nuclide info from Wikidata Sparql endpoint."""
+class TableNuclideProvider(NuclideProvider):
+    """Base class for providers that load a NuclideTable (get_table)."""
+
     def __iter__(self):
-        nuclides = defaultdict(Nuclide)
-        nuclides_query = "PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
+        return self.get_table().rows()
+
+    def get_nuclides(self):
+        return list(self.get_table().sorted_rows())
+
+
+# No longer filtering out isomers...
+class SparqlNuclideProvider(SparqlBase, TableNuclideProvider):
+    """Load nuclide info from Wikidata Sparql endpoint into a NuclideTable.
+
+    The six queries (nuclides, stable, half-life, decays, spin/parity and
+    abundance) are independent, so they are sent concurrently - at most
+    max_concurrent_queries at a time - and merged in that order. Results
+    are streamed: the nuclides query is merged row by row as it arrives,
+    while the others are read into binding lists in the background.
+    """
+
+    def __init__(self, max_concurrent_queries=5):
+        self.max_concurrent_queries = max_concurrent_queries
+
+    def get_table(self):
+        table = NuclideTable()
+        queries = [(self.nuclides_query(), self.merge_nuclides),
+                   (self.stable_query(), self.merge_stable),
+                   (self.half_life_query(), self.merge_half_lives),
+                   (self.decay_query(), self.merge_decays),
+                   (self.spin_parity_query(), self.merge_spin_parity),
+                   (self.abundance_query(), self.merge_abundances)]
+        # The nuclides query runs on this thread, alongside the pool
+        with ThreadPoolExecutor(max_workers=max(1, self.max_concurrent_queries - 1)) as executor:
+            futures = [executor.submit(self.read_sparql, query) for query, merge in queries[1:]]
+            first_query, first_merge = queries[0]
+            first_merge(table, self.iter_sparql(first_query))
+            for (query, merge), future in zip(queries[1:], futures):
+                merge(table, future.result())
+        return table
+
+    def read_sparql(self, query):
+        return list(self.iter_sparql(query))
+
+    @staticmethod
+    def nuclides_query():
+        return "PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> \
 PREFIX wd: <http://www.wikidata.org/entity/> \
 SELECT ?nuclide ?atomic_number ?neutron_number ?label WHERE {{ \
@@ -74,47 +162,44 @@ SELECT ?nuclide ?atomic_number ?neutron_number ?label WHERE {{ \
     FILTER(lang(?label) = 'en') \
 }}".format(Nuclide.instance_pid, Nuclide.subclass_pid, Nuclide.isotope_qid,
             Nuclide.atomic_number_pid, Nuclide.neutron_number_pid)
-        query_result = self.get_sparql(nuclides_query)
+
+    @staticmethod
+    def merge_nuclides(table, query_result):
+        item_ids = []
+        atomic_numbers = array('i')
+        neutron_numbers = array('i')
+        labels = []
         for nuclide_result in query_result:
-            nuclide_uri = nuclide_result['nuclide']['value']
-            atomic_number = nuclide_result['atomic_number']['value']
-            neutron_number = nuclide_result['neutron_number']['value']
-            label = nuclide_result['label']['value']
-            nuclides[nuclide_uri].atomic_number = int(atomic_number)
-            nuclides[nuclide_uri].neutron_number = int(neutron_number)
-            nuclides[nuclide_uri].label = label
-            nuclides[nuclide_uri].half_life = None
-            nuclides[nuclide_uri].item_id = nuclide_uri.split('/')[-1]
-            isomer_string_match = re.search('-\d+m(\d*)', label)
-            if isomer_string_match:
-                if isomer_string_match.group(1) == '':
-                    nuclides[nuclide_uri].isomer_index = 1
-                else:
-                    nuclides[nuclide_uri].isomer_index = int(isomer_string_match.group(1))
-            else:
-                special_match = re.search('-\d+([ab])', label)  # this is used in at least one case where level order is unknown
-                if special_match:
-                    if special_match.group(1) == 'b':
-                        nuclides[nuclide_uri].isomer_index = 2
-                    else:
-                        nuclides[nuclide_uri].isomer_index = 1
-                else:
-                    nuclides[nuclide_uri].isomer_index = 0
+            item_ids.append(nuclide_result['nuclide']['value'].split('/')[-1])
+            atomic_numbers.append(int(nuclide_result['atomic_number']['value']))
+            neutron_numbers.append(int(nuclide_result['neutron_number']['value']))
+            labels.append(nuclide_result['label']['value'])
+        rows = table.add_rows(item_ids)
+        table.set_once('atomic_number', rows, atomic_numbers)
+        table.set_once('neutron_number', rows, neutron_numbers)
+        table.set_once('label', rows, labels)
+        table.set_once('isomer_index', rows, array('i', (isomer_index_from_label(label) for label in labels)))
 
-        stable_query = "PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
+    @staticmethod
+    def stable_query():
+        return "PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
 PREFIX wd: <http://www.wikidata.org/entity/> \
 SELECT ?nuclide WHERE {{ \
     ?nuclide wdt:P{0}/wdt:P{1}* wd:Q{2} ; \
              wdt:P{0} wd:Q{3} . \
 }}".format(Nuclide.instance_pid, Nuclide.subclass_pid, Nuclide.isotope_qid,
             Nuclide.stable_qid)
-        query_result = self.get_sparql(stable_query)
+
+    @staticmethod
+    def merge_stable(table, query_result):
         for nuclide_result in query_result:
-            nuclide_uri = nuclide_result['nuclide']['value']
-            if nuclide_uri in nuclides:
-                nuclides[nuclide_uri].classes.append('stable')
+            row = table.index.get(nuclide_result['nuclide']['value'].split('/')[-1], -1)
+            if row >= 0:
+                table.stable[row] = 1
 
-        hl_query = "PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
+    @staticmethod
+    def half_life_query():
+        return "PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
 PREFIX wd: <http://www.wikidata.org/entity/> \
 PREFIX wikibase: <http://wikiba.se/ontology#> \
 PREFIX psv: <http://www.wikidata.org/prop/statement/value/> \
@@ -128,24 +213,25 @@ SELECT ?nuclide ?half_life ?half_life_unit WHERE {{ \
 }}".format(Nuclide.instance_pid, Nuclide.subclass_pid, Nuclide.isotope_qid,
             Nuclide.half_life_pid)
 
-        query_result = self.get_sparql(hl_query)
+    @staticmethod
+    def merge_half_lives(table, query_result):
         for nuclide_result in query_result:
-            nuclide_uri = nuclide_result['nuclide']['value']
             if nuclide_result['half_life']['value'] == '0':
                 continue  # WDQS bug: values sometimes zero - skip
-            if nuclide_uri in nuclides:
-                if nuclides[nuclide_uri].half_life is None:
-                    nuclides[nuclide_uri].half_life = time_in_seconds(
-                        nuclide_result['half_life']['value'],
-                        nuclide_result['half_life_unit']['value'])
-                # else - sparql returned more than 1 half-life value - problem?
-
-        decay_query = "PREFIX ps: <http://www.wikidata.org/prop/statement/> \
+            row = table.index.get(nuclide_result['nuclide']['value'].split('/')[-1], -1)
+            if row >= 0 and math.isnan(table.half_life[row]):
+                table.half_life[row] = time_in_seconds(nuclide_result['half_life']['value'],
+                                                       nuclide_result['half_life_unit']['value'])
+            # else - sparql returned more than 1 half-life value - first one is kept
+
+    @staticmethod
+    def decay_query():
+        return "PREFIX ps: <http://www.wikidata.org/prop/statement/> \
 PREFIX pq: <http://www.wikidata.org/prop/qualifier/> \
 PREFIX p: <http://www.wikidata.org/prop/> \
 PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
 PREFIX wd: <http://www.wikidata.org/entity/> \
-SELECT ?nuclide ?decay_to ?decay_mode ?fraction WHERE {{ \
+SELECT ?nuclide ?decay_statement ?decay_to ?decay_mode ?fraction WHERE {{ \
     ?nuclide wdt:P{0}/wdt:P{1}* wd:Q{2} ; \
              p:P{3} ?decay_statement . \
     ?decay_statement ps:P{3} ?decay_to ; \
@@ -154,15 +240,29 @@ SELECT ?nuclide ?decay_to ?decay_mode ?fraction WHERE {{ \
 }}".format(Nuclide.instance_pid, Nuclide.subclass_pid, Nuclide.isotope_qid,
             Nuclide.decays_to_pid, Nuclide.decay_mode_pid,
             Nuclide.proportion_pid)
-        query_result = self.get_sparql(decay_query)
+
+    @staticmethod
+    def merge_decays(table, query_result):
+        """One entry per decay mode qualifier; a multi-step decay gives several with the same statement."""
+        rows = array('l')
+        decay_modes = array('l')
+        decay_to = []
+        fractions = array('d')
+        statements = []
         for nuclide_result in query_result:
-            nuclide_uri = nuclide_result['nuclide']['value']
-            if nuclide_uri in nuclides:
+            row = table.index.get(nuclide_result['nuclide']['value'].split('/')[-1], -1)
+            if row >= 0:
                 decay_mode_uri = nuclide_result['decay_mode']['value']
-                decay_mode = int(decay_mode_uri.split('/')[-1].replace('Q', ''))
-                nuclides[nuclide_uri].decay_modes.append(decay_mode)
+                rows.append(row)
+                decay_modes.append(int(decay_mode_uri.split('/')[-1].replace('Q', '')))
+                decay_to.append(item_id_from_uri(nuclide_result['decay_to']['value']))
+                fractions.append(float(nuclide_result['fraction']['value']))
+                statements.append(nuclide_result['decay_statement']['value'].split('/')[-1])
+        table.set_decays(rows, decay_modes, decay_to, fractions, statements)
 
-        spin_parity_query = "PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
+    @staticmethod
+    def spin_parity_query():
+        return "PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
 PREFIX wd: <http://www.wikidata.org/entity/> \
 SELECT ?nuclide ?spin ?parity WHERE {{ \
     ?nuclide wdt:P{0}/wdt:P{1}* wd:Q{2} ; \
@@ -171,16 +271,23 @@ SELECT ?nuclide ?spin ?parity WHERE {{ \
 }}".format(Nuclide.instance_pid, Nuclide.subclass_pid, Nuclide.isotope_qid,
            Nuclide.spin_pid, Nuclide.parity_pid)
 
-        query_result = self.get_sparql(spin_parity_query)
+    @staticmethod
+    def merge_spin_parity(table, query_result):
+        rows = array('l')
+        spins = array('d')
+        parities = array('b')
         for nuclide_result in query_result:
-            nuclide_uri = nuclide_result['nuclide']['value']
-            if nuclide_uri in nuclides:
-                spin = nuclide_result['spin']['value']
-                parity = nuclide_result['parity']['value']
-                nuclides[nuclide_uri].spin = float(spin)
-                nuclides[nuclide_uri].parity = int(parity)
-
-        abundance_query = "PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
+            row = table.index.get(nuclide_result['nuclide']['value'].split('/')[-1], -1)
+            if row >= 0:
+                rows.append(row)
+                spins.append(float(nuclide_result['spin']['value']))
+                parities.append(int(nuclide_result['parity']['value']))
+        table.set_once('spin', rows, spins)
+        table.set_once('parity', rows, parities)
+
+    @staticmethod
+    def abundance_query():
+        return "PREFIX wdt: <http://www.wikidata.org/prop/direct/> \
 PREFIX wd: <http://www.wikidata.org/entity/> \
 SELECT ?nuclide ?abundance WHERE {{ \
     ?nuclide wdt:P{0}/wdt:P{1}* wd:Q{2} ; \
@@ -188,15 +295,274 @@ SELECT ?nuclide ?abundance WHERE {{ \
 }}".format(Nuclide.instance_pid, Nuclide.subclass_pid, Nuclide.isotope_qid,
                    Nuclide.abundance_pid)
 
-        query_result = self.get_sparql(abundance_query)
+    @staticmethod
+    def merge_abundances(table, query_result):
+        rows = array('l')
+        abundances = array('d')
         for nuclide_result in query_result:
-            nuclide_uri = nuclide_result['nuclide']['value']
-            if nuclide_uri in nuclides:
-                abundance = nuclide_result['abundance']['value']
-                nuclides[nuclide_uri].abundance = float(abundance)
+            row = table.index.get(nuclide_result['nuclide']['value'].split('/')[-1], -1)
+            if row >= 0:
+                rows.append(row)
+                abundances.append(float(nuclide_result['abundance']['value']))
+        table.set_once('abundance', rows, abundances)
+
+
+class DumpNuclideProvider(TableNuclideProvider):
+    """Load nuclide info from a local Wikidata json dump (latest-all.json.gz or .bz2).
+
+    The dump is read line by line (one entity per line), decompressed by
+    pigz/lbzip2 in a separate process when installed. Only lines mentioning
+    P1148 (neutron number) or P279 (subclass of) are decoded, in a pool of
+    processes; nuclides are the items with an atomic and neutron number
+    that are instances of a class in the P279 tree under Q25276, as in the
+    SPARQL queries.
+    """
+
+    def __init__(self, filename, processes=None, chunk_lines=2000):
+        self.filename = filename
+        self.processes = processes
+        self.chunk_lines = chunk_lines
+
+    def get_table(self):
+        subclasses = {}
+        candidates = []
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            for records in pool.imap(dump_records, self.line_chunks()):
+                for record in records:
+                    if record[0] == 'class':
+                        for superclass in record[2]:
+                            subclasses.setdefault(superclass, []).append(record[1])
+                    else:
+                        candidates.append(record[1])
+        finally:
+            pool.close()
+            pool.join()
+
+        isotope_classes = set()
+        pending = ['Q{0}'.format(Nuclide.isotope_qid)]
+        while pending:
+            qid = pending.pop()
+            if qid not in isotope_classes:
+                isotope_classes.add(qid)
+                pending.extend(subclasses.get(qid, []))
+        return self.table_from_records(record for record in candidates
+                                       if isotope_classes.intersection(record['instance_of']))
+
+    def line_chunks(self):
+        chunk = []
+        for line in dump_lines(self.filename):
+            if b'"P1148"' in line or b'"P279"' in line:
+                chunk.append(line)
+                if len(chunk) >= self.chunk_lines:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def table_from_records(records):
+        table = NuclideTable()
+        item_ids = []
+        labels = []
+        atomic_numbers = []
+        neutron_numbers = []
+        records = list(records)
+        for record in records:
+            for atomic_number in record['atomic_numbers']:
+                for neutron_number in record['neutron_numbers']:
+                    item_ids.append(record['item_id'])
+                    labels.append(record['label'])
+                    atomic_numbers.append(atomic_number)
+                    neutron_numbers.append(neutron_number)
+        rows = table.add_rows(item_ids)
+        table.set_once('atomic_number', rows, atomic_numbers)
+        table.set_once('neutron_number', rows, neutron_numbers)
+        table.set_once('label', rows, labels)
+        table.set_once('isomer_index', rows, array('i', (isomer_index_from_label(label) for label in labels)))
+
+        spin_rows = array('l')
+        spins = array('d')
+        parities = array('b')
+        abundance_rows = array('l')
+        abundances = array('d')
+        decay_rows = array('l')
+        decay_modes = array('l')
+        decay_to = []
+        fractions = array('d')
+        statements = []
+        for record in records:
+            row = table.index[record['item_id']]
+            if 'Q{0}'.format(Nuclide.stable_qid) in record['instance_of']:
+                table.stable[row] = 1
+            if record['half_life'] is not None:
+                table.half_life[row] = record['half_life']
+            for spin in record['spins']:
+                for parity in record['parities']:
+                    spin_rows.append(row)
+                    spins.append(spin)
+                    parities.append(parity)
+            for abundance in record['abundances']:
+                abundance_rows.append(row)
+                abundances.append(abundance)
+            for decay_mode, daughter, fraction, statement in record['decays']:
+                decay_rows.append(row)
+                decay_modes.append(decay_mode)
+                decay_to.append(daughter)
+                fractions.append(fraction)
+                statements.append(statement)
+        table.set_once('spin', spin_rows, spins)
+        table.set_once('parity', spin_rows, parities)
+        table.set_once('abundance', abundance_rows, abundances)
+        table.set_decays(decay_rows, decay_modes, decay_to, fractions, statements)
+        return table
+
+
+def dump_lines(filename):
+    """Lines (bytes) of a possibly compressed dump, decompressed in a separate process if a tool is installed."""
+    tools = []
+    opener = open
+    if filename.endswith('.gz'):
+        tools = ['pigz', 'gzip']
+        opener = gzip.open
+    elif filename.endswith('.bz2'):
+        tools = ['lbzip2', 'pbzip2', 'bzip2']
+        opener = bz2.open
+    for tool in tools:
+        tool_path = shutil.which(tool)
+        if tool_path is not None:
+            process = subprocess.Popen([tool_path, '-dc', filename], stdout=subprocess.PIPE)
+            try:
+                for line in process.stdout:
+                    yield line
+            finally:
+                process.stdout.close()
+                process.wait()
+            return
+    with opener(filename, 'rb') as dump_file:
+        for line in dump_file:
+            yield line
 
-        for item_id, nuclide in nuclides.items():
-            yield nuclide
+
+def truthy_claims(claims):
+    """Claims as wdt: sees them - preferred rank if any, otherwise normal rank."""
+    preferred = [claim for claim in claims if claim.get('rank') == 'preferred']
+    if len(preferred) > 0:
+        return preferred
+    return [claim for claim in claims if claim.get('rank', 'normal') == 'normal']
+
+
+def snak_value(snak):
+    if snak.get('snaktype') != 'value':
+        return None
+    return snak['datavalue']['value']
+
+
+def claim_values(claims, prop):
+    values = []
+    for claim in truthy_claims(claims.get(prop, [])):
+        value = snak_value(claim['mainsnak'])
+        if value is not None:
+            values.append(value)
+    return values
+
+
+def dump_records(lines):
+    """('class', qid, superclass qids) and ('nuclide', record) tuples for the entities on lines.
+
+    Runs in the DumpNuclideProvider worker processes.
+    """
+    records = []
+    for line in lines:
+        line = line.strip().rstrip(b',')
+        if not line.startswith(b'{'):
+            continue
+        entity = json.loads(line.decode('utf-8'))
+        claims = entity.get('claims', {})
+        if 'P279' in claims:
+            superclasses = [value['id'] for value in claim_values(claims, 'P279')]
+            if len(superclasses) > 0:
+                records.append(('class', entity['id'], superclasses))
+        record = nuclide_record(entity)
+        if record is not None:
+            records.append(('nuclide', record))
+    return records
+
+
+def nuclide_record(entity):
+    """The nuclide fields of an entity with atomic and neutron numbers and an English label, or None."""
+    claims = entity.get('claims', {})
+    label = entity.get('labels', {}).get('en')
+    atomic_numbers = [int(float(value['amount']))
+                      for value in claim_values(claims, 'P{0}'.format(Nuclide.atomic_number_pid))]
+    neutron_numbers = [int(float(value['amount']))
+                       for value in claim_values(claims, 'P{0}'.format(Nuclide.neutron_number_pid))]
+    if label is None or len(atomic_numbers) == 0 or len(neutron_numbers) == 0:
+        return None
+
+    half_life = None
+    for claim in claims.get('P{0}'.format(Nuclide.half_life_pid), []):  # all ranks, like p:P2114
+        value = snak_value(claim['mainsnak'])
+        if value is None or float(value['amount']) == 0:
+            continue  # skip zero values, as for WDQS
+        try:
+            half_life = time_in_seconds_from_claim(claim)
+        except (KeyError, ValueError):
+            continue  # not a time unit
+        break
+
+    decays = []
+    for claim in claims.get('P{0}'.format(Nuclide.decays_to_pid), []):
+        snak = claim['mainsnak']
+        if snak.get('snaktype') == 'novalue':
+            continue
+        daughter = None
+        if snak.get('snaktype') == 'value':
+            daughter = snak['datavalue']['value']['id']
+        qualifiers = claim.get('qualifiers', {})
+        modes = [snak_value(qualifier) for qualifier in qualifiers.get('P{0}'.format(Nuclide.decay_mode_pid), [])]
+        fractions = [snak_value(qualifier) for qualifier in qualifiers.get('P{0}'.format(Nuclide.proportion_pid), [])]
+        for mode in modes:
+            for fraction in fractions:
+                if mode is not None and fraction is not None:
+                    # statement ids as WDQS writes them
+                    decays.append((mode['numeric-id'], daughter, float(fraction['amount']),
+                                   claim['id'].replace('$', '-')))
+
+    return {'item_id': entity['id'],
+            'label': label['value'],
+            'instance_of': [value['id'] for value in claim_values(claims, 'P{0}'.format(Nuclide.instance_pid))],
+            'atomic_numbers': atomic_numbers,
+            'neutron_numbers': neutron_numbers,
+            'half_life': half_life,
+            'decays': decays,
+            'spins': [float(value['amount']) for value in claim_values(claims, 'P{0}'.format(Nuclide.spin_pid))],
+            'parities': [int(float(value['amount']))
+                         for value in claim_values(claims, 'P{0}'.format(Nuclide.parity_pid))],
+            'abundances': [float(value['amount'])
+                           for value in claim_values(claims, 'P{0}'.format(Nuclide.abundance_pid))]}
+
+
+def item_id_from_uri(uri):
+    """'Q...' for a Wikidata entity uri, None for anything else (such as an unknown value)."""
+    if uri.startswith('http://www.wikidata.org/entity/'):
+        return uri.split('/')[-1]
+    return None
+
+
+def isomer_index_from_label(label):
+    """Isomer index from a nuclide label - 'technetium-99m' is 1, 'hafnium-178m2' 2."""
+    isomer_string_match = re.search(r'-\d+m(\d*)', label)
+    if isomer_string_match:
+        if isomer_string_match.group(1) == '':
+            return 1
+        return int(isomer_string_match.group(1))
+    special_match = re.search(r'-\d+([ab])', label)  # this is used in at least one case where level order is unknown
+    if special_match:
+        if special_match.group(1) == 'b':
+            return 2
+        return 1
+    return 0
 
 
 class PropertyAlreadySetException(Exception):
@@ -243,3 +609,192 @@ class Nuclide(object):
     def __iter__(self):
         for key in self.props:
             yield (key, getattr(self, key))
+
+
+class NuclideIndex(object):
+    """Nuclides looked up by (Z, N, isomer_index) or by item id.
+
+    Given decay_mode_changes (decay mode qid -> (proton change, neutron
+    change), e.g. nndc_data.decay_mode_net_changes) the daughter ground
+    state of every nuclide for every mode is worked out up front, so
+    daughter() is a single dict lookup.
+    """
+
+    def __init__(self, nuclides, decay_mode_changes=None):
+        self.by_key = {}
+        self.by_item_id = {}
+        for nuclide in nuclides:
+            self.by_key[(nuclide.atomic_number, nuclide.neutron_number, nuclide.isomer_index)] = nuclide
+            self.by_item_id[nuclide.item_id] = nuclide
+        self.daughters = {}
+        if decay_mode_changes is not None:
+            parents = set((z, n) for z, n, isomer_index in self.by_key)
+            for z, n in parents:
+                for mode_qid, (proton_change, neutron_change) in decay_mode_changes.items():
+                    daughter = self.by_key.get((z + proton_change, n + neutron_change, 0))
+                    if daughter is not None:
+                        self.daughters[(z, n, mode_qid)] = daughter.item_id
+
+    def get(self, z, n, isomer_index=0):
+        return self.by_key.get((z, n, isomer_index))
+
+    def item(self, item_id):
+        return self.by_item_id.get(item_id)
+
+    def daughter(self, z, n, mode_qid):
+        """Item id of the ground state (Z, N) decays to by mode_qid, or None."""
+        return self.daughters.get((z, n, mode_qid))
+
+
+NuclideRow = namedtuple('NuclideRow', ['atomic_number', 'neutron_number', 'isomer_index', 'item_id', 'label',
+                                       'half_life', 'decay_modes', 'spin', 'parity', 'abundance', 'classes'])
+
+
+class NuclideTable(object):
+    """The chart of nuclides as parallel columns, one row per Wikidata item.
+
+    Numeric columns are arrays, with nan (0 for parity) where Wikidata has
+    no value. Decay data is stored CSR-style: the mode qid numbers for row i
+    are decay_modes[decay_mode_offsets[i]:decay_mode_offsets[i + 1]], and
+    decay_to, decay_fractions and decay_statements run in parallel with
+    decay_modes. index maps item id to row.
+    """
+
+    def __init__(self):
+        self.item_id = []
+        self.label = []
+        self.atomic_number = array('i')
+        self.neutron_number = array('i')
+        self.isomer_index = array('i')
+        self.half_life = array('d')  # seconds
+        self.spin = array('d')
+        self.parity = array('b')
+        self.abundance = array('d')
+        self.stable = array('b')
+        self.decay_mode_offsets = array('l', [0])
+        self.decay_modes = array('l')
+        self.decay_to = []
+        self.decay_fractions = array('d')
+        self.decay_statements = []
+        self.index = {}
+        self.assigned = {}  # column name -> bytearray, 1 where set_once has set the row
+
+    def __len__(self):
+        return len(self.item_id)
+
+    def add_rows(self, item_ids):
+        """Row for each item id, appending (empty) rows for new ones."""
+        rows = array('l')
+        nan = float('nan')
+        for item_id in item_ids:
+            row = self.index.get(item_id)
+            if row is None:
+                row = len(self.item_id)
+                self.index[item_id] = row
+                self.item_id.append(item_id)
+                self.label.append(None)
+                self.atomic_number.append(0)
+                self.neutron_number.append(0)
+                self.isomer_index.append(0)
+                self.half_life.append(nan)
+                self.spin.append(nan)
+                self.parity.append(0)
+                self.abundance.append(nan)
+                self.stable.append(0)
+                self.decay_mode_offsets.append(self.decay_mode_offsets[-1])
+            rows.append(row)
+        return rows
+
+    def set_once(self, name, rows, values):
+        """Set column name to values[k] at rows[k].
+
+        Like Nuclide attributes each value is set once: a row given two
+        different values, or a value different from one set by an earlier
+        call, raises PropertyAlreadySetException. The check works on whole
+        columns: when rows repeat or were set before, every distinct (row,
+        value) pair, old and new, goes into one set, and a row with more
+        than one pair is a conflict. A run of new rows (as add_rows gives
+        for new items) is written as one slice.
+        """
+        column = getattr(self, name)
+        assigned = self.assigned.setdefault(name, bytearray())
+        assigned.extend(bytes(len(self) - len(assigned)))
+        distinct_rows = set(rows)
+        old_rows = []
+        if assigned.find(1) >= 0:
+            old_rows = list(compress(distinct_rows, map(assigned.__getitem__, distinct_rows)))
+        if len(distinct_rows) < len(rows) or len(old_rows) > 0:
+            pairs = set(zip(rows, values))
+            pairs.update(zip(old_rows, map(column.__getitem__, old_rows)))
+            if len(pairs) > len(distinct_rows):
+                self.raise_conflict(name, pairs)
+        if len(rows) > 0 and array('l', rows) == array('l', range(rows[0], rows[0] + len(rows))):
+            start, stop = rows[0], rows[0] + len(rows)
+            column[start:stop] = array(column.typecode, values) if isinstance(column, array) else list(values)
+            assigned[start:stop] = b'\x01' * len(rows)
+            return
+        for row, value in zip(rows, values):
+            column[row] = value
+            assigned[row] = 1
+
+    def raise_conflict(self, name, pairs):
+        values_by_row = {}
+        for row, value in sorted(pairs, key=operator.itemgetter(0)):
+            values_by_row.setdefault(row, []).append(value)
+            if len(values_by_row[row]) > 1:
+                raise PropertyAlreadySetException('{0} for {1}: {2} and {3}'.format(
+                    name, self.item_id[row], values_by_row[row][0], values_by_row[row][1]))
+
+    def set_decays(self, rows, decay_modes, decay_to, decay_fractions, decay_statements):
+        """Replace the decay data with entry k (mode qid number, daughter item id - None
+        if unknown - fraction and statement id) for rows[k], in the order given per row."""
+        counts = array('l', bytes(array('l').itemsize * len(self)))
+        for row in rows:
+            counts[row] += 1
+        offsets = array('l', [0])
+        for count in counts:
+            offsets.append(offsets[-1] + count)
+        positions = array('l', bytes(array('l').itemsize * len(rows)))
+        next_slot = array('l', offsets[:-1])
+        for k, row in enumerate(rows):
+            positions[k] = next_slot[row]
+            next_slot[row] += 1
+        self.decay_mode_offsets = offsets
+        self.decay_modes = array('l', decay_modes)
+        self.decay_fractions = array('d', decay_fractions)
+        self.decay_to = list(decay_to)
+        self.decay_statements = list(decay_statements)
+        for k, position in enumerate(positions):
+            self.decay_modes[position] = decay_modes[k]
+            self.decay_fractions[position] = decay_fractions[k]
+            self.decay_to[position] = decay_to[k]
+            self.decay_statements[position] = decay_statements[k]
+
+    def decay_modes_for(self, row):
+        return self.decay_modes[self.decay_mode_offsets[row]:self.decay_mode_offsets[row + 1]]
+
+    def row(self, row):
+        half_life = self.half_life[row]
+        spin = self.spin[row]
+        abundance = self.abundance[row]
+        return NuclideRow(self.atomic_number[row], self.neutron_number[row], self.isomer_index[row],
+                          self.item_id[row], self.label[row],
+                          None if math.isnan(half_life) else half_life,
+                          self.decay_modes_for(row).tolist(),
+                          None if math.isnan(spin) else spin,
+                          self.parity[row] or None,
+                          None if math.isnan(abundance) else abundance,
+                          ['stable'] if self.stable[row] else [])
+
+    def rows(self):
+        for row in range(len(self)):
+            yield self.row(row)
+
+    def sorted_order(self):
+        """Row numbers sorted by (Z, N, isomer index)."""
+        keys = list(zip(self.atomic_number, self.neutron_number, self.isomer_index))
+        return sorted(range(len(keys)), key=keys.__getitem__)
+
+    def sorted_rows(self):
+        for row in self.sorted_order():
+            yield self.row(row)
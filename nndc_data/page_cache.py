@@ -0,0 +1,119 @@
+#
+# On-disk cache of NuDat nuclide pages, keyed by (Z, N)
+#
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+CachedPage = namedtuple('CachedPage', ['text', 'url', 'fetched', 'etag', 'last_modified', 'content_hash'])
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class NudatPageCache(object):
+    """Persistent cache of NuDat pages.
+
+    Each (Z, N) page is stored as one json file in cache_dir, along with its
+    ETag/Last-Modified headers and a content hash. Entries older than ttl
+    seconds are stale: nndc_data revalidates them with a conditional GET.
+    Once the directory grows past max_bytes the least recently used entries
+    are removed.
+    """
+
+    def __init__(self, cache_dir, ttl=7 * 86400, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+        self.lock = threading.Lock()
+
+    def entry_path(self, protons, neutrons):
+        return os.path.join(self.cache_dir, '{0}_{1}.json'.format(protons, neutrons))
+
+    def read_entry(self, protons, neutrons):
+        path = self.entry_path(protons, neutrons)
+        try:
+            with open(path, encoding='utf-8') as entry_file:
+                entry = json.load(entry_file)
+        except (IOError, ValueError):
+            return None
+        os.utime(path, None)  # mtime doubles as last-used time for eviction
+        return entry
+
+    def get_entry(self, protons, neutrons):
+        """Cached page for (Z, N) whether or not it has expired, or None."""
+        entry = self.read_entry(protons, neutrons)
+        if entry is None:
+            return None
+        text = entry['text']
+        return CachedPage(text, entry['url'], entry['fetched'], entry.get('etag'),
+                          entry.get('last_modified'), entry.get('content_hash') or content_hash(text))
+
+    def is_fresh(self, cached_page):
+        return self.ttl is None or time.time() - cached_page.fetched <= self.ttl
+
+    def get(self, protons, neutrons):
+        cached_page = self.get_entry(protons, neutrons)
+        if cached_page is None or not self.is_fresh(cached_page):
+            return None
+        return cached_page
+
+    def put(self, protons, neutrons, text, url, etag=None, last_modified=None):
+        entry = {'z': protons, 'n': neutrons, 'url': url, 'fetched': time.time(),
+                 'etag': etag, 'last_modified': last_modified,
+                 'content_hash': content_hash(text), 'text': text}
+        path = self.entry_path(protons, neutrons)
+        tmp_path = '{0}.{1}.tmp'.format(path, threading.get_ident())
+        with self.lock:
+            self.load_size()
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        with open(tmp_path, 'w', encoding='utf-8') as entry_file:
+            json.dump(entry, entry_file)
+        new_size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.total_bytes += new_size - old_size
+            if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+                self.evict()
+        return CachedPage(text, url, entry['fetched'], etag, last_modified, entry['content_hash'])
+
+    def load_size(self):
+        if self.total_bytes is not None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for path, size, mtime in self.entries())
+
+    def entries(self):
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        # Trim to 90% of the limit so eviction doesn't run on every put
+        target = 0.9 * self.max_bytes
+        for path, size, mtime in sorted(self.entries(), key=lambda entry: entry[2]):
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+
+    def clear(self):
+        with self.lock:
+            if os.path.isdir(self.cache_dir):
+                for path, size, mtime in list(self.entries()):
+                    os.remove(path)
+            self.total_bytes = 0
@@ -0,0 +1,58 @@
+#
+# Append-only checkpoint journal for long NNDC sweeps
+#
+import json
+import os
+from collections import OrderedDict
+
+
+class SweepJournal(object):
+    """Records each completed (Z, N, isomer_index) with the csv rows it produced.
+
+    One json line per nuclide, flushed and synced as it is written, so after
+    a crash the journal holds exactly the finished work; a partly written
+    last line is ignored.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.completed = OrderedDict()
+        if os.path.exists(filename):
+            with open(filename, encoding='utf-8') as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    key = (entry['z'], entry['n'], entry['isomer_index'])
+                    self.completed[key] = entry['rows']
+        self.journal_file = None
+
+    def __len__(self):
+        return len(self.completed)
+
+    def is_done(self, key):
+        return key in self.completed
+
+    def record(self, key, rows):
+        if self.journal_file is None:
+            self.journal_file = open(self.filename, 'a', encoding='utf-8')
+        entry = {'z': key[0], 'n': key[1], 'isomer_index': key[2], 'rows': rows}
+        self.journal_file.write(json.dumps(entry) + '\n')
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+        self.completed[key] = rows
+
+    def all_rows(self):
+        """(key, rows) for every completed nuclide, in the order completed."""
+        return self.completed.items()
+
+    def close(self):
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
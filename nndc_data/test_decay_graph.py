@@ -0,0 +1,53 @@
+import decay_graph
+
+
+def small_graph():
+    """Q1 -> Q2 -> Q3 (stable) and Q2 -> Q4 <-> Q5, plus Q6 decaying to itself and Q7 on its own."""
+    graph = decay_graph.DecayGraph()
+    for item_id in ('Q1', 'Q2', 'Q3', 'Q4', 'Q5', 'Q6', 'Q7'):
+        graph.add_nuclide(item_id, stable=(item_id == 'Q3'))
+    for parent, daughter in (('Q1', 'Q2'), ('Q2', 'Q3'), ('Q2', 'Q4'), ('Q4', 'Q5'), ('Q5', 'Q4'),
+                             ('Q6', 'Q6')):
+        graph.add_branch(decay_graph.DecayBranch(parent, daughter, 'Q1', 1.0, 'wikidata'))
+    return graph
+
+
+def test_components_find_cycles():
+    graph = small_graph()
+    components = [sorted(component) for component in graph.strongly_connected_components()]
+    assert sorted(components) == [['Q1'], ['Q2'], ['Q3'], ['Q4', 'Q5'], ['Q6'], ['Q7']]
+    assert graph.cyclic_nodes() == {'Q4', 'Q5', 'Q6'}
+    assert [issue.item_id for issue in graph.check_cycles()] == ['Q4', 'Q6']
+
+
+def test_topological_order():
+    order = small_graph().topological_order()
+    assert sorted(order) == ['Q1', 'Q2', 'Q3', 'Q4', 'Q5', 'Q6', 'Q7']
+    position = dict((item_id, k) for k, item_id in enumerate(order))
+    assert position['Q1'] < position['Q2'] < position['Q3']
+    assert position['Q2'] < min(position['Q4'], position['Q5'])
+    assert abs(position['Q4'] - position['Q5']) == 1  # members of a cycle are adjacent
+
+
+def test_closure():
+    graph = small_graph()
+    assert graph.closure('Q1') == {'Q2', 'Q3', 'Q4', 'Q5'}
+    assert graph.closure('Q2') == {'Q3', 'Q4', 'Q5'}
+    assert graph.closure('Q4') == {'Q4', 'Q5'}
+    assert graph.closure('Q6') == {'Q6'}
+    assert graph.closure('Q3') == set()
+    assert graph.closure('Q7') == set()
+
+
+def test_closure_follows_added_branches():
+    graph = small_graph()
+    assert graph.closure('Q3') == set()
+    graph.add_branch(decay_graph.DecayBranch('Q3', 'Q7', 'Q1', 1.0, 'nndc'))
+    assert graph.closure('Q1') == {'Q2', 'Q3', 'Q4', 'Q5', 'Q7'}
+
+
+def test_chains_stop_at_cycles():
+    graph = small_graph()
+    assert sorted(graph.chains('Q1')) == [['Q1', 'Q2', 'Q3'], ['Q1', 'Q2', 'Q4', 'Q5']]
+    assert graph.chains('Q5') == [['Q5', 'Q4']]
+    assert graph.chains('Q6') == [['Q6']]
@@ -1,7 +1,8 @@
 import nndc_data
 import math
+from collections import namedtuple
 from fractions import Fraction
-from units import time_in_seconds
+from units import time_in_seconds, time_unit_factor
 
 # See http://www.nndc.bnl.gov/chart/help/glossary.jsp#halflife
 # Using formula half-life = ln(2) x h/2pi / Gamma (for line-width Gamma)
@@ -48,7 +49,8 @@ def half_life_values(hl_hash):
     return half_life, uncertainty, time_unit_qid, half_life_unit
 
 
-def decay_mode_values(dm_hash, z, n, nuclides_by_protons_neutrons):
+def decay_mode_values(dm_hash, z, n, nuclide_index):
+    """nuclide_index is a nuclides.NuclideIndex built with nndc_data.decay_mode_net_changes."""
     mode = dm_hash['mode']
     mode_qid = nndc_data.nndc_decay_id(mode)
     mode_qid_num = None
@@ -57,15 +59,7 @@ def decay_mode_values(dm_hash, z, n, nuclides_by_protons_neutrons):
     pct = None
     if 'pct' in dm_hash:
         pct = dm_hash['pct']
-    pn = nndc_data.protons_neutrons_after_decay(z, n, mode_qid)
-    if pn is not None:
-        key = '{}_{}'.format(pn[0], pn[1])
-        if key in nuclides_by_protons_neutrons:
-            decays_to = nuclides_by_protons_neutrons[key]
-        else:
-            decays_to = None
-    else:
-        decays_to = None
+    decays_to = nuclide_index.daughter(z, n, mode_qid)
     return mode, mode_qid, mode_qid_num, pct, decays_to
 
 
@@ -112,3 +106,104 @@ def timespans_differ(time_quantity, time_unit_qid, b_seconds):
             if diff <= 1.0e-6 * b_seconds:
                 differ = False
     return differ
+
+
+# Batch comparison of a whole chart. In each change, index is the position
+# of the nuclide in the lists given to chart_changes. Without NumPy the
+# columns are still walked element by element, but each unit, decay mode and
+# spin string is resolved once per distinct value; benchmark_chart_changes.py
+# times this against the per-nuclide helpers above.
+HalfLifeChange = namedtuple('HalfLifeChange', ['index', 'half_life', 'uncertainty', 'time_unit_qid', 'time_unit_label'])
+DecayChange = namedtuple('DecayChange', ['index', 'mode', 'mode_qid', 'pct', 'decays_to'])
+SpinParityChange = namedtuple('SpinParityChange', ['index', 'spin', 'parity'])
+AbundanceChange = namedtuple('AbundanceChange', ['index', 'abundance', 'uncertainty'])
+ChangeSet = namedtuple('ChangeSet', ['half_life', 'decays', 'spin_parity', 'abundance'])
+
+# Line widths, converted to half-lives in attoseconds
+width_units = {'eV': 1.0, 'keV': 1000.0, 'MeV': 1.0e6}
+
+
+def convert_half_lives(values, units, uncertainties):
+    """half_life_values() for whole columns: (values, uncertainties, unit labels), same length as the input."""
+    converted = []
+    converted_uncertainties = []
+    converted_units = []
+    for half_life, half_life_unit, uncertainty in zip(values, units, uncertainties):
+        if half_life_unit == 's' and half_life < 1.0e-15:
+            half_life_unit = 'as'
+            half_life *= 1.0e18
+            if uncertainty is not None:
+                uncertainty *= 1.0e18
+        elif half_life_unit in width_units:
+            new_half_life = planck_ratio / (width_units[half_life_unit] * half_life)
+            if uncertainty is not None:
+                uncertainty *= new_half_life / half_life
+            half_life = new_half_life
+            half_life_unit = 'as'
+        converted.append(half_life)
+        converted_uncertainties.append(uncertainty)
+        converted_units.append(half_life_unit)
+    return converted, converted_uncertainties, converted_units
+
+
+def chart_changes(nuclides, nndc_nuclides, nuclide_index):
+    """Compare Wikidata nuclides[k] with nndc_nuclides[k] (an nndc_data nuclide dict) for every k.
+
+    Returns a ChangeSet of lists of typed changes - where Wikidata is missing
+    data or differs beyond the tolerances of timespans_differ and
+    float_values_differ. Units are converted column-wise, and unit factors,
+    decay mode ids and spin fractions are looked up once per distinct value.
+    """
+    changes = ChangeSet([], [], [], [])
+
+    half_lives, uncertainties, half_life_units = convert_half_lives(
+        [nndc_nuclide['half_life']['value'] for nndc_nuclide in nndc_nuclides],
+        [nndc_nuclide['half_life']['unit'] for nndc_nuclide in nndc_nuclides],
+        [nndc_nuclide['half_life']['uncertainty'] for nndc_nuclide in nndc_nuclides])
+    unit_seconds = {}
+    for half_life_unit in set(half_life_units):
+        time_unit_qid = nndc_data.nndc_time_id(half_life_unit)
+        if time_unit_qid is not None:
+            unit_seconds[half_life_unit] = (time_unit_qid, time_unit_factor(time_unit_qid))
+    for k, nuclide in enumerate(nuclides):
+        half_life = half_lives[k]
+        if half_life_units[k] not in unit_seconds:
+            continue  # no (time) value - 'STABLE' for example
+        time_unit_qid, seconds = unit_seconds[half_life_units[k]]
+        wikidata_seconds = nuclide.half_life
+        if wikidata_seconds is None or abs(half_life * seconds - wikidata_seconds) > 1.0e-6 * wikidata_seconds:
+            changes.half_life.append(HalfLifeChange(k, half_life, uncertainties[k], time_unit_qid,
+                                                    half_life_units[k]))
+
+    mode_ids = {}
+    for k, nuclide in enumerate(nuclides):
+        for decay_mode in nndc_nuclides[k]['decay_modes']:
+            mode = decay_mode['mode']
+            if mode not in mode_ids:
+                mode_qid = nndc_data.nndc_decay_id(mode)
+                mode_qid_num = None
+                if (mode_qid is not None) and ('|' not in mode_qid):  # unrecognized or multi-step decay mode
+                    mode_qid_num = int(mode_qid.replace('Q', ''))
+                mode_ids[mode] = (mode_qid, mode_qid_num)
+            mode_qid, mode_qid_num = mode_ids[mode]
+            if mode_qid_num not in nuclide.decay_modes:
+                decays_to = nuclide_index.daughter(nuclide.atomic_number, nuclide.neutron_number, mode_qid)
+                changes.decays.append(DecayChange(k, mode, mode_qid, decay_mode.get('pct'), decays_to))
+
+    spins = {None: None}
+    for k, nuclide in enumerate(nuclides):
+        spin_string = nndc_nuclides[k]['spin']
+        if spin_string not in spins:
+            spins[spin_string] = float(Fraction(spin_string))
+        spin = spins[spin_string]
+        parity = nndc_nuclides[k]['parity']
+        if parity is not None:
+            parity = int(parity)
+        if (spin != nuclide.spin) or (parity != nuclide.parity):
+            changes.spin_parity.append(SpinParityChange(k, spin, parity))
+
+    for k, nuclide in enumerate(nuclides):
+        abundance, uncertainty = abundance_values(nndc_nuclides[k]['abundance'])
+        if float_values_differ(abundance, nuclide.abundance):
+            changes.abundance.append(AbundanceChange(k, abundance, uncertainty))
+    return changes
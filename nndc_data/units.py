@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 # time units and their values in multiples of seconds
 time_units = {
     11574: 1.0,          # second
@@ -26,8 +28,14 @@ def time_in_seconds_from_claim(claim):
     return amount
 
 
+@lru_cache(maxsize=None)
+def time_unit_factor(unit_uri):
+    """Seconds per unit for a unit uri or qid ('.../Q11574' or 'Q11574'), parsed once per distinct unit."""
+    unit_id = int(unit_uri.split('/')[-1].replace('Q', ''))
+    return time_units[unit_id]
+
+
 def time_in_seconds(amount_str, unit_uri):
     amount = float(amount_str)
-    unit_id = int(unit_uri.split('/')[-1].replace('Q', ''))
-    amount *= time_units[unit_id]
+    amount *= time_unit_factor(unit_uri)
     return amount